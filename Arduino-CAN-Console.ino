@@ -1,15 +1,105 @@
 #include <Adafruit_MCP2515.h>
+#include <SPI.h>
 
 // Define the CS (Chip Select) pin for the MCP2515
 #define CS_PIN 9
+// MCP2515 INT output; must be an external-interrupt capable pin
+#define INT_PIN 2
 
 // Set the CAN bus baud rate
 #define CAN_BAUDRATE 250000
 #define SERIAL_BAUDRATE 250000
 
+// Binary record layout (see Visualizer/serial_protocol.py)
+#define RECORD_FRAME_TS 0x02
+#define FLAG_EXTENDED 0x01
+#define FLAG_RTR 0x02
+#define RECORD_SIZE 20
+#define RECORD_STATUS 0x03
+#define STATUS_RECORD_SIZE 17
+#define RECORD_ACK 0x04
+#define ACK_RECORD_SIZE 2
+
+// Frames received in the interrupt wait here until loop() reports them; must be a power of two
+#define RX_RING_SIZE 32
+// Longest accepted command line; longer lines are discarded
+#define INPUT_BUFFER_SIZE 128
+#define ERROR_POLL_MS 10
+#define STATUS_INTERVAL_MS 1000
+
+// On-device cyclic transmit table (see handleCyclicCommand)
+#define MAX_CYCLIC 16
+
+// MCP2515 registers and SPI instructions used to program the acceptance filters
+#define MCP_SPI_CLOCK 1000000
+#define MCP_WRITE 0x02
+#define MCP_READ 0x03
+#define MCP_BIT_MODIFY 0x05
+#define MCP_TEC 0x1C
+#define MCP_REC 0x1D
+#define MCP_EFLG 0x2D
+#define MCP_CANINTF 0x2C
+#define EFLG_RX0OVR 0x40
+#define EFLG_RX1OVR 0x80
+#define CANINTF_MERRF 0x80
+#define MCP_CANSTAT 0x0E
+#define MCP_CANCTRL 0x0F
+#define MCP_RXB0CTRL 0x60
+#define MCP_RXB1CTRL 0x70
+#define MCP_RXM0 0x20
+#define MCP_RXM1 0x24
+#define MCP_MODE_MASK 0xE0
+#define MCP_MODE_CONFIG 0x80
+#define RXBCTRL_FILTERS_ON 0x00
+#define RXBCTRL_FILTERS_OFF 0x60
+#define RXB0CTRL_BUKT 0x04
+
+// RXF0-RXF1 use mask RXM0, RXF2-RXF5 use RXM1
+const uint8_t FILTER_REGISTERS[6] = {0x00, 0x04, 0x08, 0x10, 0x14, 0x18};
+
 // Create an instance of the MCP2515 controller
 Adafruit_MCP2515 mcp(CS_PIN);
 
+// Frames are reported as JSON lines until the host sends "!BIN"
+bool binaryMode = false;
+
+struct CyclicEntry {
+  bool active;
+  uint32_t id;
+  uint8_t len;
+  uint8_t data[8];
+  uint32_t period;   // microseconds
+  uint32_t phase;    // microseconds after !CYCSTART
+  uint32_t nextDue;  // micros() of the next transmission
+};
+
+CyclicEntry cyclicTable[MAX_CYCLIC];
+bool cyclicRunning = false;
+
+struct RxFrame {
+  uint32_t id;
+  uint32_t timestamp;
+  uint8_t dlc;
+  uint8_t flags;
+  uint8_t data[8];
+};
+
+// Single producer (interrupt) / single consumer (loop) ring; one slot stays empty to tell full from empty
+RxFrame rxRing[RX_RING_SIZE];
+volatile uint8_t rxHead = 0;
+volatile uint8_t rxTail = 0;
+
+// Cumulative since boot and reported every STATUS_INTERVAL_MS, so a lost report loses no information
+volatile uint32_t droppedFrames = 0;
+uint32_t rxOverflows = 0;
+uint32_t errorFrames = 0;
+uint32_t lastErrorPoll = 0;
+uint32_t lastStatusReport = 0;
+
+char inputBuffer[INPUT_BUFFER_SIZE];
+uint8_t inputLength = 0;
+bool inputOverflow = false;
+
 void setup() {
   Serial.begin(250000);
   while (!Serial) delay(10);
@@ -22,34 +112,69 @@ void setup() {
     while (1) delay(10);
   }
   Serial.println("MCP2515 initialized successfully.");
+  // Shown once for the interactive console; host tools ignore non-JSON lines
+  Serial.println("Enter message in format: <ID>,<LEN>,<DATA1>,<DATA2>,...");
+
+  // Receive in the INT interrupt so a slow serial write or command never lets the two RX buffers overflow
+  mcp.onReceive(INT_PIN, receiveCANMessage);
+  // Mask the receive interrupt during SPI transactions started from loop()
+  SPI.usingInterrupt(digitalPinToInterrupt(INT_PIN));
 }
 
 void loop() {
-  // Check if a CAN message is available
-  if (mcp.parsePacket()) {
-    receiveCANMessage();
+  // Cyclic frames are timed by micros() here, so they need no serial traffic once uploaded
+  serviceCyclic();
+
+  // Report frames the interrupt has queued
+  drainReceivedFrames();
+
+  // Consume host input without waiting for the rest of a line
+  pollSerialInput();
+
+  pollErrorCounters();
+}
+
+// Called from the INT interrupt by the MCP2515 library with the packet already parsed
+void receiveCANMessage(int packetSize) {
+  // Stamp the frame before any serial output so host-side timing is free of USB jitter
+  uint32_t timestamp = micros();
+
+  uint8_t next = (rxHead + 1) & (RX_RING_SIZE - 1);
+  if (next == rxTail) {
+    droppedFrames++;
+    return;
   }
 
-  // Check for user input to send a message
-  if (Serial.available()) {
-    sendCANMessage();
+  RxFrame &frame = rxRing[rxHead];
+  bool isRemote = mcp.packetRtr();
+  frame.timestamp = timestamp;
+  frame.id = mcp.packetId();
+  frame.flags = (mcp.packetExtended() ? FLAG_EXTENDED : 0) | (isRemote ? FLAG_RTR : 0);
+  frame.dlc = isRemote ? mcp.packetDlc() : packetSize;
+  for (uint8_t i = 0; i < packetSize && i < 8; i++) {
+    frame.data[i] = mcp.read();
   }
+  rxHead = next;
 }
 
-void receiveCANMessage() {
-  uint32_t id = mcp.packetId();
-  bool isExtended = mcp.packetExtended();
-  bool isRemote = mcp.packetRtr();
-  uint8_t len = mcp.available();
-  uint8_t data[8];
+void drainReceivedFrames() {
+  while (rxTail != rxHead) {
+    reportFrame(rxRing[rxTail]);
+    rxTail = (rxTail + 1) & (RX_RING_SIZE - 1);
+  }
+}
 
-  for (uint8_t i = 0; i < len; i++) {
-    data[i] = mcp.read();
+void reportFrame(const RxFrame &frame) {
+  if (binaryMode) {
+    sendBinaryFrame(frame);
+    return;
   }
 
+  uint8_t len = (frame.flags & FLAG_RTR) ? 0 : frame.dlc;
+
   // Send the message Data in JSON
   Serial.print("{\"ID\":");
-  Serial.print(id);
+  Serial.print(frame.id);
 
   Serial.print(",\"Length\":");
   Serial.print(len);
@@ -57,24 +182,401 @@ void receiveCANMessage() {
   Serial.print(",\"Data\":[");
   for (uint8_t i = 0; i < len; i++) {
     if(i != 0) Serial.print(",");
-    Serial.print(data[i]);
+    Serial.print(frame.data[i]);
   }
-  Serial.println("]}");
+  Serial.print("],\"T\":");
+  Serial.print(frame.timestamp);
+  Serial.println("}");
 }
 
+void writeLE32(uint8_t *out, uint32_t value) {
+  out[0] = value & 0xFF;
+  out[1] = (value >> 8) & 0xFF;
+  out[2] = (value >> 16) & 0xFF;
+  out[3] = (value >> 24) & 0xFF;
+}
 
-void sendCANMessage() {
-  // Prompt the user to enter a CAN message in the format: <ID>,<LEN>,<DATA1>,<DATA2>,...
-  Serial.println("Enter message in format: <ID>,<LEN>,<DATA1>,<DATA2>,...");
+void sendBinaryFrame(const RxFrame &frame) {
+  // Fixed-size record: type, ID (LE), flags, DLC, 8 data bytes, micros() (LE), checksum
+  uint8_t record[RECORD_SIZE] = {0};
+  record[0] = RECORD_FRAME_TS;
+  writeLE32(record + 1, frame.id);
+  record[5] = frame.flags;
+  record[6] = frame.dlc;
+  if (!(frame.flags & FLAG_RTR)) {
+    for (uint8_t i = 0; i < frame.dlc && i < 8; i++) {
+      record[7 + i] = frame.data[i];
+    }
+  }
+  writeLE32(record + 15, frame.timestamp);
+  sendRecord(record, RECORD_SIZE);
+}
+
+// Appends the checksum to the last byte and writes the record COBS-encoded with its delimiter
+void sendRecord(uint8_t *record, uint8_t size) {
+  uint8_t sum = 0;
+  for (uint8_t i = 0; i < size - 1; i++) {
+    sum += record[i];
+  }
+  record[size - 1] = sum;
+
+  // COBS-encode so 0x00 only ever appears as the record delimiter
+  uint8_t encoded[RECORD_SIZE + 2];
+  uint8_t codeIndex = 0;
+  uint8_t outIndex = 1;
+  uint8_t code = 1;
+  for (uint8_t i = 0; i < size; i++) {
+    if (record[i] == 0) {
+      encoded[codeIndex] = code;
+      codeIndex = outIndex++;
+      code = 1;
+    } else {
+      encoded[outIndex++] = record[i];
+      code++;
+    }
+  }
+  encoded[codeIndex] = code;
+  encoded[outIndex++] = 0x00;
+
+  Serial.write(encoded, outIndex);
+}
+
+// Text diagnostics would corrupt the record stream, so only print them in JSON mode
+void printStatus(const char *message) {
+  if (!binaryMode) {
+    Serial.println(message);
+  }
+}
+
+void handleCommand(String command) {
+  if (command == "!BIN") {
+    if (binaryMode) {
+      // A text line would corrupt the record stream; acknowledge a renegotiation with a record
+      uint8_t record[ACK_RECORD_SIZE] = {RECORD_ACK};
+      sendRecord(record, ACK_RECORD_SIZE);
+    } else {
+      Serial.println("OK BIN");
+      binaryMode = true;
+    }
+  } else if (command == "!TXT") {
+    binaryMode = false;
+    Serial.println("OK TXT");
+  } else if (command.startsWith("!CYC")) {
+    handleCyclicCommand(command);
+  } else if (command.startsWith("!FILTER")) {
+    handleFilterCommand(command);
+  } else {
+    printStatus("Unknown command.");
+  }
+}
+
+// Remove and return the text up to the next comma
+String nextField(String &rest) {
+  int comma = rest.indexOf(',');
+  String field = comma == -1 ? rest : rest.substring(0, comma);
+  rest = comma == -1 ? "" : rest.substring(comma + 1);
+  field.trim();
+  return field;
+}
 
-  // Read the user input from the serial port until a newline character
-  String input = Serial.readStringUntil('\n');
+// Parse "<LEN>,<DATA1>,..." (hex data bytes) into an entry's payload
+bool parseCyclicPayload(String &rest, CyclicEntry &entry) {
+  uint8_t len = (uint8_t)nextField(rest).toInt();
+  if (len > 8) {
+    return false;
+  }
+  for (uint8_t i = 0; i < len; i++) {
+    entry.data[i] = (uint8_t)strtoul(nextField(rest).c_str(), NULL, 16);
+  }
+  entry.len = len;
+  return true;
+}
+
+// !CYCSET <SLOT>,<PERIOD_US>,<PHASE_US>,<ID>,<LEN>,<DATA1>,...   add or replace an entry
+// !CYCDATA <SLOT>,<LEN>,<DATA1>,...                               change the payload, keep the timing
+// !CYCDEL <SLOT>, !CYCCLR, !CYCSTART, !CYCSTOP
+void handleCyclicCommand(String command) {
+  int space = command.indexOf(' ');
+  String verb = space == -1 ? command : command.substring(0, space);
+  String rest = space == -1 ? "" : command.substring(space + 1);
+
+  if (verb == "!CYCSTART") {
+    uint32_t now = micros();
+    for (uint8_t i = 0; i < MAX_CYCLIC; i++) {
+      cyclicTable[i].nextDue = now + cyclicTable[i].phase;
+    }
+    cyclicRunning = true;
+  } else if (verb == "!CYCSTOP") {
+    cyclicRunning = false;
+  } else if (verb == "!CYCCLR") {
+    for (uint8_t i = 0; i < MAX_CYCLIC; i++) {
+      cyclicTable[i].active = false;
+    }
+  } else {
+    long slot = nextField(rest).toInt();
+    if (slot < 0 || slot >= MAX_CYCLIC) {
+      printStatus("Invalid cyclic slot.");
+      return;
+    }
+    CyclicEntry &entry = cyclicTable[slot];
+
+    if (verb == "!CYCSET") {
+      uint32_t period = strtoul(nextField(rest).c_str(), NULL, 10);
+      uint32_t phase = strtoul(nextField(rest).c_str(), NULL, 10);
+      uint32_t id = strtoul(nextField(rest).c_str(), NULL, 16);
+      entry.active = false;
+      if (period == 0 || !parseCyclicPayload(rest, entry)) {
+        printStatus("Invalid cyclic entry.");
+        return;
+      }
+      entry.id = id;
+      entry.period = period;
+      entry.phase = phase;
+      entry.nextDue = micros() + phase;
+      entry.active = true;
+    } else if (verb == "!CYCDATA") {
+      if (!parseCyclicPayload(rest, entry)) {
+        printStatus("Invalid cyclic payload.");
+        return;
+      }
+    } else if (verb == "!CYCDEL") {
+      entry.active = false;
+    } else {
+      printStatus("Unknown command.");
+      return;
+    }
+  }
+
+  printStatus("OK CYC");
+}
+
+uint8_t readMcpRegister(uint8_t address) {
+  SPI.beginTransaction(SPISettings(MCP_SPI_CLOCK, MSBFIRST, SPI_MODE0));
+  digitalWrite(CS_PIN, LOW);
+  SPI.transfer(MCP_READ);
+  SPI.transfer(address);
+  uint8_t value = SPI.transfer(0x00);
+  digitalWrite(CS_PIN, HIGH);
+  SPI.endTransaction();
+  return value;
+}
+
+void writeMcpRegisters(uint8_t address, const uint8_t *values, uint8_t count) {
+  SPI.beginTransaction(SPISettings(MCP_SPI_CLOCK, MSBFIRST, SPI_MODE0));
+  digitalWrite(CS_PIN, LOW);
+  SPI.transfer(MCP_WRITE);
+  SPI.transfer(address);
+  for (uint8_t i = 0; i < count; i++) {
+    SPI.transfer(values[i]);
+  }
+  digitalWrite(CS_PIN, HIGH);
+  SPI.endTransaction();
+}
+
+void writeMcpRegister(uint8_t address, uint8_t value) {
+  writeMcpRegisters(address, &value, 1);
+}
+
+bool setMcpMode(uint8_t mode) {
+  uint8_t control = readMcpRegister(MCP_CANCTRL);
+  writeMcpRegister(MCP_CANCTRL, (control & ~MCP_MODE_MASK) | mode);
+  for (uint8_t attempt = 0; attempt < 100; attempt++) {
+    if ((readMcpRegister(MCP_CANSTAT) & MCP_MODE_MASK) == mode) {
+      return true;
+    }
+    delayMicroseconds(100);
+  }
+  return false;
+}
+
+// Mask and filter registers share one layout: SIDH, SIDL (with EXIDE), EID8, EID0
+void writeIdRegisters(uint8_t address, uint32_t id, bool extended) {
+  uint8_t registers[4];
+  if (extended) {
+    registers[0] = id >> 21;
+    registers[1] = ((id >> 13) & 0xE0) | 0x08 | ((id >> 16) & 0x03);
+    registers[2] = (id >> 8) & 0xFF;
+    registers[3] = id & 0xFF;
+  } else {
+    // EID bits would be matched against the first two data bytes of standard frames
+    registers[0] = id >> 3;
+    registers[1] = (id << 5) & 0xE0;
+    registers[2] = 0;
+    registers[3] = 0;
+  }
+  writeMcpRegisters(address, registers, 4);
+}
+
+// !FILTER <EXT>,<RXM0>,<RXM1>,<RXF0>,...,<RXF5>   (hex) program the acceptance filters
+// !FILTER OFF                                     forward every frame again
+void handleFilterCommand(String command) {
+  String rest = command.substring(7);
+  rest.trim();
+
+  uint8_t previousMode = readMcpRegister(MCP_CANSTAT) & MCP_MODE_MASK;
+  if (!setMcpMode(MCP_MODE_CONFIG)) {
+    printStatus("Error entering configuration mode.");
+    return;
+  }
+
+  if (rest == "OFF") {
+    writeMcpRegister(MCP_RXB0CTRL, RXBCTRL_FILTERS_OFF);
+    writeMcpRegister(MCP_RXB1CTRL, RXBCTRL_FILTERS_OFF);
+  } else {
+    bool extended = nextField(rest).toInt() != 0;
+    writeIdRegisters(MCP_RXM0, strtoul(nextField(rest).c_str(), NULL, 16), extended);
+    writeIdRegisters(MCP_RXM1, strtoul(nextField(rest).c_str(), NULL, 16), extended);
+    for (uint8_t i = 0; i < 6; i++) {
+      writeIdRegisters(FILTER_REGISTERS[i], strtoul(nextField(rest).c_str(), NULL, 16), extended);
+    }
+    // Let buffer 0 roll over into buffer 1 so a burst matching RXF0/RXF1 is not dropped
+    writeMcpRegister(MCP_RXB0CTRL, RXBCTRL_FILTERS_ON | RXB0CTRL_BUKT);
+    writeMcpRegister(MCP_RXB1CTRL, RXBCTRL_FILTERS_ON);
+  }
+
+  if (!setMcpMode(previousMode)) {
+    printStatus("Error leaving configuration mode.");
+    return;
+  }
+  printStatus("OK FILTER");
+}
+
+void modifyMcpRegister(uint8_t address, uint8_t mask, uint8_t value) {
+  SPI.beginTransaction(SPISettings(MCP_SPI_CLOCK, MSBFIRST, SPI_MODE0));
+  digitalWrite(CS_PIN, LOW);
+  SPI.transfer(MCP_BIT_MODIFY);
+  SPI.transfer(address);
+  SPI.transfer(mask);
+  SPI.transfer(value);
+  digitalWrite(CS_PIN, HIGH);
+  SPI.endTransaction();
+}
+
+// Overflow and error flags latch in the MCP2515, so polling them every few ms counts each event once
+void pollErrorCounters() {
+  uint32_t now = millis();
+  if (now - lastErrorPoll < ERROR_POLL_MS) {
+    return;
+  }
+  lastErrorPoll = now;
+
+  uint8_t eflg = readMcpRegister(MCP_EFLG);
+  uint8_t overflow = eflg & (EFLG_RX0OVR | EFLG_RX1OVR);
+  if (overflow) {
+    rxOverflows += (overflow & EFLG_RX0OVR ? 1 : 0) + (overflow & EFLG_RX1OVR ? 1 : 0);
+    modifyMcpRegister(MCP_EFLG, overflow, 0);
+  }
+  if (readMcpRegister(MCP_CANINTF) & CANINTF_MERRF) {
+    errorFrames++;
+    modifyMcpRegister(MCP_CANINTF, CANINTF_MERRF, 0);
+  }
+
+  if (now - lastStatusReport >= STATUS_INTERVAL_MS) {
+    lastStatusReport = now;
+    reportStatus(eflg);
+  }
+}
+
+void reportStatus(uint8_t eflg) {
+  uint8_t tec = readMcpRegister(MCP_TEC);
+  uint8_t rec = readMcpRegister(MCP_REC);
+  noInterrupts();
+  uint32_t dropped = droppedFrames;
+  interrupts();
+
+  if (binaryMode) {
+    // type, RX overflows, error frames, dropped frames (all LE), TEC, REC, EFLG, checksum
+    uint8_t record[STATUS_RECORD_SIZE] = {0};
+    record[0] = RECORD_STATUS;
+    writeLE32(record + 1, rxOverflows);
+    writeLE32(record + 5, errorFrames);
+    writeLE32(record + 9, dropped);
+    record[13] = tec;
+    record[14] = rec;
+    record[15] = eflg;
+    sendRecord(record, STATUS_RECORD_SIZE);
+    return;
+  }
+
+  Serial.print("{\"Status\":{\"RxOverflow\":");
+  Serial.print(rxOverflows);
+  Serial.print(",\"ErrorFrames\":");
+  Serial.print(errorFrames);
+  Serial.print(",\"Dropped\":");
+  Serial.print(dropped);
+  Serial.print(",\"TEC\":");
+  Serial.print(tec);
+  Serial.print(",\"REC\":");
+  Serial.print(rec);
+  Serial.print(",\"EFLG\":");
+  Serial.print(eflg);
+  Serial.println("}}");
+}
+
+void serviceCyclic() {
+  if (!cyclicRunning) {
+    return;
+  }
+
+  uint32_t now = micros();
+  for (uint8_t i = 0; i < MAX_CYCLIC; i++) {
+    CyclicEntry &entry = cyclicTable[i];
+    // Signed difference keeps the comparison correct across the micros() wrap
+    if (!entry.active || (int32_t)(now - entry.nextDue) < 0) {
+      continue;
+    }
+
+    if (mcp.beginPacket(entry.id)) {
+      for (uint8_t b = 0; b < entry.len; b++) {
+        mcp.write(entry.data[b]);
+      }
+      mcp.endPacket();
+    }
+
+    // Stay on the original grid; if a whole period was lost, skip it instead of bursting
+    entry.nextDue += entry.period;
+    if ((int32_t)(now - entry.nextDue) >= 0) {
+      entry.nextDue = now + entry.period;
+    }
+  }
+}
+
+
+void pollSerialInput() {
+  while (Serial.available()) {
+    char c = Serial.read();
+    if (c == '\n') {
+      bool complete = !inputOverflow;
+      inputBuffer[inputLength] = '\0';
+      inputLength = 0;
+      inputOverflow = false;
+      if (complete) {
+        sendCANMessage(String(inputBuffer));
+      }
+      // One command per pass keeps reception and cyclic frames serviced between commands
+      return;
+    }
+    if (inputLength < INPUT_BUFFER_SIZE - 1) {
+      inputBuffer[inputLength++] = c;
+    } else {
+      inputOverflow = true;
+    }
+  }
+}
+
+void sendCANMessage(String input) {
   input.trim(); // Remove any leading or trailing whitespace
 
+  // Host commands start with '!'
+  if (input.startsWith("!")) {
+    handleCommand(input);
+    return;
+  }
+
   // Parse the input to extract the ID
   int firstComma = input.indexOf(','); // Find the position of the first comma
   if (firstComma == -1) { // If no comma is found, the format is invalid
-    Serial.println("Invalid format. Use <ID>,<LEN>,<DATA1>,<DATA2>,...");
+    printStatus("Invalid format. Use <ID>,<LEN>,<DATA1>,<DATA2>,...");
     return; // Exit the function
   }
 
@@ -88,7 +590,7 @@ void sendCANMessage() {
   // Parse the length of the CAN message
   int secondComma = rest.indexOf(','); // Find the position of the second comma
   if (secondComma == -1) { // If no second comma is found, data bytes are missing
-    Serial.println("Invalid format. Missing data bytes.");
+    printStatus("Invalid format. Missing data bytes.");
     return; // Exit the function
   }
 
@@ -96,7 +598,7 @@ void sendCANMessage() {
   String lenStr = rest.substring(0, secondComma);
   uint8_t len = (uint8_t)lenStr.toInt(); // Convert the length from a string to an integer
   if (len > 8) { // Check if the length exceeds the maximum allowed (8 bytes for CAN)
-    Serial.println("Length exceeds maximum of 8 bytes.");
+    printStatus("Length exceeds maximum of 8 bytes.");
     return; // Exit the function
   }
 
@@ -123,7 +625,7 @@ void sendCANMessage() {
     }
     mcp.endPacket(); // Finalize and send the packet
   } else { // If starting the CAN packet fails, print an error message
-    Serial.println("Error starting CAN packet.");
+    printStatus("Error starting CAN packet.");
   }
 }
 
@@ -0,0 +1,164 @@
+"""
+Compute MCP2515 acceptance masks and filters for a set of CAN IDs.
+
+The MCP2515 has two masks: RXM0 is shared by filters RXF0-RXF1 (receive
+buffer 0) and RXM1 by RXF2-RXF5 (buffer 1). A frame is accepted when
+``id & mask == filter & mask`` for any filter, so one mask/filter pair
+accepts a power-of-two sized set of IDs. compute_filters() covers the
+requested IDs exactly where the hardware allows and otherwise picks the
+assignment that lets the fewest unwanted IDs through.
+
+Ranges are first split into aligned blocks (each exactly one mask/filter
+pair), then the closest blocks are merged greedily until the set fits the
+2 + 4 filter layout.
+"""
+import itertools
+from collections import namedtuple
+
+STANDARD_BITS = 11
+EXTENDED_BITS = 29
+
+MASK0_FILTERS = 2
+MASK1_FILTERS = 4
+MAX_FILTERS = MASK0_FILTERS + MASK1_FILTERS
+
+# Above this many blocks, neighbours in sorted order are merged first to bound the O(n^3) greedy pass
+PREMERGE_LIMIT = 48
+
+# masks: (RXM0, RXM1); filters: (RXF0..RXF5); accepted: upper bound on IDs that pass
+FilterConfig = namedtuple('FilterConfig', ['extended', 'masks', 'filters', 'accepted', 'requested'])
+
+
+def parse_id_list(text):
+    """
+    Parse "100-10F, 7E8, 0x18DAF100" (hex, ranges inclusive) into [(low, high), ...].
+    """
+    ranges = []
+    for part in text.replace(';', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            low, high = (int(value.strip(), 16) for value in part.split('-', 1))
+        else:
+            low = high = int(part, 16)
+        if low > high:
+            low, high = high, low
+        ranges.append((low, high))
+    return ranges
+
+
+def aligned_blocks(low, high, width):
+    """Split [low, high] into the fewest (value, mask) pairs that match it exactly."""
+    full = (1 << width) - 1
+    blocks = []
+    while low <= high:
+        size = low & -low if low else 1 << width
+        while size > high - low + 1:
+            size >>= 1
+        blocks.append((low, full & ~(size - 1)))
+        low += size
+    return blocks
+
+
+def _merge(a, b):
+    """Smallest single (value, mask) pair covering both pairs."""
+    mask = a[1] & b[1] & ~(a[0] ^ b[0])
+    return a[0] & mask, mask
+
+
+def _size(mask, width):
+    return 1 << (width - bin(mask).count('1'))
+
+
+def _group_cost(blocks, width):
+    """IDs accepted by a mask shared by these blocks, each block becoming one filter."""
+    if not blocks:
+        return 0, None, []
+    mask = blocks[0][1]
+    for value, block_mask in blocks[1:]:
+        mask &= block_mask
+    values = sorted({value & mask for value, _ in blocks})
+    return len(values) * _size(mask, width), mask, values
+
+
+def _reduce(blocks, width, target):
+    """Greedily merge the pair of blocks whose union adds the fewest IDs until target remain."""
+    blocks = list(blocks)
+
+    while len(blocks) > max(target, PREMERGE_LIMIT):
+        blocks.sort()
+        best = min(range(len(blocks) - 1),
+                   key=lambda i: _size(_merge(blocks[i], blocks[i + 1])[1], width))
+        blocks[best:best + 2] = [_merge(blocks[best], blocks[best + 1])]
+
+    while len(blocks) > target:
+        best = None
+        for i, j in itertools.combinations(range(len(blocks)), 2):
+            merged = _merge(blocks[i], blocks[j])
+            # A merge may swallow other blocks too; count what it adds beyond them
+            growth = _size(merged[1], width) - _size(blocks[i][1], width) - _size(blocks[j][1], width)
+            if best is None or growth < best[0]:
+                best = (growth, i, j, merged)
+        _, i, j, merged = best
+        blocks = [block for k, block in enumerate(blocks) if k not in (i, j)
+                  if block[0] & merged[1] != merged[0] or block[1] & merged[1] != merged[1]]
+        blocks.append(merged)
+    return blocks
+
+
+def _best_assignment(blocks, width):
+    """Split at most MAX_FILTERS blocks between the 2-filter and 4-filter masks."""
+    best = None
+    for count in range(0, MASK0_FILTERS + 1):
+        if len(blocks) - count > MASK1_FILTERS:
+            continue
+        for group0 in itertools.combinations(range(len(blocks)), count):
+            first = [blocks[i] for i in group0]
+            second = [blocks[i] for i in range(len(blocks)) if i not in group0]
+            cost0, mask0, values0 = _group_cost(first, width)
+            cost1, mask1, values1 = _group_cost(second, width)
+            if best is None or cost0 + cost1 < best[0]:
+                best = (cost0 + cost1, (mask0, values0), (mask1, values1))
+    return best
+
+
+def compute_filters(ranges, extended=False):
+    """
+    :param ranges: iterable of (low, high) ID ranges, or of single IDs
+    :param extended: bool - program the filters for 29-bit IDs
+    :return: FilterConfig
+    """
+    width = EXTENDED_BITS if extended else STANDARD_BITS
+    full = (1 << width) - 1
+
+    blocks = []
+    requested = 0
+    for entry in ranges:
+        low, high = entry if isinstance(entry, tuple) else (entry, entry)
+        if high > full or low < 0:
+            raise ValueError(f"ID 0x{high:X} does not fit in {width} bits")
+        blocks.extend(aligned_blocks(low, high, width))
+        requested += high - low + 1
+    if not blocks:
+        raise ValueError("No IDs to filter on")
+
+    blocks = sorted(set(blocks))
+    best = None
+    # Fewer, wider filters can still fit the shared masks better, so try every count
+    for target in range(min(MAX_FILTERS, len(blocks)), 0, -1):
+        blocks = _reduce(blocks, width, target)
+        candidate = _best_assignment(blocks, width)
+        if best is None or candidate[0] < best[0]:
+            best = candidate
+
+    accepted, (mask0, values0), (mask1, values1) = best
+    # An unused buffer must still match something; give it an exact match on a filter of the other
+    if mask0 is None:
+        mask0, values0 = full, [values1[0]]
+    if mask1 is None:
+        mask1, values1 = full, [values0[0]]
+    # Unused filter slots repeat a used one so they never widen the accepted set
+    filters0 = (values0 * MASK0_FILTERS)[:MASK0_FILTERS]
+    filters1 = (values1 * MASK1_FILTERS)[:MASK1_FILTERS]
+    return FilterConfig(extended, (mask0, mask1), tuple(filters0 + filters1), accepted, requested)
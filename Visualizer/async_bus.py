@@ -0,0 +1,318 @@
+"""
+asyncio access to received frames, for test scripts and other Python code.
+
+    bus = await open_bus('sim://?ids=20&rate=1000')
+    async for frame in bus.frames(ids=[0x100, 0x101], timeout=1.0):
+        print(frame['ID'], frame['Data'])
+    response = await bus.wait_for(0x7E8, lambda frame: frame['Data'][1] == 0x41, timeout=0.5)
+    await bus.send(0x7DF, [0x02, 0x01, 0x0C])
+    await bus.close()
+
+The receiver's reader thread hands every delivered batch to a
+SubscriberTable, which looks up each frame's ID in a dict of subscriptions,
+so a consumer only ever sees the IDs it asked for. Every subscription
+has its own bounded queue. When a consumer falls behind, frames are dropped
+according to its policy (DROP_OLDEST or DROP_NEWEST) and counted in
+``dropped``; the reader never waits for a consumer. The event loop is woken
+at most once per batch per waiting subscription.
+
+Frames are the receiver's message dicts, shared with the GUI, recorder and
+other subscribers: treat them as read-only.
+"""
+import asyncio
+import collections
+import threading
+import weakref
+from can_receiver import CANMessageReceiver
+from multi_receiver import MultiReceiver
+from process_receiver import ProcessReceiver
+from serial_protocol import format_send_command
+
+DEFAULT_QUEUE_SIZE = 10000
+# Queue-full policies: keep the newest frames, or keep the queued ones and drop what arrives
+DROP_OLDEST = 'oldest'
+DROP_NEWEST = 'newest'
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class Subscription:
+    """
+    Bounded queue of the frames of some IDs; an async iterator over them.
+    Created by AsyncBus.frames(). Dropping the last reference (e.g. breaking
+    out of ``async for``) unsubscribes it.
+    :param ids: set of CAN IDs, or None for every frame
+    :param channel: int - only frames of this channel (multi-interface receivers), or None
+    :param timeout: float - iteration ends when no frame arrives for this long (None to wait forever)
+    """
+
+    def __init__(self, ids=None, channel=None, timeout=None, max_size=DEFAULT_QUEUE_SIZE, policy=DROP_OLDEST):
+        if policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.ids = ids
+        self.channel = channel
+        self.timeout = timeout
+        self.max_size = max_size
+        self.policy = policy
+        self.loop = asyncio.get_running_loop()
+        self.queue = collections.deque(maxlen=max_size if policy == DROP_OLDEST else None)
+        self.lock = threading.Lock()
+        self.waiter = None
+        self.closed = False
+        self.table = None
+        self.dropped = 0
+
+    def put_many(self, messages):
+        """Called on the reader thread; never blocks."""
+        with self.lock:
+            if self.closed:
+                return
+            room = self.max_size - len(self.queue)
+            if len(messages) > room:
+                self.dropped += len(messages) - room
+                if self.policy == DROP_NEWEST:
+                    messages = messages[:room]
+            self.queue.extend(messages)
+            waiter, self.waiter = self.waiter, None
+        if waiter is not None:
+            self.loop.call_soon_threadsafe(_wake, waiter)
+
+    async def get(self, timeout=None):
+        """
+        Next frame, oldest first.
+        :return: message dict, or None once the subscription is closed and empty
+        :raises asyncio.TimeoutError: if no frame arrived within timeout
+        """
+        deadline = None if timeout is None else self.loop.time() + timeout
+        while True:
+            with self.lock:
+                if self.queue:
+                    return self.queue.popleft()
+                if self.closed:
+                    return None
+                waiter = self.waiter = self.loop.create_future()
+            remaining = None if deadline is None else max(0.0, deadline - self.loop.time())
+            await asyncio.wait_for(waiter, remaining)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            message = await self.get(self.timeout)
+        except asyncio.TimeoutError:
+            message = None
+        if message is None:
+            self.close()
+            raise StopAsyncIteration
+        return message
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unsubscribe; frames already queued can still be read."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            waiter, self.waiter = self.waiter, None
+        if waiter is not None:
+            self.loop.call_soon_threadsafe(_wake, waiter)
+        if self.table is not None:
+            self.table.remove(self)
+
+    def __len__(self):
+        return len(self.queue)
+
+
+class SubscriberTable:
+    """
+    CAN ID -> subscriptions, consulted by the receiver's deliver().
+    The dict is rebuilt on every (un)subscribe and swapped in whole, so the
+    reader thread reads it without taking a lock. Subscriptions are held
+    through weak references.
+    """
+
+    def __init__(self):
+        # Reentrant: a weakref callback may run while the table is being rebuilt
+        self.lock = threading.RLock()
+        self.subscriptions = []
+        self.by_id = {}
+        self.everything = ()
+
+    def add(self, subscription):
+        subscription.table = self
+        with self.lock:
+            self.subscriptions.append(weakref.ref(subscription, self._discard))
+            self._rebuild()
+
+    def remove(self, subscription):
+        with self.lock:
+            self.subscriptions = [ref for ref in self.subscriptions if ref() not in (None, subscription)]
+            self._rebuild()
+
+    def _discard(self, dead_ref):
+        # Weakref callback: the subscription was garbage collected without close()
+        with self.lock:
+            self.subscriptions = [ref for ref in self.subscriptions if ref is not dead_ref]
+            self._rebuild()
+
+    def _rebuild(self):
+        by_id = {}
+        everything = []
+        for ref in self.subscriptions:
+            subscription = ref()
+            if subscription is None:
+                continue
+            if subscription.ids is None:
+                everything.append(ref)
+            else:
+                for can_id in subscription.ids:
+                    by_id[can_id] = by_id.get(can_id, ()) + (ref,)
+        self.by_id = by_id
+        self.everything = tuple(everything)
+
+    def dispatch(self, messages):
+        """Hand a delivered batch to the subscriptions that asked for its IDs (reader thread)."""
+        by_id = self.by_id
+        everything = self.everything
+        batches = {}
+        if by_id:
+            for message in messages:
+                refs = by_id.get(message['ID'])
+                if refs is not None:
+                    for ref in refs:
+                        batch = batches.get(ref)
+                        if batch is None:
+                            batch = batches[ref] = []
+                        batch.append(message)
+        for ref in everything:
+            batches[ref] = messages
+
+        for ref, batch in batches.items():
+            subscription = ref()
+            if subscription is None:
+                continue
+            if subscription.channel is not None:
+                batch = [message for message in batch if message.get('Channel') == subscription.channel]
+            if batch:
+                subscription.put_many(batch)
+
+    def close(self):
+        for ref in list(self.subscriptions):
+            subscription = ref()
+            if subscription is not None:
+                subscription.close()
+
+
+class AsyncBus:
+    """
+    asyncio front end of a receiver (CANMessageReceiver or MultiReceiver).
+    :param max_queue: int - default queue size of each subscription
+    :param policy: DROP_OLDEST or DROP_NEWEST - default for full subscription queues
+    """
+
+    def __init__(self, receiver, max_queue=DEFAULT_QUEUE_SIZE, policy=DROP_OLDEST):
+        if isinstance(receiver, ProcessReceiver):
+            raise ValueError("Receiver process mode is not supported; its frames only reach the GUI")
+        self.receiver = receiver
+        self.max_queue = max_queue
+        self.policy = policy
+        self.table = SubscriberTable()
+        receiver.subscribers = self.table
+
+    def frames(self, ids=None, timeout=None, channel=None, max_queue=None, policy=None):
+        """
+        Subscribe to frames; the queue starts filling right away, before iteration starts.
+        :param ids: CAN ID or iterable of IDs, None for every frame
+        :param timeout: float - stop iterating when no frame arrives for this long
+        :param channel: int - only frames of this channel
+        :return: Subscription (async iterator of message dicts)
+        """
+        if isinstance(ids, int):
+            ids = [ids]
+        subscription = Subscription(None if ids is None else frozenset(ids), channel, timeout,
+                                    max_queue or self.max_queue, policy or self.policy)
+        self.table.add(subscription)
+        return subscription
+
+    def wait_for(self, can_id, predicate=None, timeout=None, channel=None):
+        """
+        Wait for the next frame of an ID that satisfies predicate. Subscribes
+        when called, so a wait_for() created before send() does not miss a
+        quick response.
+        :param predicate: callable(message) -> bool, None to accept any frame
+        :return: awaitable returning the message dict
+        :raises asyncio.TimeoutError: if no matching frame arrived within timeout
+        :raises ConnectionError: if the bus was closed while waiting
+        """
+        subscription = self.frames(can_id, channel=channel)
+        return self._wait(subscription, predicate, timeout)
+
+    async def _wait(self, subscription, predicate, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        try:
+            while True:
+                remaining = None if deadline is None else max(0.0, deadline - loop.time())
+                message = await subscription.get(remaining)
+                if message is None:
+                    raise ConnectionError("Bus closed")
+                if predicate is None or predicate(message):
+                    return message
+        finally:
+            subscription.close()
+
+    async def send(self, can_id, data):
+        """
+        Send one frame; the serial write runs in the default executor.
+        :return: bool - False if the frame could not be written
+        """
+        if not 1 <= len(data) <= 8:
+            raise ValueError("Data must be 1 to 8 bytes")
+        return await self.write(format_send_command(can_id, list(data)))
+
+    async def write(self, payload):
+        """Write pre-formatted command bytes, e.g. from serial_protocol."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.receiver.write_raw, payload)
+
+    async def close(self):
+        """End every subscription and stop the receiver."""
+        self.table.close()
+        if self.receiver.subscribers is self.table:
+            self.receiver.subscribers = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.receiver.stop)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+async def open_bus(ports, baudrate=250000, binary=True, can_bitrate=250000, **options):
+    """
+    Create a receiver for one port (or a list of ports), connect it and wrap it in an AsyncBus.
+    :param options: AsyncBus options (max_queue, policy)
+    :raises ConnectionError: if the port could not be opened
+    """
+    # No GUI drains a frame queue here; frames only go to the subscriptions
+    if isinstance(ports, (list, tuple)):
+        receiver = MultiReceiver(ports, baudrate, binary=binary, can_bitrate=can_bitrate, batched=False)
+    else:
+        receiver = CANMessageReceiver(ports, baudrate, binary=binary, batched=False, can_bitrate=can_bitrate)
+    bus = AsyncBus(receiver, **options)
+    loop = asyncio.get_running_loop()
+    # Negotiating the framing takes up to a few seconds
+    if not await loop.run_in_executor(None, receiver.connect):
+        raise ConnectionError(f"Could not connect to {ports}")
+    return bus
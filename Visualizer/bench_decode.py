@@ -0,0 +1,85 @@
+"""
+Compare the original per-message extraction loop with the vectorized decoder.
+
+    python bench_decode.py --frames 1000000
+"""
+import argparse
+import time
+import numpy as np
+from signal_decoder import INTEL, MOTOROLA, extract_signal
+
+
+def extract_loop(messages, start_byte, start_bit, total_bit_length, is_little_endian=True):
+    """The pre-NumPy GraphTab.extract_multi_bit_value, kept as the baseline."""
+    collected_values = []
+    for msg in messages:
+        if start_byte + (total_bit_length + 7) // 8 > len(msg):
+            continue
+        bytes_needed = (start_bit + total_bit_length + 7) // 8
+        extracted_bytes = msg[start_byte:start_byte + bytes_needed]
+        value = 0
+        if is_little_endian:
+            for i, byte in enumerate(extracted_bytes):
+                value |= (byte << (i * 8))
+        else:
+            for i, byte in enumerate(reversed(extracted_bytes)):
+                value |= (byte << (i * 8))
+        mask = (1 << total_bit_length) - 1
+        value = (value >> start_bit) & mask
+        collected_values.append(value)
+    return collected_values
+
+
+def legacy_motorola_start(start_byte, start_bit, total_bit_length):
+    """DBC start bit (MSB) of the field the old loop reads MSB-first with its LSB at start_bit of the last byte."""
+    bytes_needed = (start_bit + total_bit_length + 7) // 8
+    lsb = (7 - (start_byte + bytes_needed - 1)) * 8 + start_bit
+    msb = lsb + total_bit_length - 1
+    return (7 - msb // 8) * 8 + msb % 8
+
+
+def timed(function, *args, repeat=3, **kwargs):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    payload = rng.integers(0, 256, size=(args.frames, 8), dtype=np.uint8)
+    messages = payload.tolist()
+
+    cases = [
+        ("intel 16 bit @ byte 2", dict(start_byte=2, start_bit=0, total_bit_length=16, is_little_endian=True)),
+        ("motorola 12 bit @ byte 1", dict(start_byte=1, start_bit=0, total_bit_length=12, is_little_endian=False)),
+        ("intel 64 bit", dict(start_byte=0, start_bit=0, total_bit_length=64, is_little_endian=True)),
+    ]
+
+    print(f"{args.frames} frames")
+    print(f"{'signal':28} {'loop (ms)':>12} {'numpy (ms)':>12} {'speedup':>10}")
+    for name, case in cases:
+        loop_time, loop_values = timed(extract_loop, messages, repeat=1, **case)
+
+        byte_order = INTEL if case['is_little_endian'] else MOTOROLA
+        if byte_order == INTEL:
+            start_bit = case['start_byte'] * 8 + case['start_bit']
+        else:
+            start_bit = legacy_motorola_start(case['start_byte'], case['start_bit'], case['total_bit_length'])
+        numpy_time, numpy_values = timed(extract_signal, payload, start_bit, case['total_bit_length'], byte_order)
+
+        if not np.array_equal(np.asarray(loop_values, dtype=np.uint64), numpy_values):
+            raise SystemExit(f"Mismatch for {name}")
+
+        print(f"{name:28} {loop_time * 1000:12.1f} {numpy_time * 1000:12.1f} {loop_time / numpy_time:9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+Reproducible benchmarks for the receive, decode and render paths.
+
+Two kinds of measurement, each run in a fresh subprocess so peak RSS is per case:
+
+* live: the full GUI (offscreen Qt) fed by the simulated bus at a fixed
+  frame rate for --duration seconds, with the table, a live plot and the
+  latency tracking active. Reports delivered throughput, device->GUI
+  latency percentiles, stage times, dropped frames and peak RSS.
+* hotpath: the individual stages as fast as they go on a synthetic stream
+  (StreamParser in binary and JSON mode, process_message, the table update,
+  GraphTab.extract_multi_bit_value and plot_data).
+
+    python bench_pipeline.py --output results.json
+    python bench_pipeline.py --rates 1000 5000 --ids 10 100 --duration 3
+    python bench_pipeline.py --process --output process.json
+    python bench_pipeline.py --compare baseline.json results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+DEFAULT_RATES = [1000, 5000, 10000, 20000]
+DEFAULT_IDS = [10, 100, 500]
+HOTPATH_FRAMES = 100000
+PARSE_CHUNK = 4096
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_qt():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+def run_live(rate, ids, duration, seed, process=False):
+    app = start_qt()
+    from PyQt5.QtCore import QTimer
+    from main_window import CANMessageVisualizer
+
+    window = CANMessageVisualizer(f"sim://?ids={ids}&rate={rate}&dlc=8&seed={seed}", process=process)
+    window.show()
+    receiver = window.receiver
+
+    def start_plot():
+        # Live plot of the first ID once it has been seen, as a user watching a signal would
+        graph = window.graph_tab
+        if graph.id_selector.count():
+            graph.id_selector.setCurrentIndex(0)
+            graph.add_live_trace()
+
+    started = time.perf_counter()
+    QTimer.singleShot(500, start_plot)
+    QTimer.singleShot(int(duration * 1000), app.quit)
+    app.exec_()
+    elapsed = time.perf_counter() - started
+
+    # The shared ring stands in for the frame queue in process mode and goes away with the worker
+    frame_queue = receiver.metrics.frame_queue
+    delivered, max_depth = frame_queue.delivered, frame_queue.max_depth
+    queue_dropped = frame_queue.dropped + receiver.metrics.upstream_dropped
+    receiver.stop()
+    window.refresh_timer.stop()
+    window.graph_tab.live_timer.stop()
+
+    snapshot = receiver.metrics.snapshot()
+    latency = receiver.latency.snapshot()
+    return {
+        'kind': 'live',
+        'process': process,
+        'rate': rate,
+        'ids': ids,
+        'duration': elapsed,
+        'frames_parsed': snapshot['frames'],
+        'frames_delivered': delivered,
+        'throughput': delivered / elapsed,
+        'latency_p50_ms': latency['device_to_gui'].get(50, 0.0),
+        'latency_p99_ms': latency['device_to_gui'].get(99, 0.0),
+        'latency_ms': latency['device_to_gui'],
+        'queue_latency_ms': latency['host_to_gui'],
+        'stages_ms': snapshot['stages'],
+        'queue_max_depth': max_depth,
+        'dropped': queue_dropped + snapshot['parse_errors'] + receiver.device_status.get('Dropped', 0),
+        'parse_errors': snapshot['parse_errors'],
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def synthetic_frames(count, ids, seed):
+    from transport import TrafficConfig, TrafficGenerator
+    generator = TrafficGenerator(TrafficConfig(ids=ids, rate=count, seed=seed))
+    return generator.due(1.0)[:count]
+
+
+def run_hotpath(ids, seed, count=HOTPATH_FRAMES):
+    from serial_protocol import StreamParser, encode_frame
+    from can_receiver import CANMessageReceiver
+
+    frames = synthetic_frames(count, ids, seed)
+    count = len(frames)
+    binary_stream = b''.join(encode_frame(can_id, data, micros=int(due * 1e6)) for due, can_id, data in frames)
+    json_stream = ''.join(f'{{"ID":{can_id},"Length":{len(data)},"Data":{json.dumps(data)},"T":{int(due * 1e6)}}}\r\n'
+                          for due, can_id, data in frames).encode()
+
+    def parse(stream, binary):
+        parser = StreamParser(binary=binary)
+        messages = []
+        for offset in range(0, len(stream), PARSE_CHUNK):
+            messages.extend(parser.feed(stream[offset:offset + PARSE_CHUNK]))
+        return messages
+
+    results = {'kind': 'hotpath', 'ids': ids, 'frames': count}
+    seconds, messages = timed(parse, binary_stream, True)
+    results['parse_binary_fps'] = count / seconds
+    seconds, _ = timed(parse, json_stream, False)
+    results['parse_json_fps'] = count / seconds
+
+    receiver = CANMessageReceiver(None)
+    now = time.time()
+    seconds, _ = timed(lambda: [receiver.process_message(message, now) for message in messages])
+    results['process_fps'] = count / seconds
+
+    # Keep a reference: the widgets below need a live QApplication
+    app = start_qt()
+    from main_window import CANMessageVisualizer
+    window = CANMessageVisualizer()
+    window.refresh_timer.stop()
+    # Batches the size a 30 Hz refresh would see at 10k frames/s
+    batch_size = 333
+    seconds, _ = timed(lambda: [window.update_can_batch(messages[i:i + batch_size])
+                                for i in range(0, count, batch_size)])
+    results['table_update_fps'] = count / seconds
+
+    graph = window.graph_tab
+    graph.id_selector.setCurrentIndex(0)
+    history = window.can_data[graph.id_selector.currentText()]['history']
+    payload = history.last(HOTPATH_FRAMES).payload
+    seconds, _ = timed(graph.extract_multi_bit_value, payload, 2, 0, 16, True)
+    results['extract_ms'] = seconds * 1000
+    seconds, _ = timed(graph.plot_data)
+    results['plot_data_ms'] = seconds * 1000
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def run_child(arguments):
+    """Run one case in a subprocess and return its result dict."""
+    command = [sys.executable, os.path.abspath(__file__)] + arguments
+    output = subprocess.run(command, stdout=subprocess.PIPE, check=True).stdout.decode()
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def compare(baseline_path, current_path):
+    """Print the relative change of every numeric metric between two result files."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    def key(result):
+        return result['kind'], result.get('process', False), result.get('rate'), result['ids']
+
+    previous = {key(result): result for result in baseline['results']}
+    print(f"{baseline.get('revision')} -> {current.get('revision')}")
+    for result in current['results']:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        kind, process, rate, ids = key(result)
+        if process:
+            kind += ' (process)'
+        label = f"{kind} {rate or ''} fr/s x {ids} IDs".replace('  ', ' ')
+        for name, value in result.items():
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or name in ('rate', 'ids'):
+                continue
+            before = old.get(name)
+            if before:
+                print(f"{label:28} {name:20} {before:12.2f} -> {value:12.2f} ({(value - before) / before:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rates', type=int, nargs='+', default=DEFAULT_RATES, help="frames/s for live cases")
+    parser.add_argument('--ids', type=int, nargs='+', default=DEFAULT_IDS, help="distinct ID counts")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds per live case")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write results as JSON")
+    parser.add_argument('--process', action='store_true', help="run the live cases with the receiver process")
+    parser.add_argument('--no-live', action='store_true', help="only run the hot path cases")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help="compare two result files")
+    parser.add_argument('--live-case', nargs=2, type=int, metavar=('RATE', 'IDS'), help=argparse.SUPPRESS)
+    parser.add_argument('--hotpath-case', type=int, metavar='IDS', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.live_case:
+        print(json.dumps(run_live(args.live_case[0], args.live_case[1], args.duration, args.seed, args.process)))
+        return
+    if args.hotpath_case:
+        print(json.dumps(run_hotpath(args.hotpath_case, args.seed)))
+        return
+
+    results = []
+    common = ['--seed', str(args.seed), '--duration', str(args.duration)]
+    for ids in args.ids:
+        result = run_child(['--hotpath-case', str(ids)] + common)
+        results.append(result)
+        print(f"hotpath {ids:4} IDs: parse bin {result['parse_binary_fps']:9.0f} fr/s, "
+              f"json {result['parse_json_fps']:9.0f} fr/s, process {result['process_fps']:9.0f} fr/s, "
+              f"table {result['table_update_fps']:9.0f} fr/s, extract {result['extract_ms']:.1f} ms, "
+              f"plot {result['plot_data_ms']:.1f} ms")
+
+    if not args.no_live:
+        for rate in args.rates:
+            for ids in args.ids:
+                result = run_child(['--live-case', str(rate), str(ids)] + common
+                                   + (['--process'] if args.process else []))
+                results.append(result)
+                print(f"live {rate:6} fr/s x {ids:4} IDs: {result['throughput']:8.0f} fr/s delivered, "
+                      f"p50 {result['latency_p50_ms']:6.1f} ms, p99 {result['latency_p99_ms']:6.1f} ms, "
+                      f"dropped {result['dropped']}, RSS {result['peak_rss_mb'] or 0:.0f} MB")
+
+    if args.output:
+        report = {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'arguments': {'rates': args.rates, 'ids': args.ids, 'duration': args.duration, 'seed': args.seed,
+                          'process': args.process},
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
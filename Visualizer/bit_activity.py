@@ -0,0 +1,257 @@
+"""
+Per-ID bit statistics for finding signals in unknown frames.
+
+For every CAN ID, BitActivity keeps:
+- how often each of the 64 payload bits toggled,
+- when each bit last changed,
+- the minimum and maximum of each byte.
+
+All IDs share one set of 2-D arrays with one row per ID. A batch of frames
+from many IDs is grouped by ID and XORed with the preceding payload of the
+same ID, so an update is a handful of array operations whatever the number of
+IDs or frames.
+
+Bit numbers follow signal_decoder: bit ``b`` of byte ``B`` is ``B * 8 + b``.
+find_candidates() guesses fields from the toggle rates (toggles per frame-to-frame
+transition):
+- counter: a bit that toggles on nearly every frame, each higher bit about half as often
+- checksum: a byte or nibble whose bits all toggle about every other frame
+- analog: a run of bits toggling less often towards the most significant end,
+  possibly continuing into the next byte (Intel) or the previous one (Motorola)
+"""
+from collections import namedtuple
+import numpy as np
+from signal_decoder import INTEL, MOTOROLA
+
+COUNTER = 'counter'
+CHECKSUM = 'checksum'
+ANALOG = 'analog'
+
+# start_bit follows DBC numbering: the LSB for Intel, the MSB for Motorola
+FieldCandidate = namedtuple('FieldCandidate', ['kind', 'start_bit', 'length', 'byte_order'])
+
+# Too few transitions make every rate look special
+MIN_TRANSITIONS = 16
+COUNTER_RATE = 0.9
+# Toggle rate ratio between neighbouring counter bits
+COUNTER_RATIO = (0.3, 0.7)
+# Toggle rates of a checksum's bits
+RANDOM_RATE = (0.3, 0.7)
+# Largest rate increase tolerated from one analog bit to the next more significant one
+ANALOG_TREND = 1.5
+MIN_ANALOG_BITS = 4
+
+INITIAL_ROWS = 64
+
+
+class BitActivity:
+    """Bit statistics of all IDs, keyed like the GUI's can_data."""
+
+    def __init__(self):
+        self.slots = {}
+        self.keys = []
+        self._allocate(INITIAL_ROWS)
+
+    def _allocate(self, rows):
+        count = len(self.keys)
+        arrays = {
+            'frames': np.zeros(rows, dtype=np.int64),
+            'toggles': np.zeros((rows, 64), dtype=np.int64),
+            'last_change': np.full((rows, 64), np.nan),
+            'last_time': np.full(rows, np.nan),
+            'byte_min': np.full((rows, 8), 0xFF, dtype=np.uint8),
+            'byte_max': np.zeros((rows, 8), dtype=np.uint8),
+            'max_dlc': np.zeros(rows, dtype=np.uint8),
+            'previous': np.zeros((rows, 8), dtype=np.uint8),
+        }
+        for name, array in arrays.items():
+            if count:
+                array[:count] = getattr(self, name)[:count]
+            setattr(self, name, array)
+
+    def slot(self, key):
+        """Row of an ID, added on first use."""
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = len(self.keys)
+            if slot == len(self.frames):
+                self._allocate(2 * slot)
+            self.slots[key] = slot
+            self.keys.append(key)
+        return slot
+
+    def update(self, slots, payload, dlc, timestamps):
+        """
+        Add a batch of frames.
+        :param slots: n row numbers from slot()
+        :param payload: (n, 8) uint8 array, zero-padded past each DLC
+        :param dlc: n DLC values
+        :param timestamps: n timestamps; frames of one ID must be in time order
+        """
+        if not len(slots):
+            return
+        order = np.argsort(slots, kind='stable')
+        slots = np.asarray(slots)[order]
+        payload = np.asarray(payload, dtype=np.uint8)[order]
+        dlc = np.asarray(dlc)[order]
+        timestamps = np.asarray(timestamps, dtype=np.float64)[order]
+
+        first = np.ones(len(slots), dtype=bool)
+        first[1:] = slots[1:] != slots[:-1]
+        starts = np.flatnonzero(first)
+        ends = np.append(starts[1:], len(slots)) - 1
+        rows = slots[starts]
+
+        # Each frame is compared with the one before it: inside the batch, or the ID's last payload
+        before = np.empty_like(payload)
+        before[1:] = payload[:-1]
+        before[first] = self.previous[slots[first]]
+        # One row per bit (byte * 8 + bit), so the per-ID reductions run along contiguous memory
+        bits = np.unpackbits((payload ^ before).T, axis=0, bitorder='little')
+        # The very first frame of an ID has nothing to compare with
+        bits[:, first & (self.frames[slots] == 0)] = 0
+
+        self.toggles[rows] += np.add.reduceat(bits, starts, axis=1, dtype=np.int64).T
+        positions = np.where(bits, np.arange(len(slots), dtype=np.int32), -1)
+        last = np.maximum.reduceat(positions, starts, axis=1).T
+        changed = last >= 0
+        last_change = self.last_change[rows]
+        last_change[changed] = timestamps[last[changed]]
+        self.last_change[rows] = last_change
+
+        # Bytes past the DLC do not count towards the byte range
+        in_frame = np.arange(8) < dlc[:, None]
+        self.byte_min[rows] = np.minimum(self.byte_min[rows],
+                                         np.minimum.reduceat(np.where(in_frame, payload, 0xFF), starts, axis=0))
+        self.byte_max[rows] = np.maximum(self.byte_max[rows],
+                                         np.maximum.reduceat(np.where(in_frame, payload, 0), starts, axis=0))
+        self.max_dlc[rows] = np.maximum(self.max_dlc[rows], np.maximum.reduceat(dlc, starts).astype(np.uint8))
+
+        self.frames[rows] += ends - starts + 1
+        self.previous[rows] = payload[ends]
+        self.last_time[rows] = timestamps[ends]
+
+    def rates(self, slot):
+        """Toggles per frame-to-frame transition of each bit."""
+        return self.toggles[slot] / max(1, int(self.frames[slot]) - 1)
+
+    def candidates(self, slot):
+        return find_candidates(self.toggles[slot], int(self.frames[slot]) - 1, int(self.max_dlc[slot]))
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def field_bits(field):
+    """Bit numbers covered by a FieldCandidate (or any DBC-style field)."""
+    if field.byte_order == INTEL:
+        return list(range(field.start_bit, field.start_bit + field.length))
+    bits = []
+    bit = field.start_bit
+    for _ in range(field.length):
+        bits.append(bit)
+        # Motorola continues from bit 0 of a byte to bit 7 of the next one
+        bit = bit + 15 if bit % 8 == 0 else bit - 1
+    return bits
+
+
+def find_candidates(toggles, transitions, dlc=8):
+    """
+    :param toggles: 64 toggle counts
+    :param transitions: int - number of frame-to-frame transitions they were counted over
+    :param dlc: int - bytes to look at
+    :return: list of FieldCandidate
+    """
+    if transitions < MIN_TRANSITIONS:
+        return []
+    rates = np.asarray(toggles) / transitions
+    size = dlc * 8
+    free = np.zeros(64, dtype=bool)
+    free[:size] = True
+    candidates = []
+
+    for lsb in range(size):
+        if not free[lsb] or rates[lsb] < COUNTER_RATE:
+            continue
+        end = lsb + 1
+        while end < size and free[end] and COUNTER_RATIO[0] <= rates[end] / rates[end - 1] <= COUNTER_RATIO[1]:
+            end += 1
+        if end - lsb >= 2:
+            candidates.append(FieldCandidate(COUNTER, lsb, end - lsb, INTEL))
+            free[lsb:end] = False
+
+    def is_random(start, length):
+        bits = slice(start, start + length)
+        return free[bits].all() and ((rates[bits] >= RANDOM_RATE[0]) & (rates[bits] <= RANDOM_RATE[1])).all()
+
+    def continues_into(byte):
+        # Slowly toggling low bits next door: the random byte is the low byte of a wider value
+        bit = byte * 8
+        return 0 <= byte < dlc and free[bit] and 0 < rates[bit] < RANDOM_RATE[0]
+
+    for byte in range(dlc):
+        start = byte * 8
+        if is_random(start, 8):
+            if not continues_into(byte + 1) and not continues_into(byte - 1):
+                candidates.append(FieldCandidate(CHECKSUM, start, 8, INTEL))
+                free[start:start + 8] = False
+            continue
+        # A random nibble is only taken for a checksum next to a counter nibble; otherwise it is likely noise
+        for nibble, other in ((start, start + 4), (start + 4, start)):
+            if is_random(nibble, 4) and not free[other:other + 4].any():
+                candidates.append(FieldCandidate(CHECKSUM, nibble, 4, INTEL))
+                free[nibble:nibble + 4] = False
+
+    # Runs of active bits inside each byte whose rate falls towards the MSB, as [lsb, msb]
+    segments = []
+    for byte in range(dlc):
+        bit = byte * 8
+        while bit < byte * 8 + 8:
+            if not free[bit] or rates[bit] == 0:
+                bit += 1
+                continue
+            end = bit + 1
+            # The busiest low bits of a noisy value toggle in no particular order
+            while end < byte * 8 + 8 and free[end] and rates[end] > 0 and (
+                    rates[end] <= rates[end - 1] * ANALOG_TREND or min(rates[end], rates[end - 1]) >= RANDOM_RATE[0]):
+                end += 1
+            segments.append([bit, end - 1])
+            bit = end
+
+    def join_order(chain, segment):
+        last = chain['segments'][-1]
+        if segment[0] // 8 != last[0] // 8 + 1:
+            return None
+        intel = (last[1] % 8 == 7 and segment[0] % 8 == 0
+                 and rates[segment[0]] <= rates[last[1]] * ANALOG_TREND)
+        motorola = (last[0] % 8 == 0 and segment[1] % 8 == 7
+                    and rates[last[0]] <= rates[segment[1]] * ANALOG_TREND)
+        if chain['order'] is not None:
+            return chain['order'] if (intel if chain['order'] == INTEL else motorola) else None
+        if intel and motorola:
+            # The more significant byte is the one that toggles less
+            mean = lambda bits: rates[bits[0]:bits[1] + 1].mean()
+            return INTEL if mean(segment) < mean(last) else MOTOROLA
+        return INTEL if intel else MOTOROLA if motorola else None
+
+    chains = []
+    for segment in segments:
+        order = join_order(chains[-1], segment) if chains else None
+        if order is None:
+            chains.append({'segments': [segment], 'order': None})
+        else:
+            chains[-1]['segments'].append(segment)
+            chains[-1]['order'] = order
+
+    for chain in chains:
+        first, last = chain['segments'][0], chain['segments'][-1]
+        length = sum(msb - lsb + 1 for lsb, msb in chain['segments'])
+        if length < MIN_ANALOG_BITS:
+            continue
+        if chain['order'] == MOTOROLA:
+            candidates.append(FieldCandidate(ANALOG, first[1], length, MOTOROLA))
+        elif len(chain['segments']) > 1 or rates[first[0]] > rates[last[1]]:
+            # A single byte only counts when its low bits are busier than its high bits
+            candidates.append(FieldCandidate(ANALOG, first[0], length, INTEL))
+
+    return sorted(candidates, key=lambda candidate: min(field_bits(candidate)))
@@ -0,0 +1,222 @@
+from PyQt5.QtCore import Qt, QTimer, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QColor, QFont
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QTableView, QAbstractItemView
+import numpy as np
+from bit_activity import BitActivity, COUNTER, CHECKSUM, ANALOG, field_bits
+from signal_decoder import INTEL, MOTOROLA
+
+# Frames taken from the histories per refresh; a freshly opened log fills in over several refreshes
+FRAMES_PER_REFRESH = 50000
+# Bits that changed within this many seconds of the newest frame are drawn at full strength
+RECENT_SECONDS = 2.0
+
+CANDIDATE_MARKS = {COUNTER: 'C', CHECKSUM: 'S', ANALOG: 'A'}
+
+
+def column_bit(column):
+    """Bit number (byte * 8 + bit) of a column; columns run byte by byte, MSB first, like the hex data."""
+    return column // 8 * 8 + 7 - column % 8
+
+
+class BitActivityModel(QAbstractTableModel):
+    """One row per CAN ID and one column per payload bit over a BitActivity."""
+
+    def __init__(self, activity, parent=None):
+        super().__init__(parent)
+        self.activity = activity
+        self.rows = 0
+        self.now = 0.0
+        # slot -> (frames when computed, candidates, bit -> candidate)
+        self.candidate_cache = {}
+        self.bold = QFont()
+        self.bold.setBold(True)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else 64
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Vertical:
+            return self.activity.keys[section]
+        bit = column_bit(section)
+        return f"{bit // 8}.{bit % 8}"
+
+    def candidates(self, slot):
+        """Field candidates of one ID and the candidate of each of its bits, recomputed when frames arrived."""
+        frames = int(self.activity.frames[slot])
+        cached = self.candidate_cache.get(slot)
+        if cached is None or cached[0] != frames:
+            candidates = self.activity.candidates(slot)
+            bits = {bit: candidate for candidate in candidates for bit in field_bits(candidate)}
+            cached = self.candidate_cache[slot] = (frames, candidates, bits)
+        return cached[1], cached[2]
+
+    def candidate_at(self, row, column):
+        return self.candidates(row)[1].get(column_bit(column))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        slot = index.row()
+        bit = column_bit(index.column())
+
+        if role == Qt.DisplayRole:
+            candidate = self.candidates(slot)[1].get(bit)
+            return CANDIDATE_MARKS[candidate.kind] if candidate is not None else None
+        if role == Qt.FontRole:
+            return self.bold
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role == Qt.BackgroundRole:
+            return self.heat_color(slot, bit)
+        if role == Qt.ToolTipRole:
+            return self.describe(slot, bit)
+        return None
+
+    def heat_color(self, slot, bit):
+        activity = self.activity
+        if bit // 8 >= activity.max_dlc[slot]:
+            return QColor(Qt.lightGray)
+        toggles = activity.toggles[slot, bit]
+        if not toggles:
+            return QColor(Qt.white)
+        # Log scale, so a bit toggling once in a thousand frames still shows
+        rate = toggles / max(1, activity.frames[slot] - 1)
+        heat = min(1.0, np.log10(1 + 999 * rate) / 3)
+        recent = self.now - activity.last_change[slot, bit] <= RECENT_SECONDS
+        return QColor.fromHsvF(0.16 * (1 - heat), 0.25 + 0.75 * heat if recent else 0.15 + 0.25 * heat, 1.0)
+
+    def describe(self, slot, bit):
+        activity = self.activity
+        byte = bit // 8
+        frames = int(activity.frames[slot])
+        toggles = int(activity.toggles[slot, bit])
+        lines = [f"{activity.keys[slot]} byte {byte} bit {bit % 8} (start bit {bit})",
+                 f"{toggles} toggles in {frames} frames"]
+        if toggles:
+            lines.append(f"last change {self.now - activity.last_change[slot, bit]:.2f} s ago")
+        if byte < activity.max_dlc[slot]:
+            lines.append(f"byte {byte} range "
+                         f"0x{activity.byte_min[slot, byte]:02X}..0x{activity.byte_max[slot, byte]:02X}")
+        candidate = self.candidates(slot)[1].get(bit)
+        if candidate is not None:
+            lines.append(f"{candidate.kind} candidate: start bit {candidate.start_bit}, {candidate.length} bits, "
+                         f"{candidate.byte_order}")
+        return '\n'.join(lines)
+
+    def reset(self):
+        self.beginResetModel()
+        self.rows = 0
+        self.candidate_cache = {}
+        self.endResetModel()
+
+    def refresh(self, slots, repaint=True):
+        """Publish new rows and repaint the rows of the given slots."""
+        if len(self.activity) > self.rows:
+            self.beginInsertRows(QModelIndex(), self.rows, len(self.activity) - 1)
+            self.rows = len(self.activity)
+            self.endInsertRows()
+        if repaint and slots:
+            self.dataChanged.emit(self.index(min(slots), 0), self.index(max(slots), 63))
+
+
+class BitActivityTab(QWidget):
+    """
+    Heatmap of how often every payload bit toggles, per CAN ID.
+    Clicking a cell or dragging over a range of bits pre-fills the Graphs tab.
+    """
+
+    def __init__(self, can_data, graph_tab, parent=None):
+        super().__init__(parent)
+        self.can_data = can_data
+        self.graph_tab = graph_tab
+        self.activity = BitActivity()
+        # CAN ID key -> history total already counted
+        self.seen = {}
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+        layout.addWidget(QLabel(
+            "Toggle rate of every bit (byte.bit, MSB first), yellow rare to red every frame; faded bits have not "
+            "changed for a while. C counter, S checksum, A analog candidate. Click a cell or drag over bits to "
+            "pre-fill the Graphs tab."))
+
+        self.model = BitActivityModel(self.activity, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionMode(QAbstractItemView.ContiguousSelection)
+        self.table.horizontalHeader().setDefaultSectionSize(30)
+        self.table.selectionModel().selectionChanged.connect(self.handle_selection)
+        layout.addWidget(self.table)
+
+        self.selection_label = QLabel()
+        layout.addWidget(self.selection_label)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+
+    def set_refresh_rate(self, refresh_rate):
+        self.timer.start(int(1000 / max(1, refresh_rate)))
+
+    def reset(self):
+        """Forget all statistics, e.g. when switching to an offline log."""
+        self.activity = BitActivity()
+        self.model.activity = self.activity
+        self.model.reset()
+        self.seen = {}
+        self.selection_label.clear()
+
+    def refresh(self):
+        """Count the frames added to the histories since the last refresh, then repaint."""
+        slots, payload, dlc, timestamps = [], [], [], []
+        budget = FRAMES_PER_REFRESH
+        for key, entry in list(self.can_data.items()):
+            history = entry['history']
+            seen = self.seen.get(key, 0)
+            if history.total == seen or not budget:
+                continue
+            window = history.since(seen, budget)
+            # Frames overwritten before they were counted are skipped
+            self.seen[key] = history.total - min(history.total - seen, len(history)) + len(window.timestamps)
+            if not len(window.timestamps):
+                continue
+            slots.append(np.full(len(window.timestamps), self.activity.slot(key)))
+            payload.append(window.payload)
+            dlc.append(window.dlc)
+            timestamps.append(window.timestamps)
+            budget -= len(window.timestamps)
+
+        if slots:
+            self.activity.update(np.concatenate(slots), np.concatenate(payload), np.concatenate(dlc),
+                                 np.concatenate(timestamps))
+            self.model.now = float(np.nanmax(self.activity.last_time[:len(self.activity)]))
+        self.model.refresh([int(group[0]) for group in slots], repaint=self.isVisible())
+
+    def handle_selection(self):
+        indexes = self.table.selectionModel().selectedIndexes()
+        current = self.table.currentIndex()
+        if not indexes or not current.isValid():
+            return
+        row = current.row()
+        columns = sorted(index.column() for index in indexes if index.row() == row)
+        key = self.activity.keys[row]
+
+        candidate = self.model.candidate_at(row, columns[0]) if len(columns) == 1 else None
+        if candidate is not None:
+            start_bit, length, byte_order = candidate.start_bit, candidate.length, candidate.byte_order
+        elif columns[0] // 8 == columns[-1] // 8:
+            # Inside one byte both orders give the same bits; Intel starts at the rightmost (least significant) one
+            start_bit, length, byte_order = column_bit(columns[-1]), len(columns), INTEL
+        else:
+            # Across bytes the columns read MSB first, which is the Motorola layout
+            start_bit, length, byte_order = column_bit(columns[0]), columns[-1] - columns[0] + 1, MOTOROLA
+
+        description = f"{key}: start bit {start_bit}, {length} bits, {byte_order}"
+        if self.graph_tab.select_signal(key, start_bit, length, byte_order):
+            self.selection_label.setText(f"Graphs tab set to {description}")
+        else:
+            self.selection_label.setText(f"{description} is not within the frame's data")
@@ -1,81 +1,299 @@
-import json
 import time
+import sys
 import serial
 import threading
-from PyQt5.QtCore import pyqtSignal, QObject
+from serial_protocol import (CMD_BINARY, ACK_BINARY, DELIMITER, encode_ack, StreamParser, format_send_command,
+                             format_cyclic_set, format_cyclic_data, format_cyclic_delete, CMD_CYCLIC_START,
+                             CMD_CYCLIC_STOP, CMD_CYCLIC_CLEAR, MAX_CYCLIC_SLOTS, format_filter_command, CMD_FILTER_OFF)
+from acceptance_filter import compute_filters
+from frame_queue import FrameQueue
+from timing_stats import TimingStatsEngine
+from latency import DeviceClock, PipelineLatency
+from metrics import PipelineMetrics
+from transport import open_transport
 
-class CANMessageReceiver(QObject):
-    message_received = pyqtSignal(dict)
+class FrameSignal:
+    """
+    Minimal stand-in for a Qt signal so the receiver has no Qt dependency.
+    Callbacks run on the reader thread; GUI code should use the batched
+    frame_queue instead.
+    """
 
-    def __init__(self, port, baudrate=250000):
-        super().__init__()
+    def __init__(self):
+        self._callbacks = []
+
+    def connect(self, callback):
+        self._callbacks.append(callback)
+
+    def disconnect(self, callback):
+        self._callbacks.remove(callback)
+
+    def emit(self, message):
+        for callback in self._callbacks:
+            callback(message)
+
+class CANMessageReceiver:
+    def __init__(self, port, baudrate=250000, binary=True, negotiate_timeout=3.0, batched=True, can_bitrate=250000,
+                 channel=None):
+        self.message_received = FrameSignal()
         self.port = port
+        # Channel index tagged onto every frame when several interfaces are captured (see MultiReceiver)
+        self.channel = channel
         self.baudrate = baudrate
+        self.binary = binary
+        self.negotiate_timeout = negotiate_timeout
+        self.binary_mode = False
         self.running = False
         self.serial_connection = None
-        self.last_receive_times = {}
-        self.recent_periods = {}
+        # Serializes writes from the GUI and the transmit scheduler thread
+        self.write_lock = threading.Lock()
+        self.timing = TimingStatsEngine()
+        self.device_clock = DeviceClock()
+        self.latency = PipelineLatency()
+        # With batched delivery the GUI drains frame_queue on a timer instead
+        # of receiving one message_received signal per frame
+        self.frame_queue = FrameQueue() if batched else None
+        self.metrics = PipelineMetrics(self.frame_queue, self.latency, can_bitrate)
+        self.dbc = None
+        self.decoders = {}
+        # Optional FrameRecorder; receives every parsed batch without blocking this thread
+        self.recorder = None
+        # Optional trigger.TriggerEngine, evaluated on every batch in the reader thread
+        self.trigger = None
+        # Optional async_bus.SubscriberTable; gets every delivered batch, per subscribed ID
+        self.subscribers = None
+        # FilterConfig currently programmed into the MCP2515, None when every frame is forwarded
+        self.acceptance_filter = None
+        # Latest loss counters reported by the sketch (serial_protocol.STATUS_FIELDS), cumulative since boot
+        self.device_status = {}
 
     def connect(self):
         try:
-            self.serial_connection = serial.Serial(self.port, self.baudrate, timeout=1)
+            # A serial port, or a simulated backend such as "sim://?ids=100&rate=5000" (see transport.py)
+            self.serial_connection = open_transport(self.port, self.baudrate)
+            if self.binary:
+                self.binary_mode = self.negotiate_binary_mode()
             self.running = True
             threading.Thread(target=self.receive_messages, daemon=True).start()
             return True
-        except serial.SerialException as e:
-            print(f"Error connecting to serial port: {e}")
+        except (serial.SerialException, ValueError) as e:
+            print(f"Error connecting to serial port: {e}", file=sys.stderr)
             return False
 
+    def load_dbc(self, path):
+        """Compile a DBC file; frames with a known ID get a 'Signals' dict of physical values."""
+        # Imported here so headless startup does not pay for NumPy unless decoding is used
+        from dbc import load_dbc
+        self.dbc = load_dbc(path)
+        self.decoders = self.dbc.messages
+        return self.dbc
+
+    def negotiate_binary_mode(self):
+        """
+        Ask the sketch to switch to binary framing. Firmware without binary
+        support never acknowledges, in which case we stay on JSON lines.
+        The request is repeated because opening the port resets most boards.
+        """
+        deadline = time.time() + self.negotiate_timeout
+        next_request = 0
+        # Already in binary mode (the board was not reset by opening the port): the answer is a RECORD_ACK record
+        ack_record = DELIMITER + encode_ack()
+        self.serial_connection.timeout = 0.1
+        try:
+            while time.time() < deadline:
+                if time.time() >= next_request:
+                    self.serial_connection.write(CMD_BINARY)
+                    next_request = time.time() + 0.5
+                line = self.serial_connection.readline()
+                if line.decode('utf-8', errors='ignore').strip() == ACK_BINARY or ack_record in line:
+                    return True
+            print("Binary framing not supported by firmware, using JSON", file=sys.stderr)
+            return False
+        finally:
+            self.serial_connection.timeout = 1
+
     def receive_messages(self):
+        parser = StreamParser(binary=self.binary_mode)
         while self.running:
             try:
-                if self.serial_connection.in_waiting:
-                    line = self.serial_connection.readline().decode('utf-8').strip()
-                    try:
-                        message = json.loads(line)
-                        current_time = time.time()
-                        can_id = message['ID']
-                        period = 0
+                # Block until at least one byte arrives (or the timeout expires),
+                # then take everything the driver has buffered in one call
+                data = self.serial_connection.read(max(1, self.serial_connection.in_waiting))
+                if not data:
+                    # Read once: the GUI thread may disarm the trigger at any time
+                    trigger = self.trigger
+                    if trigger is not None:
+                        trigger.tick(time.time())
+                    continue
 
-                        if can_id in self.last_receive_times:
-                            period = (current_time - self.last_receive_times[can_id]) * 1000
+                self.metrics.record_read(len(data))
+                messages = parser.feed(data)
+                self.metrics.parse_errors = parser.errors
+                if parser.status is not None:
+                    self.device_status = dict(parser.status, HostTime=time.time())
+                    parser.status = None
+                if not messages:
+                    continue
 
-                        self.last_receive_times[can_id] = current_time
+                current_time = time.time()
+                for message in messages:
+                    self.process_message(message, current_time)
+                self.metrics.record_frames(messages)
+                self.latency.record_host(messages)
+                # Read once: the GUI thread sets recorder to None when recording stops
+                recorder = self.recorder
+                if recorder is not None:
+                    recorder.submit(messages)
+                trigger = self.trigger
+                if trigger is not None:
+                    trigger.process(messages, current_time)
+                self.deliver(messages)
+            except Exception as e:
+                print(f"Error receiving message: {e}", file=sys.stderr)
+                self.running = False
 
-                        if can_id not in self.recent_periods:
-                            self.recent_periods[can_id] = []
+    def process_message(self, message, current_time=None):
+        if current_time is None:
+            current_time = time.time()
+        can_id = message['ID']
+        message['HostTime'] = current_time
+        # Timing statistics are kept per channel and ID
+        key = can_id
+        if self.channel is not None:
+            message['Channel'] = self.channel
+            key = (self.channel, can_id)
 
-                        self.recent_periods[can_id].append(period)
-                        if len(self.recent_periods[can_id]) > 10:
-                            self.recent_periods[can_id].pop(0)
+        # Prefer the sketch's micros() stamp: it is free of USB and scheduling jitter
+        micros = message.get('Micros')
+        if micros is not None:
+            device_time = self.device_clock.unwrap(micros)
+            message['DeviceTime'] = device_time
+            message['Timestamp'] = self.device_clock.align(device_time, current_time)
+            stats = self.timing.update(key, device_time)
+        else:
+            message['Timestamp'] = current_time
+            stats = self.timing.update(key, current_time)
 
-                        average_period = sum(self.recent_periods[can_id]) / len(self.recent_periods[can_id])
-                        message['Period'] = round(average_period, 2)
+        message['Period'] = round(stats.window_period, 2)
 
-                        self.message_received.emit(message)
-                    except json.JSONDecodeError:
-                        pass
-            except Exception as e:
-                print(f"Error receiving message: {e}")
-                self.running = False
+        decoder = self.decoders.get((can_id, message.get('Extended', False)))
+        if decoder is not None:
+            message['Signals'] = decoder.decode(message['Data'])
+
+    def deliver(self, messages):
+        if self.subscribers is not None:
+            self.subscribers.dispatch(messages)
+        if self.frame_queue is not None:
+            self.frame_queue.put_many(messages)
+            return
+
+        for message in messages:
+            self.message_received.emit(message)
 
     def send_message(self, can_id, length, data):
-        if not self.serial_connection or not self.running:
-            print("Error: Serial connection is not active.")
+        if not self.running:
+            print("Error: Serial connection is not active.", file=sys.stderr)
             return
 
         if length > 8 or length < 1:
-            print("Error: Length must be between 1 and 8 bytes.")
+            print("Error: Length must be between 1 and 8 bytes.", file=sys.stderr)
             return
 
+        self.write_raw(format_send_command(can_id, data[:length]))
+
+    def write_raw(self, payload):
+        """Write pre-formatted command bytes in one call; returns False on failure."""
+        if not self.serial_connection or not self.running:
+            return False
+
         try:
-            out_string = f"{can_id},{length},{','.join([str(d) for d in data])}"
-            self.serial_connection.write((out_string + '\n').encode('utf-8'))
-            print(f"Sent frame: {out_string}")
+            with self.write_lock:
+                self.serial_connection.write(payload)
+            return True
         except Exception as e:
-            print(f"Error sending message: {e}")
+            print(f"Error sending message: {e}", file=sys.stderr)
+            return False
+
+    def set_cyclic(self, slot, can_id, data, period_ms, phase_ms=0.0):
+        """
+        Upload a frame to the sketch's cyclic table; the MCU times it from then on.
+        Entries added while the table is running start phase_ms after the upload.
+        :return: bool - False if the command could not be written
+        """
+        if not 0 <= slot < MAX_CYCLIC_SLOTS:
+            raise ValueError(f"Cyclic slot must be between 0 and {MAX_CYCLIC_SLOTS - 1}")
+        if len(data) > 8:
+            raise ValueError("Data must be at most 8 bytes")
+        if period_ms <= 0:
+            raise ValueError("Period must be positive")
+        return self.write_raw(format_cyclic_set(slot, can_id, data, period_ms * 1000, phase_ms * 1000))
+
+    def update_cyclic_data(self, slot, data):
+        """Change the payload of a cyclic entry without disturbing its timing."""
+        if len(data) > 8:
+            raise ValueError("Data must be at most 8 bytes")
+        return self.write_raw(format_cyclic_data(slot, data))
+
+    def remove_cyclic(self, slot):
+        return self.write_raw(format_cyclic_delete(slot))
+
+    def clear_cyclic(self):
+        return self.write_raw(CMD_CYCLIC_CLEAR)
+
+    def start_cyclic(self):
+        """Start all entries; each first fires its phase offset after this command."""
+        return self.write_raw(CMD_CYCLIC_START)
+
+    def stop_cyclic(self):
+        return self.write_raw(CMD_CYCLIC_STOP)
+
+    def set_acceptance_filter(self, ranges, extended=False):
+        """
+        Program the MCP2515 so only the given IDs (plus whatever the shared masks
+        cannot exclude) reach the serial link.
+        :param ranges: iterable of IDs or inclusive (low, high) ranges
+        :return: FilterConfig, or None if the command could not be written
+        """
+        config = compute_filters(ranges, extended)
+        if not self.write_raw(format_filter_command(config)):
+            return None
+        self.acceptance_filter = config
+        return config
+
+    def clear_acceptance_filter(self):
+        """Forward every frame on the bus again."""
+        if self.write_raw(CMD_FILTER_OFF):
+            self.acceptance_filter = None
+            return True
+        return False
+
+    def set_trigger(self, conditions, directory, pre_seconds=5.0, post_seconds=5.0):
+        """
+        Arm trigger capture (see trigger.py for the condition syntax).
+        :param conditions: list of condition strings
+        :raises ValueError: on malformed conditions
+        :return: TriggerEngine
+        """
+        # Imported here so plain captures do not load NumPy through the DBC helpers
+        from trigger import TriggerEngine
+        self.clear_trigger()
+        self.trigger = TriggerEngine(conditions, directory, pre_seconds, post_seconds)
+        return self.trigger
+
+    def clear_trigger(self):
+        """Disarm; a capture still collecting post-trigger frames is written with what it has."""
+        trigger, self.trigger = self.trigger, None
+        if trigger is not None:
+            trigger.finish()
+
+    def trigger_events(self):
+        """TriggerEvent list of the armed trigger, oldest first."""
+        return list(self.trigger.events) if self.trigger is not None else []
 
     def stop(self):
         self.running = False
+        if self.recorder is not None:
+            self.recorder.stop()
+        self.clear_trigger()
         if self.serial_connection:
             self.serial_connection.close()
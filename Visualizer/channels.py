@@ -0,0 +1,44 @@
+"""
+Naming of CAN channels when several interfaces are captured at once.
+
+Frames from a multi-channel capture carry a 'Channel' index (0, 1, ...).
+Everything that keeps per-ID state keys it by channel plus ID: the timing
+statistics use frame_key() and the GUI uses key_label(). Single-interface
+captures have no 'Channel', so their keys stay plain IDs and "0x123".
+"""
+
+CHANNEL_PREFIX = 'can'
+# Capture logs keep the channel index in four flag bits
+MAX_CHANNELS = 16
+# Channel index of a composite log key (see key_value())
+CHANNEL_SHIFT = 32
+
+
+def channel_name(channel):
+    return f"{CHANNEL_PREFIX}{channel}"
+
+
+def frame_key(message):
+    """Timing statistics key: the ID, or (channel, ID) for multi-channel frames."""
+    channel = message.get('Channel')
+    return message['ID'] if channel is None else (channel, message['ID'])
+
+
+def key_label(channel, can_id):
+    """Display key, e.g. "0x123" or "can1 0x123"."""
+    return f"0x{can_id:X}" if channel is None else f"{channel_name(channel)} 0x{can_id:X}"
+
+
+def parse_key_label(label):
+    """
+    :return: (channel or None, ID) for a key_label() string
+    """
+    if ' ' not in label:
+        return None, int(label, 16)
+    name, can_id = label.split(' ', 1)
+    return int(name[len(CHANNEL_PREFIX):]), int(can_id, 16)
+
+
+def key_value(channel, can_id):
+    """Single integer ordering frames by channel, then ID."""
+    return ((channel or 0) << CHANNEL_SHIFT) | can_id
@@ -0,0 +1,178 @@
+"""
+Minimal DBC reader that compiles message definitions into per-ID decoders.
+
+Only the parts needed for decoding are parsed: ``BO_`` (messages) and
+``SG_`` (signals, including simple multiplexing). Each message is compiled
+once into a MessageDecoder holding precomputed shifts, masks and sign bits,
+so decoding a frame is O(signals in that message) with no text parsing.
+"""
+import re
+from signal_decoder import INTEL, MOTOROLA, signal_layout, extract_signal
+
+EXTENDED_ID_FLAG = 0x80000000
+
+MESSAGE_PATTERN = re.compile(r'^BO_\s+(\d+)\s+(\w+)\s*:\s*(\d+)\s+(\w+)')
+SIGNAL_PATTERN = re.compile(
+    r'^SG_\s+(\w+)\s*(M|m\d+)?\s*:\s*(\d+)\|(\d+)@([01])([+-])\s*'
+    r'\(\s*([^,]+)\s*,\s*([^)]+)\)\s*'
+    r'\[\s*([^|]+)\|([^\]]+)\]\s*'
+    r'"([^"]*)"'
+)
+
+
+class SignalDefinition:
+    def __init__(self, name, start_bit, length, byte_order, signed, scale, offset,
+                 minimum=0.0, maximum=0.0, unit='', multiplexer=False, multiplex_value=None):
+        self.name = name
+        self.start_bit = start_bit
+        self.length = length
+        self.byte_order = byte_order
+        self.signed = signed
+        self.scale = scale
+        self.offset = offset
+        self.minimum = minimum
+        self.maximum = maximum
+        self.unit = unit
+        self.multiplexer = multiplexer
+        self.multiplex_value = multiplex_value
+
+        # Precomputed decode parameters
+        self.shift, self.required_bytes = signal_layout(start_bit, length, byte_order)
+        self.mask = (1 << length) - 1
+        self.sign_bit = 1 << (length - 1) if signed else 0
+        self.is_integer = scale == int(scale) and offset == int(offset)
+
+    def decode_raw(self, word):
+        raw = (word >> self.shift) & self.mask
+        if self.sign_bit and raw & self.sign_bit:
+            raw -= self.mask + 1
+        return raw
+
+    def physical(self, raw):
+        value = raw * self.scale + self.offset
+        return int(value) if self.is_integer else value
+
+
+class MessageDecoder:
+    """Compiled decoder for one arbitration ID."""
+
+    def __init__(self, can_id, name, length, extended=False):
+        self.can_id = can_id
+        self.name = name
+        self.length = length
+        self.extended = extended
+        self.signals = []
+        self.multiplexer = None
+        self.uses_intel = False
+        self.uses_motorola = False
+
+    def add_signal(self, signal):
+        self.signals.append(signal)
+        if signal.multiplexer:
+            self.multiplexer = signal
+        if signal.byte_order == INTEL:
+            self.uses_intel = True
+        else:
+            self.uses_motorola = True
+
+    def decode(self, data):
+        """
+        :param data: list[int] or bytes - frame payload
+        :return: dict of signal name -> physical value
+        """
+        payload = bytes(data).ljust(8, b'\x00')[:8]
+        dlc = len(data)
+        intel_word = int.from_bytes(payload, 'little') if self.uses_intel else 0
+        motorola_word = int.from_bytes(payload, 'big') if self.uses_motorola else 0
+
+        mux_value = None
+        if self.multiplexer is not None:
+            signal = self.multiplexer
+            mux_value = signal.decode_raw(intel_word if signal.byte_order == INTEL else motorola_word)
+
+        values = {}
+        for signal in self.signals:
+            if signal.required_bytes > dlc:
+                continue
+            if signal.multiplex_value is not None and signal.multiplex_value != mux_value:
+                continue
+            raw = signal.decode_raw(intel_word if signal.byte_order == INTEL else motorola_word)
+            values[signal.name] = signal.physical(raw)
+        return values
+
+    def decode_array(self, name, payload, dlc=None):
+        """Vectorized decode of one signal over an N x 8 payload array."""
+        signal = self.signal(name)
+        return extract_signal(payload, signal.start_bit, signal.length, signal.byte_order,
+                              signal.signed, signal.scale, signal.offset, dlc)
+
+    def signal(self, name):
+        for signal in self.signals:
+            if signal.name == name:
+                return signal
+        raise KeyError(name)
+
+
+class DBCDatabase:
+    def __init__(self):
+        # (arbitration ID, extended) -> MessageDecoder, looked up once per frame in the receive path;
+        # a standard and an extended frame with the same number are different messages
+        self.messages = {}
+
+    def decode(self, can_id, data, extended=False):
+        decoder = self.messages.get((can_id, extended))
+        return decoder.decode(data) if decoder is not None else None
+
+
+def parse_dbc(text):
+    """Parse DBC file contents into a DBCDatabase."""
+    database = DBCDatabase()
+    current = None
+
+    for line in text.splitlines():
+        line = line.strip()
+
+        match = MESSAGE_PATTERN.match(line)
+        if match:
+            raw_id = int(match.group(1))
+            extended = bool(raw_id & EXTENDED_ID_FLAG)
+            can_id = raw_id & ~EXTENDED_ID_FLAG
+            current = MessageDecoder(can_id, match.group(2), int(match.group(3)), extended)
+            database.messages[(can_id, extended)] = current
+            continue
+
+        if not line:
+            # A blank line ends the signal list of the current message
+            current = None
+            continue
+
+        if not line.startswith('SG_'):
+            continue
+
+        match = SIGNAL_PATTERN.match(line)
+        if match is None or current is None:
+            continue
+
+        mux = match.group(2)
+        current.add_signal(SignalDefinition(
+            name=match.group(1),
+            start_bit=int(match.group(3)),
+            length=int(match.group(4)),
+            byte_order=INTEL if match.group(5) == '1' else MOTOROLA,
+            signed=match.group(6) == '-',
+            scale=float(match.group(7)),
+            offset=float(match.group(8)),
+            minimum=float(match.group(9)),
+            maximum=float(match.group(10)),
+            unit=match.group(11),
+            multiplexer=mux == 'M',
+            multiplex_value=int(mux[1:]) if mux and mux != 'M' else None,
+        ))
+
+    return database
+
+
+def load_dbc(path, encoding='cp1252'):
+    """Load and compile a DBC file from disk."""
+    with open(path, encoding=encoding, errors='replace') as dbc_file:
+        return parse_dbc(dbc_file.read())
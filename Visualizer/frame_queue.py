@@ -0,0 +1,51 @@
+import threading
+
+
+class FrameQueue:
+    """
+    Double-buffered hand-off from the receiver thread to the GUI.
+    The reader appends to the active buffer; the GUI swaps it for an empty
+    one on each refresh tick and processes the whole batch at once, so the
+    Qt event queue no longer grows with the frame rate.
+    """
+
+    def __init__(self, max_size=200000):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._pending = []
+        self.max_depth = 0
+        self.dropped = 0
+        self.delivered = 0
+
+    def put(self, message):
+        with self._lock:
+            pending = self._pending
+            if len(pending) >= self.max_size:
+                # GUI is not draining; keep the newest frames
+                del pending[0]
+                self.dropped += 1
+            pending.append(message)
+
+    def put_many(self, messages):
+        with self._lock:
+            pending = self._pending
+            pending.extend(messages)
+            overflow = len(pending) - self.max_size
+            if overflow > 0:
+                del pending[:overflow]
+                self.dropped += overflow
+
+    def drain(self):
+        """Swap buffers and return every frame queued since the last drain."""
+        with self._lock:
+            batch = self._pending
+            self._pending = []
+        depth = len(batch)
+        if depth > self.max_depth:
+            self.max_depth = depth
+        self.delivered += depth
+        return batch
+
+    @property
+    def depth(self):
+        return len(self._pending)
@@ -0,0 +1,191 @@
+from collections import namedtuple
+import numpy as np
+
+# Contiguous views of the newest frames of one CAN ID, oldest first
+FrameWindow = namedtuple('FrameWindow', ['timestamps', 'dlc', 'payload'])
+
+# Every slot is stored twice (see FrameRingBuffer): 8 payload bytes, float64 timestamp, uint8 DLC
+BYTES_PER_FRAME = 2 * (8 + 8 + 1)
+
+INITIAL_ALLOCATION = 1024
+# Frames kept for IDs first seen after the memory budget is used up, so they still have a latest frame
+MIN_DEPTH = 1
+
+
+class FrameRingBuffer:
+    """
+    Fixed-capacity frame history for one CAN ID.
+
+    Storage is mirrored: slot ``i`` is written at ``i`` and ``i + size``, so the
+    newest ``k`` frames are always one contiguous slice and ``last()`` returns
+    views without copying. The arrays start small and double until they reach
+    ``capacity`` (or the owning store's memory budget), after which appends
+    overwrite the oldest frame. Appends are O(1) amortized.
+    """
+
+    def __init__(self, capacity, reserve=None):
+        self.capacity = max(1, int(capacity))
+        self._reserve = reserve
+        self.size = 0
+        self.head = 0
+        self.count = 0
+        self.total = 0
+        self._allocate(min(self.capacity, INITIAL_ALLOCATION))
+
+    def _allocate(self, size):
+        if self._reserve is not None and self.size and not self._reserve((size - self.size) * BYTES_PER_FRAME):
+            return False
+
+        timestamps = np.zeros(2 * size, dtype=np.float64)
+        dlc = np.zeros(2 * size, dtype=np.uint8)
+        payload = np.zeros((2 * size, 8), dtype=np.uint8)
+
+        if self.count:
+            # Linearize the current contents, oldest first
+            window = self.last(self.count)
+            for new, old in ((timestamps, window.timestamps), (dlc, window.dlc), (payload, window.payload)):
+                new[:self.count] = old
+                new[size:size + self.count] = old
+
+        self.timestamps, self.dlc, self.payload = timestamps, dlc, payload
+        self.size = size
+        self.head = self.count % size
+        return True
+
+    def append(self, data, dlc, timestamp):
+        if self.count == self.size and self.size < self.capacity:
+            if not self._allocate(min(self.size * 2, self.capacity)):
+                # Out of budget: keep rolling over at the current size
+                self.capacity = self.size
+
+        i = self.head
+        mirror = i + self.size
+        row = self.payload[i]
+        row[:] = 0
+        row[:len(data)] = data
+        self.payload[mirror] = row
+        self.timestamps[i] = self.timestamps[mirror] = timestamp
+        self.dlc[i] = self.dlc[mirror] = dlc
+
+        self.head = (i + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+        self.total += 1
+
+    def extend(self, payload, dlc, timestamps):
+        """
+        Append a batch of frames at once.
+        :param payload: (n, 8) uint8 array, zero-padded past each DLC
+        :param dlc: n DLC values
+        :param timestamps: n timestamps
+        """
+        count = len(timestamps)
+        while self.size < self.capacity and self.count + count > self.size:
+            if not self._allocate(min(self.size * 2, self.capacity)):
+                self.capacity = self.size
+                break
+
+        size = self.size
+        if count > size:
+            # Only the newest frames of an oversized batch survive anyway
+            self.total += count - size
+            payload, dlc, timestamps = payload[-size:], dlc[-size:], timestamps[-size:]
+            count = size
+
+        start = self.head
+        first = min(count, size - start)
+        rest = count - first
+        for target, source in ((self.payload, payload), (self.dlc, dlc), (self.timestamps, timestamps)):
+            target[start:start + first] = source[:first]
+            target[start + size:start + size + first] = source[:first]
+            if rest:
+                target[:rest] = source[first:]
+                target[size:size + rest] = source[first:]
+
+        self.head = (start + count) % size
+        self.count = min(self.count + count, size)
+        self.total += count
+
+    def last(self, k=None):
+        """
+        :param k: int - number of newest frames wanted (all stored frames if None)
+        :return: FrameWindow of read-only views, oldest frame first
+        """
+        k = self.count if k is None else max(0, min(int(k), self.count))
+        end = self.head + self.size
+        start = end - k
+        window = FrameWindow(self.timestamps[start:end], self.dlc[start:end], self.payload[start:end])
+        for view in window:
+            view.flags.writeable = False
+        return window
+
+    def since(self, total, limit=None):
+        """
+        Frames appended since ``self.total`` was ``total``, oldest first; frames
+        already overwritten are skipped.
+        :param limit: int - return only the oldest limit of them
+        :return: FrameWindow of read-only views
+        """
+        window = self.last(self.total - total)
+        if limit is not None:
+            window = FrameWindow(*(view[:limit] for view in window))
+        return window
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return self.timestamps.nbytes + self.dlc.nbytes + self.payload.nbytes
+
+
+class FrameStore:
+    """
+    Per-ID ring buffers with a default depth, optional per-ID depths and an
+    optional global memory budget (bytes). Once the budget is used up,
+    buffers stop growing and keep rolling over at their current size, and
+    IDs seen from then on keep only their latest MIN_DEPTH frames.
+    """
+
+    def __init__(self, depth=100000, memory_budget=None):
+        self.depth = depth
+        self.memory_budget = memory_budget
+        self.depths = {}
+        self.buffers = {}
+        self.allocated = 0
+
+    def set_depth(self, can_id, depth):
+        """Set the history depth for one ID; applies to buffers created afterwards."""
+        self.depths[can_id] = depth
+
+    def _reserve(self, nbytes):
+        if self.memory_budget is not None and self.allocated + nbytes > self.memory_budget:
+            return False
+        self.allocated += nbytes
+        return True
+
+    def buffer(self, can_id):
+        buffer = self.buffers.get(can_id)
+        if buffer is None:
+            depth = self.depths.get(can_id, self.depth)
+            if self.memory_budget is not None:
+                available = max(0, self.memory_budget - self.allocated) // BYTES_PER_FRAME
+                if available < min(depth, INITIAL_ALLOCATION):
+                    # Not even the first allocation fits: cap this ID at what is left
+                    depth = max(MIN_DEPTH, available)
+            buffer = FrameRingBuffer(depth, self._reserve)
+            self.allocated += buffer.nbytes
+            self.buffers[can_id] = buffer
+        return buffer
+
+    def append(self, can_id, data, dlc, timestamp):
+        self.buffer(can_id).append(data, dlc, timestamp)
+
+    def last(self, can_id, k=None):
+        buffer = self.buffers.get(can_id)
+        if buffer is None:
+            return FrameWindow(np.empty(0), np.empty(0, dtype=np.uint8), np.empty((0, 8), dtype=np.uint8))
+        return buffer.last(k)
+
+    def __contains__(self, can_id):
+        return can_id in self.buffers
@@ -1,38 +1,422 @@
+import time
+import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QSpinBox, QPushButton, QMessageBox
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QSpinBox, QPushButton,
+                             QMessageBox, QCheckBox, QDoubleSpinBox)
+from signal_decoder import INTEL, MOTOROLA, extract_signal, signal_layout
+from plot_decimation import minmax_decimate
 
 class GraphTab(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, metrics=None):
         super().__init__(parent)
+        # Optional PipelineMetrics receiving the live plot refresh time
+        self.metrics = metrics
         layout = QVBoxLayout()
         self.setLayout(layout)
 
-        # Controls
+        # Signal location controls
+        upper_controls_layout = QHBoxLayout()
+
         self.id_selector = QComboBox()
+        self.id_selector.currentTextChanged.connect(self.update_graph_options)
+        upper_controls_layout.addWidget(QLabel("CAN ID:"))
+        upper_controls_layout.addWidget(self.id_selector)
+
         self.byte_start_selector = QComboBox()
+        self.byte_start_selector.currentTextChanged.connect(self.update_bit_options)
+        upper_controls_layout.addWidget(QLabel("Start Byte:"))
+        upper_controls_layout.addWidget(self.byte_start_selector)
+
+        layout.addLayout(upper_controls_layout)
+
+        bit_controls_layout = QHBoxLayout()
+
         self.bit_start_selector = QComboBox()
+        self.bit_start_selector.currentTextChanged.connect(self.update_length_options)
+        bit_controls_layout.addWidget(QLabel("Start Bit:"))
+        bit_controls_layout.addWidget(self.bit_start_selector)
+
         self.bit_length_selector = QComboBox()
+        bit_controls_layout.addWidget(QLabel("Total Bit Length:"))
+        bit_controls_layout.addWidget(self.bit_length_selector)
+
+        # Big Endian is Motorola (start = MSB), Little Endian is Intel (start = LSB)
         self.endian_selector = QComboBox()
         self.endian_selector.addItems(["Big Endian", "Little Endian"])
+        self.endian_selector.currentTextChanged.connect(self.update_length_options)
+        bit_controls_layout.addWidget(QLabel("Endianness:"))
+        bit_controls_layout.addWidget(self.endian_selector)
+
+        layout.addLayout(bit_controls_layout)
+
+        # Value conversion controls
+        value_controls_layout = QHBoxLayout()
+
+        self.signed_checkbox = QCheckBox("Signed")
+        value_controls_layout.addWidget(self.signed_checkbox)
+
+        self.scale_spinner = QDoubleSpinBox()
+        self.scale_spinner.setDecimals(6)
+        self.scale_spinner.setRange(-1e9, 1e9)
+        self.scale_spinner.setValue(1.0)
+        value_controls_layout.addWidget(QLabel("Scale:"))
+        value_controls_layout.addWidget(self.scale_spinner)
+
+        self.offset_spinner = QDoubleSpinBox()
+        self.offset_spinner.setDecimals(6)
+        self.offset_spinner.setRange(-1e9, 1e9)
+        value_controls_layout.addWidget(QLabel("Offset:"))
+        value_controls_layout.addWidget(self.offset_spinner)
+
+        layout.addLayout(value_controls_layout)
+
+        # Plot controls
+        lower_controls_layout = QHBoxLayout()
+
         self.plot_type_selector = QComboBox()
         self.plot_type_selector.addItems(["Line Plot", "Scatter Plot", "Bar Plot"])
+        lower_controls_layout.addWidget(QLabel("Plot Type:"))
+        lower_controls_layout.addWidget(self.plot_type_selector)
+
         self.max_points_spinner = QSpinBox()
-        self.max_points_spinner.setRange(10, 500)
+        self.max_points_spinner.setRange(10, 10000000)
         self.max_points_spinner.setValue(100)
+        lower_controls_layout.addWidget(QLabel("Max Points:"))
+        lower_controls_layout.addWidget(self.max_points_spinner)
+
+        plot_button = QPushButton("Plot")
+        plot_button.clicked.connect(self.plot_data)
+        lower_controls_layout.addWidget(plot_button)
+
+        layout.addLayout(lower_controls_layout)
+
+        # Live plotting controls
+        live_controls_layout = QHBoxLayout()
+
+        add_trace_button = QPushButton("Add Live Trace")
+        add_trace_button.clicked.connect(self.add_live_trace)
+        live_controls_layout.addWidget(add_trace_button)
+
+        clear_traces_button = QPushButton("Clear Live Traces")
+        clear_traces_button.clicked.connect(self.clear_live_traces)
+        live_controls_layout.addWidget(clear_traces_button)
+
+        self.live_checkbox = QCheckBox("Live")
+        self.live_checkbox.toggled.connect(self.set_live)
+        live_controls_layout.addWidget(self.live_checkbox)
+
+        self.fps_spinner = QSpinBox()
+        self.fps_spinner.setRange(1, 60)
+        self.fps_spinner.setValue(30)
+        self.fps_spinner.valueChanged.connect(lambda _: self.set_live(self.live_checkbox.isChecked()))
+        live_controls_layout.addWidget(QLabel("FPS:"))
+        live_controls_layout.addWidget(self.fps_spinner)
+
+        layout.addLayout(live_controls_layout)
+
+        # Time range selection, only shown for offline logs
+        self.time_range_widget = QWidget()
+        time_range_layout = QHBoxLayout()
+        time_range_layout.setContentsMargins(0, 0, 0, 0)
+        self.time_range_widget.setLayout(time_range_layout)
+
+        self.time_from_spinner = QDoubleSpinBox()
+        self.time_to_spinner = QDoubleSpinBox()
+        for spinner in (self.time_from_spinner, self.time_to_spinner):
+            spinner.setDecimals(3)
+            spinner.setSuffix(" s")
+        time_range_layout.addWidget(QLabel("From:"))
+        time_range_layout.addWidget(self.time_from_spinner)
+        time_range_layout.addWidget(QLabel("To:"))
+        time_range_layout.addWidget(self.time_to_spinner)
+
+        self.time_range_widget.setVisible(False)
+        self.time_origin = None
+        layout.addWidget(self.time_range_widget)
 
         # Graphing
         self.figure, self.ax = plt.subplots()
         self.canvas = FigureCanvas(self.figure)
         layout.addWidget(self.canvas)
 
+        # Live traces are animated artists blitted over a cached background
+        self.live_traces = []
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        self.live_timer = QTimer(self)
+        self.live_timer.timeout.connect(self.update_live_plot)
+
         self.can_data = {}
 
+    def reset(self):
+        """Forget all IDs and traces, e.g. when switching to an offline log."""
+        self.live_checkbox.setChecked(False)
+        self.clear_live_traces()
+        self.ax.clear()
+        self.canvas.draw()
+        self.can_data = {}
+        self.id_selector.clear()
+        self.set_time_bounds(None, None)
+
+    def set_time_bounds(self, start_time, end_time):
+        """Enable the From/To selectors for a log spanning start_time..end_time (absolute seconds)."""
+        if start_time is None:
+            self.time_origin = None
+            self.time_range_widget.setVisible(False)
+            return
+
+        self.time_origin = start_time
+        duration = max(0.0, end_time - start_time)
+        for spinner in (self.time_from_spinner, self.time_to_spinner):
+            spinner.setRange(0.0, duration)
+        self.time_from_spinner.setValue(0.0)
+        self.time_to_spinner.setValue(duration)
+        self.time_range_widget.setVisible(True)
+
     def update_can_ids(self, can_data):
+        """Add newly seen CAN IDs to the selector without disturbing the current selection."""
         self.can_data = can_data
-        self.id_selector.clear()
-        self.id_selector.addItems(can_data.keys())
+        if self.id_selector.count() == len(can_data):
+            return
+
+        known = {self.id_selector.itemText(i) for i in range(self.id_selector.count())}
+        self.id_selector.addItems([can_id for can_id in can_data if can_id not in known])
+
+    def update_graph_options(self):
+        can_id = self.id_selector.currentText()
+        if not can_id:
+            return
+
+        data = self.can_data.get(can_id, {}).get('last_data', [])
+
+        self.byte_start_selector.clear()
+        self.byte_start_selector.addItems([f"Byte {i} (0x{data[i]:02X})" for i in range(len(data))])
+
+        self.update_bit_options()
+
+    def update_bit_options(self):
+        self.bit_start_selector.blockSignals(True)
+        self.bit_start_selector.clear()
+        self.bit_start_selector.addItems([str(i) for i in range(8)])
+        self.bit_start_selector.blockSignals(False)
+
+        self.update_length_options()
+
+    def update_length_options(self):
+        """Offer only lengths that fit in the message from the selected start position."""
+        self.bit_length_selector.clear()
+        if not self.byte_start_selector.currentText() or not self.bit_start_selector.currentText():
+            return
+
+        can_id = self.id_selector.currentText()
+        data_length = len(self.can_data.get(can_id, {}).get('last_data', []))
+        start_byte = int(self.byte_start_selector.currentText().split()[1])
+        start_bit = int(self.bit_start_selector.currentText())
+
+        if self.endian_selector.currentText() == "Little Endian":
+            max_bits = data_length * 8 - (start_byte * 8 + start_bit)
+        else:
+            max_bits = (data_length - start_byte - 1) * 8 + start_bit + 1
+
+        self.bit_length_selector.addItems([str(i) for i in range(1, min(max_bits, 64) + 1)])
+
+    def select_signal(self, can_id, start_bit, length, byte_order=INTEL):
+        """
+        Pre-fill the selectors with a DBC-style bit field, e.g. from the Bit Activity tab.
+        :return: bool - False if the ID or the bits are not available
+        """
+        index = self.id_selector.findText(can_id)
+        if index < 0:
+            return False
+        self.id_selector.setCurrentIndex(index)
+        self.update_graph_options()
+
+        start_byte = start_bit // 8
+        if start_byte >= self.byte_start_selector.count():
+            return False
+        self.endian_selector.setCurrentText("Little Endian" if byte_order == INTEL else "Big Endian")
+        self.byte_start_selector.setCurrentIndex(start_byte)
+        self.bit_start_selector.setCurrentIndex(start_bit % 8)
+        index = self.bit_length_selector.findText(str(length))
+        if index < 0:
+            return False
+        self.bit_length_selector.setCurrentIndex(index)
+        return True
+
+    def extract_multi_bit_value(self, payload, start_byte, start_bit, total_bit_length, is_little_endian=True,
+                                signed=False, scale=1.0, offset=0.0, dlc=None):
+        """
+        Extract a bit-field from every frame of an N x 8 payload array.
+        :param payload: N x 8 uint8 array (e.g. a FrameRingBuffer window)
+        :param start_byte: Starting byte index
+        :param start_bit: Bit within the start byte (0-7); LSB for little endian, MSB for big endian
+        :param total_bit_length: Total number of bits to extract
+        :param is_little_endian: Intel byte order if True, Motorola otherwise
+        :param dlc: Optional per-frame DLCs; frames too short for the signal are skipped
+        :return: numpy array of extracted values
+        """
+        byte_order = INTEL if is_little_endian else MOTOROLA
+        return extract_signal(payload, start_byte * 8 + start_bit, total_bit_length, byte_order,
+                              signed, scale, offset, dlc)
+
+    def selected_signal(self):
+        """Snapshot of the current selector values; raises ValueError if incomplete."""
+        return {
+            'can_id': self.id_selector.currentText(),
+            'start_byte': int(self.byte_start_selector.currentText().split()[1]),
+            'start_bit': int(self.bit_start_selector.currentText()),
+            'total_bit_length': int(self.bit_length_selector.currentText()),
+            'is_little_endian': self.endian_selector.currentText() == "Little Endian",
+            'signed': self.signed_checkbox.isChecked(),
+            'scale': self.scale_spinner.value(),
+            'offset': self.offset_spinner.value(),
+        }
+
+    def extract_selected(self, selection, max_points):
+        """
+        The selected signal over the newest max_points frames of its ID.
+        :return: (index of each value in the window, values, number of frames in the window); frames
+                 too short for the signal are skipped, so the indexes keep the others in place
+        """
+        history = self.can_data[selection['can_id']]['history']
+        if self.time_origin is not None and hasattr(history, 'set_time_range'):
+            # Inclusive upper bound so the last frame of the log is reachable
+            history.set_time_range(self.time_origin + self.time_from_spinner.value(),
+                                   self.time_origin + self.time_to_spinner.value() + 1e-9)
+        window = history.last(max_points)
+        values = self.extract_multi_bit_value(
+            window.payload,
+            selection['start_byte'],
+            selection['start_bit'],
+            selection['total_bit_length'],
+            selection['is_little_endian'],
+            selection['signed'],
+            selection['scale'],
+            selection['offset']
+        )
+        byte_order = INTEL if selection['is_little_endian'] else MOTOROLA
+        _, required_bytes = signal_layout(selection['start_byte'] * 8 + selection['start_bit'],
+                                          selection['total_bit_length'], byte_order)
+        indexes = np.flatnonzero(np.asarray(window.dlc) >= required_bytes)
+        return indexes, values[indexes], len(values)
 
     def plot_data(self):
+        if not self.id_selector.currentText():
+            return
+
+        self.live_checkbox.setChecked(False)
+        self.clear_live_traces()
         self.ax.clear()
+
+        try:
+            selection = self.selected_signal()
+            can_id = selection['can_id']
+            start_byte = selection['start_byte']
+            start_bit = selection['start_bit']
+            total_bit_length = selection['total_bit_length']
+            plot_type = self.plot_type_selector.currentText()
+            indexes, collected_data, _ = self.extract_selected(selection, self.max_points_spinner.value())
+
+            title_text = (f"{plot_type} for {can_id}\n"
+                          f"Start: Byte {start_byte}, Bit {start_bit}, Length {total_bit_length}")
+            if plot_type == "Line Plot":
+                x, y = minmax_decimate(indexes, collected_data, self.ax.bbox.width)
+                self.ax.plot(x, y, marker='o' if len(y) <= 500 else None)
+            elif plot_type == "Scatter Plot":
+                self.ax.scatter(indexes, collected_data)
+            else:
+                self.ax.bar(indexes, collected_data)
+
+            self.ax.set_title(title_text)
+            self.ax.set_xlabel("Message Index")
+            self.ax.set_ylabel("Extracted Value")
+
+            self.canvas.draw()
+        except Exception as e:
+            QMessageBox.critical(self, "Plot Error",
+                f"Could not extract data: {str(e)}\n"
+                "Check your byte and bit selections.")
+
+    def add_live_trace(self):
+        """Add the current selection as a live trace and start live mode."""
+        try:
+            selection = self.selected_signal()
+        except (ValueError, IndexError):
+            return
+
+        if not self.live_traces:
+            self.ax.clear()
+            self.ax.set_xlabel("Samples (0 = newest)")
+            self.ax.set_ylabel("Value")
+
+        label = (f"{selection['can_id']} B{selection['start_byte']}.{selection['start_bit']}"
+                 f" L{selection['total_bit_length']}")
+        line, = self.ax.plot([], [], animated=True, label=label)
+        self.live_traces.append({'selection': selection, 'line': line})
+        self.ax.legend(loc='upper left')
+
+        self.live_checkbox.setChecked(True)
+        self.canvas.draw()
+
+    def clear_live_traces(self):
+        for trace in self.live_traces:
+            trace['line'].remove()
+        self.live_traces = []
+        if self.ax.get_legend() is not None:
+            self.ax.get_legend().remove()
         self.canvas.draw()
+
+    def set_live(self, enabled):
+        if enabled:
+            self.live_timer.start(int(1000 / self.fps_spinner.value()))
+        else:
+            self.live_timer.stop()
+
+    def on_draw(self, event):
+        # A full redraw (resize, rescale) invalidates the cached background
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        for trace in self.live_traces:
+            self.ax.draw_artist(trace['line'])
+
+    def update_live_plot(self):
+        """Update line data only; redraw the axes only when the limits must change."""
+        if not self.live_traces:
+            return
+
+        started = time.perf_counter()
+        max_points = self.max_points_spinner.value()
+        columns = max(1, int(self.ax.bbox.width))
+        y_min, y_max = np.inf, -np.inf
+
+        for trace in self.live_traces:
+            try:
+                indexes, values, frames = self.extract_selected(trace['selection'], max_points)
+            except (KeyError, ValueError):
+                continue
+            # Counted back from the newest frame of the window
+            x, y = minmax_decimate(indexes - (frames - 1), values, columns)
+            trace['line'].set_data(x, y)
+            if len(y):
+                y_min = min(y_min, float(np.min(y)))
+                y_max = max(y_max, float(np.max(y)))
+
+        if y_min > y_max:
+            return
+
+        low, high = self.ax.get_ylim()
+        x_limits = (1 - max_points, 0)
+        if y_min < low or y_max > high or self.ax.get_xlim() != x_limits or self.background is None:
+            margin = (y_max - y_min) * 0.1 or 1
+            self.ax.set_ylim(y_min - margin, y_max + margin)
+            self.ax.set_xlim(*x_limits)
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            for trace in self.live_traces:
+                self.ax.draw_artist(trace['line'])
+            self.canvas.blit(self.ax.bbox)
+
+        if self.metrics is not None:
+            self.metrics.record_stage('plot', time.perf_counter() - started)
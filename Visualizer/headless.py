@@ -0,0 +1,155 @@
+"""
+Headless capture: stream frames to stdout and print per-ID statistics.
+
+Only the receiver and its serial dependencies are imported, so this runs on
+machines without a display (or without PyQt5/matplotlib installed).
+"""
+import json
+import sys
+import time
+from can_receiver import CANMessageReceiver
+from multi_receiver import MultiReceiver
+from channels import channel_name, frame_key, key_label
+from serial_protocol import encode_frame
+from metrics import format_metrics
+
+DRAIN_INTERVAL = 0.05
+
+
+class FrameWriter:
+    """Writes drained batches to a binary stream as JSON lines or wire-format binary records."""
+
+    def __init__(self, stream, output_format='json'):
+        self.stream = stream
+        self.output_format = output_format
+
+    def write(self, messages):
+        if self.output_format == 'json':
+            self.stream.write(''.join(json.dumps(message) + '\n' for message in messages).encode('utf-8'))
+        elif self.output_format == 'binary':
+            self.stream.write(b''.join(
+                encode_frame(message['ID'], message['Data'], message.get('Extended', False),
+                             message.get('RTR', False), message['Length'], message.get('Micros'))
+                for message in messages))
+        else:
+            return
+        self.stream.flush()
+
+
+class IntervalStats:
+    """Frame counts per ID between two stats reports, combined with the receiver's timing statistics."""
+
+    def __init__(self, timing, receiver=None):
+        self.timing = timing
+        self.receiver = receiver
+        self.counts = {}
+        self.started = time.time()
+
+    def add(self, messages):
+        for message in messages:
+            key = frame_key(message)
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def report(self, stream):
+        elapsed = max(time.time() - self.started, 1e-9)
+        total = sum(self.counts.values())
+        lines = [f"[stats] {total} frames, {total / elapsed:.1f} frames/s, {len(self.counts)} IDs"]
+        if self.receiver is not None:
+            lines.append(f"[pipeline] {format_metrics(self.receiver.metrics.snapshot())}")
+            # With several interfaces, also one line per channel
+            for channel, receiver in enumerate(getattr(self.receiver, 'channels', [])):
+                lines.append(f"[pipeline {channel_name(channel)}] {format_metrics(receiver.metrics.snapshot())}")
+        status = self.receiver.device_status if self.receiver is not None else None
+        if status:
+            for name, channel_status in status.get('Channels', {'': status}).items():
+                label = f"[device {name}]" if name else "[device]"
+                lines.append(f"{label} overflow {channel_status.get('RxOverflow', 0)}, "
+                             f"dropped {channel_status.get('Dropped', 0)}, "
+                             f"errors {channel_status.get('ErrorFrames', 0)}, TEC {channel_status.get('TEC', 0)}, "
+                             f"REC {channel_status.get('REC', 0)}")
+        for key in sorted(self.counts):
+            count = self.counts[key]
+            timing = self.timing.get(key)
+            label = key_label(*key) if isinstance(key, tuple) else key_label(None, key)
+            lines.append(f"  {label}: {count} frames, {count / elapsed:.1f}/s, "
+                         f"period {timing.ewma_period:.2f} ms, jitter {timing.jitter:.2f} ms, "
+                         f"missed {timing.missed_cycles}")
+        stream.write('\n'.join(lines) + '\n')
+        stream.flush()
+
+        self.counts = {}
+        self.started = time.time()
+
+
+def run(ports, baudrate=250000, output_format='json', stats_interval=5.0, binary=True, dbc_path=None,
+        record_directory=None, watch=None, extended=False, can_bitrate=250000, triggers=None, trigger_directory='.',
+        pre_trigger=5.0, post_trigger=5.0):
+    """
+    Capture until interrupted. Frames go to stdout, stats to stderr.
+    :param ports: str, or a list of ports captured as channels can0, can1, ... of one merged stream
+    :return: int - process exit code
+    """
+    if isinstance(ports, str):
+        ports = [ports]
+    if len(ports) > 1:
+        receiver = MultiReceiver(ports, baudrate, binary=binary, can_bitrate=can_bitrate)
+    else:
+        receiver = CANMessageReceiver(ports[0], baudrate, binary=binary, batched=True, can_bitrate=can_bitrate)
+    if dbc_path:
+        receiver.load_dbc(dbc_path)
+    if not receiver.connect():
+        return 1
+
+    if watch:
+        from acceptance_filter import parse_id_list
+        config = receiver.set_acceptance_filter(parse_id_list(watch), extended)
+        if config is not None:
+            sys.stderr.write(f"[filter] {config.requested} IDs requested, up to {config.accepted} accepted\n")
+
+    if triggers:
+        try:
+            receiver.set_trigger(triggers, trigger_directory, pre_trigger, post_trigger)
+        except ValueError as e:
+            sys.stderr.write(f"Error: Invalid trigger: {e}\n")
+            receiver.stop()
+            return 2
+        sys.stderr.write(f"[trigger] armed: {'; '.join(triggers)}\n")
+
+    if record_directory:
+        from recorder import FrameRecorder
+        recorder = FrameRecorder(record_directory)
+        recorder.start()
+        receiver.recorder = recorder
+
+    writer = FrameWriter(sys.stdout.buffer, output_format)
+    stats = IntervalStats(receiver.timing, receiver)
+    next_stats = time.time() + stats_interval if stats_interval else None
+    reported_captures = 0
+
+    try:
+        while receiver.running:
+            time.sleep(DRAIN_INTERVAL)
+            batch = receiver.frame_queue.drain()
+            if batch:
+                started = time.perf_counter()
+                writer.write(batch)
+                receiver.metrics.record_stage('output', time.perf_counter() - started)
+                stats.add(batch)
+
+            # Report each trigger capture once it has been handed to the writer
+            for event in receiver.trigger_events()[reported_captures:]:
+                if not event.frames:
+                    break
+                fired = time.strftime('%H:%M:%S', time.localtime(event.time))
+                sys.stderr.write(f"[trigger] {event.condition} at {fired}: {event.frames} frames -> {event.path}\n")
+                reported_captures += 1
+
+            if next_stats is not None and time.time() >= next_stats:
+                stats.report(sys.stderr)
+                next_stats += stats_interval
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        receiver.stop()
+
+    return 0
@@ -0,0 +1,110 @@
+"""
+Device clock alignment and pipeline latency tracking.
+
+The sketch stamps every frame with its 32-bit ``micros()`` counter, which
+wraps every ~71.6 minutes. DeviceClock unwraps it into a monotonic device
+time and estimates the device->host clock offset as the smallest observed
+(host - device) difference, i.e. the fastest delivery seen. The offset may
+creep upwards by DRIFT_ALLOWANCE to follow crystal drift. Latencies reported
+relative to that offset show how much longer than the best case a frame took.
+"""
+import collections
+import threading
+
+MICROS_WRAP = 1 << 32
+# Maximum clock drift followed by the offset estimate (seconds per second, 100 ppm)
+DRIFT_ALLOWANCE = 100e-6
+
+
+class DeviceClock:
+    def __init__(self):
+        self.last_raw = None
+        self.wraps = 0
+        self.offset = None
+        self.last_host = None
+
+    def unwrap(self, raw_micros):
+        """Convert a raw 32-bit micros() value into monotonic device seconds."""
+        if self.last_raw is not None and raw_micros < self.last_raw and self.last_raw - raw_micros > MICROS_WRAP // 2:
+            self.wraps += 1
+        self.last_raw = raw_micros
+        return (raw_micros + self.wraps * MICROS_WRAP) / 1e6
+
+    def align(self, device_time, host_time):
+        """
+        Map a device time onto the host clock.
+        :return: float - estimated host time at which the device received the frame
+        """
+        sample = host_time - device_time
+        if self.offset is None:
+            self.offset = sample
+        else:
+            allowed = self.offset + DRIFT_ALLOWANCE * max(0.0, host_time - self.last_host)
+            self.offset = min(sample, allowed)
+        self.last_host = host_time
+        return device_time + self.offset
+
+
+class LatencyTracker:
+    """Keeps the most recent latency samples (seconds) and reports percentiles on demand."""
+
+    def __init__(self, size=10000):
+        self.samples = collections.deque(maxlen=size)
+        self.count = 0
+
+    def add(self, latency):
+        self.samples.append(latency)
+        self.count += 1
+
+    def add_many(self, latencies):
+        self.samples.extend(latencies)
+        self.count += len(latencies)
+
+    def percentiles(self, points=(50, 90, 99)):
+        """
+        :return: dict of percentile -> latency in ms, plus 'max'; empty if no samples
+        """
+        ordered = sorted(list(self.samples))
+        if not ordered:
+            return {}
+        last = len(ordered) - 1
+        result = {point: ordered[min(last, int(round(point / 100 * last)))] * 1000 for point in points}
+        result['max'] = ordered[-1] * 1000
+        return result
+
+
+class PipelineLatency:
+    """Latency of each stage: device->host (serial, USB, parsing), host->GUI (queue, refresh) and total."""
+
+    STAGES = ('device_to_host', 'host_to_gui', 'device_to_gui')
+
+    def __init__(self, size=10000):
+        self.lock = threading.Lock()
+        self.trackers = {stage: LatencyTracker(size) for stage in self.STAGES}
+
+    def record_host(self, messages):
+        """Called by the reader thread once per parsed batch."""
+        latencies = [message['HostTime'] - message['Timestamp'] for message in messages if 'DeviceTime' in message]
+        if latencies:
+            with self.lock:
+                self.trackers['device_to_host'].add_many(latencies)
+
+    def record_gui(self, messages, gui_time):
+        """Called by the GUI when a batch is drained."""
+        to_gui = [gui_time - message['HostTime'] for message in messages if 'HostTime' in message]
+        total = [gui_time - message['Timestamp'] for message in messages if 'DeviceTime' in message]
+        with self.lock:
+            self.trackers['host_to_gui'].add_many(to_gui)
+            self.trackers['device_to_gui'].add_many(total)
+
+    def record_stages(self, device_to_host, host_to_gui, device_to_gui):
+        """Add precomputed latencies (seconds) per stage, e.g. from frames read out of another process."""
+        with self.lock:
+            self.trackers['device_to_host'].add_many(device_to_host)
+            self.trackers['host_to_gui'].add_many(host_to_gui)
+            self.trackers['device_to_gui'].add_many(device_to_gui)
+
+    def snapshot(self):
+        """Stage -> percentiles dict (ms)."""
+        with self.lock:
+            return {stage: tracker.percentiles() for stage, tracker in self.trackers.items()}
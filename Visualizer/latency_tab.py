@@ -0,0 +1,49 @@
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QTableWidget, QTableWidgetItem
+
+class LatencyTab(QWidget):
+    """Percentiles of device->host->GUI latency, refreshed once per second."""
+
+    STAGE_LABELS = {
+        'device_to_host': 'Device -> Host',
+        'host_to_gui': 'Host -> GUI',
+        'device_to_gui': 'Device -> GUI',
+    }
+    COLUMNS = [50, 90, 99, 'max']
+
+    def __init__(self, latency, parent=None):
+        super().__init__(parent)
+        self.latency = latency
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        layout.addWidget(QLabel(
+            "Latency in ms. Device times are aligned to the fastest delivery seen, "
+            "so Device -> Host is the delay beyond the best case."))
+
+        self.table = QTableWidget(len(self.STAGE_LABELS), len(self.COLUMNS))
+        self.table.setVerticalHeaderLabels(list(self.STAGE_LABELS.values()))
+        self.table.setHorizontalHeaderLabels([f"p{c}" if c != 'max' else 'max' for c in self.COLUMNS])
+        layout.addWidget(self.table)
+        layout.addStretch()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+
+        snapshot = self.latency.snapshot()
+        for row, stage in enumerate(self.STAGE_LABELS):
+            percentiles = snapshot.get(stage, {})
+            for column, point in enumerate(self.COLUMNS):
+                value = percentiles.get(point)
+                text = f"{value:.2f}" if value is not None else '-'
+                item = self.table.item(row, column)
+                if item is None:
+                    self.table.setItem(row, column, QTableWidgetItem(text))
+                else:
+                    item.setText(text)
@@ -1,10 +1,76 @@
+import argparse
 import sys
-from PyQt5.QtWidgets import QApplication
-from main_window import CANMessageVisualizer
+from channels import MAX_CHANNELS
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="CAN message analyzer for the Arduino MCP2515 console sketch")
+    parser.add_argument('ports', nargs='*', metavar='port',
+                        help="serial port, e.g. COM3 or /dev/ttyUSB0; several ports are captured as can0, can1, ...")
+    parser.add_argument('--baud', type=int, default=250000, help="serial baud rate (default: 250000)")
+    parser.add_argument('--text', action='store_true', help="do not negotiate binary framing, use JSON lines")
+    parser.add_argument('--can-bitrate', type=int, default=250000,
+                        help="CAN bus bitrate used for the bus load estimate (default: 250000)")
+    parser.add_argument('--dbc', help="DBC file used to decode signals")
+    parser.add_argument('--log', help="open a recorded .canlog instead of a serial port (GUI only)")
+    parser.add_argument('--process', action='store_true',
+                        help="read, parse and decode in a separate process that shares frames with the GUI")
+    parser.add_argument('--headless', action='store_true', help="run without the GUI")
+    parser.add_argument('--format', choices=['json', 'binary', 'none'], default='json',
+                        help="headless frame output on stdout (default: json)")
+    parser.add_argument('--stats-interval', type=float, default=5.0,
+                        help="seconds between per-ID stats on stderr in headless mode, 0 to disable")
+    parser.add_argument('--record', metavar='DIR', help="record frames to .canlog files in DIR (headless)")
+    parser.add_argument('--watch', metavar='IDS',
+                        help="program the MCP2515 filters to pass only these hex IDs/ranges, e.g. 100-10F,7E8")
+    parser.add_argument('--extended', action='store_true', help="--watch IDs are 29-bit extended IDs")
+    parser.add_argument('--trigger', action='append', metavar='CONDITION',
+                        help="write a capture when the condition fires, e.g. 7E8, '123[2]=0xFF', 100.missing>100 "
+                             "(repeatable, see trigger.py)")
+    parser.add_argument('--trigger-dir', default='.', metavar='DIR', help="directory for trigger captures")
+    parser.add_argument('--pre-trigger', type=float, default=5.0, metavar='SECONDS',
+                        help="seconds kept from before a trigger (default: 5)")
+    parser.add_argument('--post-trigger', type=float, default=5.0, metavar='SECONDS',
+                        help="seconds captured after a trigger (default: 5)")
+    args = parser.parse_args(argv)
+
+    if args.headless and not args.ports:
+        parser.error("--headless requires a serial port")
+    if len(args.ports) > MAX_CHANNELS:
+        parser.error(f"at most {MAX_CHANNELS} ports can be captured at once")
+    if len(args.ports) > 1 and args.process:
+        parser.error("--process supports a single port")
+    if len(args.ports) > 1 and args.headless and args.format == 'binary':
+        parser.error("--format binary has no channel field, use json with several ports")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # GUI modules pull in PyQt5, matplotlib and NumPy; import them only when needed
+    if args.headless:
+        from headless import run
+        sys.exit(run(args.ports, args.baud, args.format, args.stats_interval, not args.text, args.dbc, args.record,
+                     args.watch, args.extended, args.can_bitrate, args.trigger, args.trigger_dir,
+                     args.pre_trigger, args.post_trigger))
+
+    from PyQt5.QtWidgets import QApplication
+    from main_window import CANMessageVisualizer
 
-def main():
     app = QApplication(sys.argv)
-    visualizer = CANMessageVisualizer(serial_port="COM3")
+    visualizer = CANMessageVisualizer(serial_port=args.ports or None, log_path=args.log, baudrate=args.baud,
+                                      binary=not args.text, can_bitrate=args.can_bitrate,
+                                      process=args.process)
+    if args.dbc:
+        visualizer.receiver.load_dbc(args.dbc)
+    if args.watch:
+        visualizer.hw_filter_input.setText(args.watch)
+        visualizer.hw_filter_extended.setChecked(args.extended)
+        visualizer.handle_apply_hw_filter()
+    if args.trigger:
+        visualizer.trigger_input.setText('; '.join(args.trigger))
+        visualizer.pre_trigger_spinner.setValue(args.pre_trigger)
+        visualizer.post_trigger_spinner.setValue(args.post_trigger)
+        visualizer.arm_trigger(args.trigger_dir)
     visualizer.show()
     sys.exit(app.exec_())
 
@@ -1,22 +1,62 @@
-from PyQt5.QtWidgets import QMainWindow, QVBoxLayout, QWidget, QTabWidget, QLabel, QFormLayout, QLineEdit, QPushButton, QTableWidget, QTableWidgetItem
+import time
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import (QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QTabWidget, QLabel, QFormLayout,
+                             QLineEdit, QPushButton, QTableView, QFileDialog, QMessageBox, QCheckBox, QComboBox,
+                             QDoubleSpinBox)
+import numpy as np
 from can_receiver import CANMessageReceiver
+from process_receiver import ProcessReceiver
+from multi_receiver import MultiReceiver
+from channels import CHANNEL_SHIFT, channel_name, frame_key, key_label, parse_key_label
 from graph_tab import GraphTab
+from message_table_model import CANMessageTableModel, CANMessageFilterModel
+from frame_store import FrameStore
+from recorder import FrameRecorder, LOG_EXTENSION
+from offline_log import OfflineLog, OfflineHistory
+from latency_tab import LatencyTab
+from bit_activity_tab import BitActivityTab
+from tx_scheduler import TransmitScheduler
+from acceptance_filter import parse_id_list
+from metrics import format_metrics
+from transmit_tab import TransmitTab
 
 class CANMessageVisualizer(QMainWindow):
-    def __init__(self, serial_port):
+    def __init__(self, serial_port=None, refresh_rate=30, history_depth=100000, memory_budget=None, log_path=None,
+                 baudrate=250000, binary=True, can_bitrate=250000, process=False):
         super().__init__()
         self.setWindowTitle('CAN Message Visualizer')
 
-        self.receiver = CANMessageReceiver(serial_port)
-        self.receiver.message_received.connect(self.update_can_data)
+        self.can_data = {}
+        self.frame_store = FrameStore(history_depth, memory_budget)
+        self.offline_log = None
+
+        # A list of ports is captured side by side and merged into one stream tagged with the channel
+        if isinstance(serial_port, (list, tuple)):
+            serial_port = list(serial_port) if len(serial_port) > 1 else (serial_port[0] if serial_port else None)
+        if isinstance(serial_port, list):
+            self.receiver = MultiReceiver(serial_port, baudrate, binary=binary, can_bitrate=can_bitrate)
+        elif process:
+            # Reading, parsing and decoding run in a worker process; frames arrive through shared memory
+            self.receiver = ProcessReceiver(serial_port, baudrate, binary=binary, can_bitrate=can_bitrate)
+        else:
+            self.receiver = CANMessageReceiver(serial_port, baudrate, binary=binary, batched=True,
+                                               can_bitrate=can_bitrate)
+        self.tx_scheduler = TransmitScheduler(self.receiver)
 
-        self.graph_tab = GraphTab()
         self.init_ui()
 
-        if not self.receiver.connect():
+        if serial_port is not None and not self.receiver.connect():
             print("Failed to connect to the serial port")
             exit()
 
+        # Drain the receiver's frame queue at a fixed rate instead of per frame
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.drain_frames)
+        self.set_refresh_rate(refresh_rate)
+
+        if log_path is not None:
+            self.open_log(log_path)
+
     def init_ui(self):
         self.tabs = QTabWidget(self)
         self.setCentralWidget(self.tabs)
@@ -25,13 +65,423 @@ class CANMessageVisualizer(QMainWindow):
         self.message_layout = QVBoxLayout()
         self.message_tab.setLayout(self.message_layout)
 
-        self.table = QTableWidget(0, 4)
+        toolbar_layout = QHBoxLayout()
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("Filter by CAN ID or data")
+        toolbar_layout.addWidget(self.filter_input)
+
+        load_dbc_button = QPushButton("Load DBC...")
+        load_dbc_button.clicked.connect(self.handle_load_dbc)
+        toolbar_layout.addWidget(load_dbc_button)
+
+        open_log_button = QPushButton("Open Log...")
+        open_log_button.clicked.connect(self.handle_open_log)
+        toolbar_layout.addWidget(open_log_button)
+
+        self.candump_checkbox = QCheckBox("candump text")
+        toolbar_layout.addWidget(self.candump_checkbox)
+
+        self.record_button = QPushButton("Record...")
+        self.record_button.setCheckable(True)
+        self.record_button.toggled.connect(self.handle_record)
+        toolbar_layout.addWidget(self.record_button)
+        self.message_layout.addLayout(toolbar_layout)
+
+        self.table_model = CANMessageTableModel(self.can_data, self)
+        self.table_proxy = CANMessageFilterModel(self)
+        self.table_proxy.setSourceModel(self.table_model)
+        self.filter_input.textChanged.connect(self.table_proxy.setFilterFixedString)
+
+        self.table = QTableView()
+        self.table.setModel(self.table_proxy)
+        self.table.setSortingEnabled(True)
+        self.table.verticalHeader().setVisible(False)
         self.message_layout.addWidget(self.table)
+        self.add_hardware_filter_section(self.message_layout)
+        self.add_trigger_section(self.message_layout)
+        self.add_send_frame_section(self.message_layout)
 
-        self.graph_tab = GraphTab()
+        self.graph_tab = GraphTab(metrics=self.receiver.metrics)
         self.tabs.addTab(self.message_tab, "Messages")
         self.tabs.addTab(self.graph_tab, "Graphs")
 
-    def update_can_data(self, message):
-        # Update table with incoming CAN data
-        pass
+        self.bit_activity_tab = BitActivityTab(self.can_data, self.graph_tab)
+        self.tabs.addTab(self.bit_activity_tab, "Bit Activity")
+
+        self.latency_tab = LatencyTab(self.receiver.latency)
+        self.tabs.addTab(self.latency_tab, "Latency")
+
+        self.transmit_tab = TransmitTab(self.tx_scheduler)
+        self.tabs.addTab(self.transmit_tab, "Transmit")
+
+        self.metrics_label = QLabel()
+        self.statusBar().addPermanentWidget(self.metrics_label)
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self.update_metrics)
+        self.metrics_timer.start(1000)
+        self.device_label = QLabel()
+        self.statusBar().addPermanentWidget(self.device_label)
+        self.shown_device_status = None
+
+    def add_hardware_filter_section(self, layout):
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Watch IDs:"))
+
+        self.hw_filter_input = QLineEdit()
+        self.hw_filter_input.setPlaceholderText("IDs/ranges in hex for the MCP2515 filters, e.g. 100-10F, 7E8")
+        filter_layout.addWidget(self.hw_filter_input)
+
+        self.hw_filter_extended = QCheckBox("Extended")
+        filter_layout.addWidget(self.hw_filter_extended)
+
+        selection_button = QPushButton("From Selection")
+        selection_button.clicked.connect(self.handle_filter_from_selection)
+        filter_layout.addWidget(selection_button)
+
+        apply_button = QPushButton("Apply")
+        apply_button.clicked.connect(self.handle_apply_hw_filter)
+        filter_layout.addWidget(apply_button)
+
+        clear_button = QPushButton("Watch All")
+        clear_button.clicked.connect(self.handle_clear_hw_filter)
+        filter_layout.addWidget(clear_button)
+
+        layout.addLayout(filter_layout)
+
+    def add_trigger_section(self, layout):
+        trigger_layout = QHBoxLayout()
+        trigger_layout.addWidget(QLabel("Trigger:"))
+
+        self.trigger_input = QLineEdit()
+        self.trigger_input.setPlaceholderText("Conditions separated by ';', e.g. 7E8; 123[2]=0xFF; 100.missing>100")
+        trigger_layout.addWidget(self.trigger_input)
+
+        trigger_layout.addWidget(QLabel("Pre (s):"))
+        self.pre_trigger_spinner = QDoubleSpinBox()
+        self.pre_trigger_spinner.setRange(0, 600)
+        self.pre_trigger_spinner.setValue(5)
+        trigger_layout.addWidget(self.pre_trigger_spinner)
+
+        trigger_layout.addWidget(QLabel("Post (s):"))
+        self.post_trigger_spinner = QDoubleSpinBox()
+        self.post_trigger_spinner.setRange(0, 600)
+        self.post_trigger_spinner.setValue(5)
+        trigger_layout.addWidget(self.post_trigger_spinner)
+
+        self.trigger_button = QPushButton("Arm...")
+        self.trigger_button.setCheckable(True)
+        self.trigger_button.toggled.connect(self.handle_trigger)
+        trigger_layout.addWidget(self.trigger_button)
+
+        self.trigger_label = QLabel()
+        trigger_layout.addWidget(self.trigger_label)
+        layout.addLayout(trigger_layout)
+
+    def handle_trigger(self, enabled):
+        if not enabled:
+            self.receiver.clear_trigger()
+            self.trigger_button.setText("Arm...")
+            return
+
+        directory = QFileDialog.getExistingDirectory(self, "Trigger Capture Directory")
+        if not directory or not self.arm_trigger(directory):
+            self.trigger_button.setChecked(False)
+
+    def arm_trigger(self, directory):
+        """Arm the conditions typed in the trigger row; captures are written to directory."""
+        conditions = [condition for condition in self.trigger_input.text().split(';') if condition.strip()]
+        try:
+            if not self.receiver.set_trigger(conditions, directory, self.pre_trigger_spinner.value(),
+                                             self.post_trigger_spinner.value()):
+                return False
+        except ValueError as e:
+            print(f"Error: Invalid trigger: {e}")
+            return False
+        # Also called for --trigger on the command line; do not re-enter handle_trigger
+        self.trigger_button.blockSignals(True)
+        self.trigger_button.setChecked(True)
+        self.trigger_button.blockSignals(False)
+        self.trigger_button.setText("Disarm")
+        self.trigger_label.setText("armed")
+        return True
+
+    def update_trigger_status(self):
+        events = self.receiver.trigger_events()
+        if not events or not self.trigger_button.isChecked():
+            return
+        last = events[-1]
+        state = "capturing" if not last.frames else f"{last.frames} frames"
+        self.trigger_label.setText(f"{len(events)} capture(s), last: {last.condition} ({state})")
+
+    def handle_filter_from_selection(self):
+        rows = {self.table_proxy.mapToSource(index).row() for index in self.table.selectionModel().selectedIndexes()}
+        # Hardware filters are per ID; with several channels they are programmed on all of them
+        ids = sorted({parse_key_label(self.table_model.rows[row])[1] for row in rows})
+        self.hw_filter_input.setText(', '.join(f"{can_id:X}" for can_id in ids))
+
+    def handle_apply_hw_filter(self):
+        try:
+            ranges = parse_id_list(self.hw_filter_input.text())
+            config = self.receiver.set_acceptance_filter(ranges, self.hw_filter_extended.isChecked())
+        except ValueError as e:
+            print(f"Error: Invalid ID list: {e}")
+            return
+        if config is None:
+            print("Error: Could not program the acceptance filters.")
+            return
+
+        self.statusBar().showMessage(
+            f"Hardware filter: {config.requested} IDs requested, up to {config.accepted} accepted", 5000)
+
+    def handle_clear_hw_filter(self):
+        if self.receiver.clear_acceptance_filter():
+            self.statusBar().showMessage("Hardware filter cleared", 5000)
+
+    def add_send_frame_section(self, layout):
+        form_layout = QFormLayout()
+
+        self.id_input = QLineEdit()
+        self.len_input = QLineEdit()
+        self.data_input = QLineEdit()
+
+        form_layout.addRow("CAN ID (hex):", self.id_input)
+        form_layout.addRow("Length (1-8):", self.len_input)
+        form_layout.addRow("Data (comma-separated):", self.data_input)
+
+        if isinstance(self.receiver, MultiReceiver):
+            # Sent frames and the Transmit tab go out on the selected channel
+            self.channel_selector = QComboBox()
+            self.channel_selector.addItems([f"{channel_name(channel)} ({port})"
+                                            for channel, port in enumerate(self.receiver.ports)])
+            self.channel_selector.currentIndexChanged.connect(self.handle_channel_changed)
+            form_layout.addRow("Channel:", self.channel_selector)
+
+        send_button = QPushButton("Send Frame")
+        send_button.clicked.connect(self.handle_send_frame)
+        form_layout.addWidget(send_button)
+
+        layout.addLayout(form_layout)
+
+    def handle_channel_changed(self, channel):
+        self.receiver.tx_channel = channel
+
+    def handle_send_frame(self):
+        try:
+            can_id = int(self.id_input.text(), 16)
+            length = int(self.len_input.text())
+            data = [int(byte.strip(), 16) for byte in self.data_input.text().split(',')]
+
+            if len(data) != length:
+                print("Error: Length does not match number of data bytes.")
+                return
+
+            self.receiver.send_message(can_id, length, data)
+        except ValueError:
+            print("Error: Invalid input format. Check your ID, length, and data.")
+
+    def handle_load_dbc(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Load DBC", "", "DBC files (*.dbc);;All files (*)")
+        if not path:
+            return
+
+        try:
+            database = self.receiver.load_dbc(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "DBC Error", f"Could not load {path}: {e}")
+            return
+
+        self.statusBar().showMessage(f"Loaded {len(database.messages)} messages from {path}", 5000)
+
+    def handle_record(self, enabled):
+        if not enabled:
+            recorder, self.receiver.recorder = self.receiver.recorder, None
+            if recorder is not None:
+                recorder.stop()
+                self.statusBar().showMessage(
+                    f"Recorded {recorder.frames_written} frames to {len(recorder.files)} file(s)", 5000)
+            self.record_button.setText("Record...")
+            return
+
+        directory = QFileDialog.getExistingDirectory(self, "Capture Directory")
+        if not directory:
+            self.record_button.setChecked(False)
+            return
+
+        recorder = FrameRecorder(directory, text_export=self.candump_checkbox.isChecked())
+        recorder.start()
+        self.receiver.recorder = recorder
+        self.record_button.setText("Stop Recording")
+
+    def handle_open_log(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Open Capture", "", f"CAN logs (*{LOG_EXTENSION});;All files (*)")
+        if path:
+            self.open_log(path)
+
+    def open_log(self, path):
+        """Switch to offline mode and browse a memory-mapped capture."""
+        try:
+            log = OfflineLog(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Log Error", f"Could not open {path}: {e}")
+            return
+
+        if self.record_button.isChecked():
+            self.record_button.setChecked(False)
+        if self.transmit_tab.start_button.isChecked():
+            self.transmit_tab.start_button.setChecked(False)
+        if self.trigger_button.isChecked():
+            self.trigger_button.setChecked(False)
+        self.receiver.stop()
+        self.refresh_timer.stop()
+
+        self.offline_log = log
+        self.can_data.clear()
+        self.table_model.reset()
+        self.graph_tab.reset()
+        self.bit_activity_tab.reset()
+
+        multi_channel = log.channels != [0]
+        for key in log.ids:
+            key = int(key)
+            entry = log.summary(key)
+            entry['history'] = OfflineHistory(log, key)
+            channel, can_id = divmod(key, 1 << CHANNEL_SHIFT)
+            self.can_data[key_label(channel if multi_channel else None, can_id)] = entry
+
+        self.update_table(list(self.can_data))
+        self.graph_tab.update_can_ids(self.can_data)
+        self.graph_tab.set_time_bounds(log.start_time, log.end_time)
+        self.setWindowTitle(f"CAN Message Visualizer - {path}")
+        self.statusBar().showMessage(f"Opened {len(log)} frames, {len(log.ids)} IDs", 5000)
+
+    def set_refresh_rate(self, refresh_rate):
+        """Set how often (Hz) queued frames are pulled into the GUI."""
+        self.refresh_timer.start(int(1000 / max(1, refresh_rate)))
+        self.bit_activity_tab.set_refresh_rate(refresh_rate)
+
+    def drain_frames(self):
+        if isinstance(self.receiver, ProcessReceiver):
+            self.receiver.drain(self.update_can_records)
+            self.update_device_status()
+            return
+
+        frame_queue = self.receiver.frame_queue
+        if frame_queue is None:
+            return
+
+        batch = frame_queue.drain()
+        if batch:
+            self.receiver.latency.record_gui(batch, time.time())
+            self.update_can_batch(batch)
+        self.update_device_status()
+
+    def update_metrics(self):
+        if self.offline_log is None:
+            self.metrics_label.setText(format_metrics(self.receiver.metrics.snapshot()))
+            self.update_trigger_status()
+
+    def update_device_status(self):
+        """Show the sketch's cumulative loss counters; the label turns red once anything was lost."""
+        status = self.receiver.device_status
+        if status is self.shown_device_status or not status:
+            return
+        self.shown_device_status = status
+
+        lost = status.get('RxOverflow', 0) + status.get('Dropped', 0)
+        self.device_label.setText(
+            f"Device: overflow {status.get('RxOverflow', 0)}, dropped {status.get('Dropped', 0)}, "
+            f"errors {status.get('ErrorFrames', 0)}, TEC/REC {status.get('TEC', 0)}/{status.get('REC', 0)}")
+        self.device_label.setStyleSheet("color: red" if lost else "")
+
+    def update_can_batch(self, messages):
+        metrics = self.receiver.metrics
+        started = time.perf_counter()
+        touched_ids = set()
+        for message in messages:
+            touched_ids.add(self.store_message(message))
+        stored = time.perf_counter()
+        metrics.record_stage('store', stored - started)
+
+        self.update_table(touched_ids)
+        self.graph_tab.update_can_ids(self.can_data)
+        metrics.record_stage('table', time.perf_counter() - stored)
+
+    def update_can_records(self, records):
+        """Store a batch of shared-memory RING_DTYPE records from ProcessReceiver, one bulk append per ID."""
+        metrics = self.receiver.metrics
+        started = time.perf_counter()
+
+        ids = records['id']
+        order = np.argsort(ids, kind='stable')
+        unique_ids, starts = np.unique(ids[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+
+        touched_ids = set()
+        for raw_id, start, end in zip(unique_ids.tolist(), starts, ends):
+            rows = order[start:end]
+            last = records[rows[-1]]
+            length = int(last['dlc'])
+            can_id = f"0x{raw_id:X}"
+
+            entry = self.can_data.get(can_id)
+            if entry is None:
+                entry = self.can_data[can_id] = {'count': 0, 'history': self.frame_store.buffer(can_id)}
+            entry.update({
+                'last_data': last['data'][:length].tolist(),
+                'length': length,
+                'period': round(float(last['period']), 2),
+                'count': entry['count'] + len(rows),
+                # Timing and signals are published by the worker a few times per second
+                'timing': self.receiver.timing.get(raw_id)
+            })
+            signals = self.receiver.signals.get(raw_id)
+            if signals is not None:
+                entry['signals'] = signals
+
+            entry['history'].extend(records['data'][rows], records['dlc'][rows], records['timestamp'][rows])
+            touched_ids.add(can_id)
+        stored = time.perf_counter()
+        metrics.record_stage('store', stored - started)
+
+        self.update_table(touched_ids)
+        self.graph_tab.update_can_ids(self.can_data)
+        metrics.record_stage('table', time.perf_counter() - stored)
+
+    def store_message(self, message):
+        """Record one frame and return its CAN ID key."""
+        can_id = key_label(message.get('Channel'), message['ID'])
+
+        if can_id not in self.can_data:
+            self.can_data[can_id] = {
+                'last_data': message['Data'],
+                'length': message['Length'],
+                'period': message.get('Period', 0),
+                'count': 1,
+                'history': self.frame_store.buffer(can_id),
+                'timing': self.receiver.timing.get(frame_key(message))
+            }
+        else:
+            self.can_data[can_id].update({
+                'last_data': message['Data'],
+                'period': message.get('Period', 0),
+                'count': self.can_data[can_id]['count'] + 1
+            })
+
+        if 'Signals' in message:
+            self.can_data[can_id]['signals'] = message['Signals']
+
+        self.can_data[can_id]['history'].append(message['Data'], message['Length'],
+                                                message.get('Timestamp', time.time()))
+
+        return can_id
+
+    def update_table(self, touched_ids):
+        # Only resize when rows were added; steady-state refreshes just repaint touched rows
+        if self.table_model.refresh(touched_ids):
+            self.table.resizeColumnsToContents()
+
+    def closeEvent(self, event):
+        self.refresh_timer.stop()
+        self.tx_scheduler.stop()
+        self.receiver.stop()
+        event.accept()
@@ -0,0 +1,135 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+from channels import parse_key_label, key_value
+
+# Role returning raw (numeric) values so the proxy sorts IDs and periods numerically
+SORT_ROLE = Qt.UserRole + 1
+
+
+class CANMessageTableModel(QAbstractTableModel):
+    """
+    Trace view over the visualizer's ``can_data`` dict.
+    Rows are appended once per new CAN ID and located through ``row_index``;
+    refreshing only emits ``dataChanged`` for the rows touched since the
+    previous refresh, so nothing is rebuilt per frame.
+    """
+
+    COLUMNS = ['CAN ID', 'Last Data', 'Length', 'Period (ms)', 'Jitter (ms)', 'Min/Max (ms)', 'Rate (Hz)',
+               'Missed', 'Signals']
+
+    def __init__(self, can_data, parent=None):
+        super().__init__(parent)
+        self.can_data = can_data
+        self.rows = []
+        self.row_index = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, SORT_ROLE):
+            return None
+
+        can_id = self.rows[index.row()]
+        entry = self.can_data[can_id]
+        column = index.column()
+        timing = entry.get('timing')
+
+        if role == SORT_ROLE:
+            if column == 0:
+                return key_value(*parse_key_label(can_id))
+            if column == 1:
+                return ' '.join([f'{d:02X}' for d in entry['last_data']])
+            if column == 2:
+                return entry['length']
+            if column == 3:
+                return entry['period']
+            if column == 8:
+                return self.format_signals(entry)
+            if timing is None:
+                return 0
+            return (timing.jitter, timing.max_period, timing.frame_rate, timing.missed_cycles)[column - 4]
+
+        if column == 0:
+            return can_id
+        if column == 1:
+            return ' '.join([f'{d:02X}' for d in entry['last_data']])
+        if column == 2:
+            return str(entry['length'])
+        if column == 3:
+            return f"{entry['period']:.2f} ms"
+        if column == 8:
+            return self.format_signals(entry)
+        if timing is None or not timing.max_period:
+            return ''
+        if column == 4:
+            return f"{timing.jitter:.2f}"
+        if column == 5:
+            return f"{timing.min_period:.2f} / {timing.max_period:.2f}"
+        if column == 6:
+            return f"{timing.frame_rate:.1f}"
+        return str(timing.missed_cycles)
+
+    @staticmethod
+    def format_signals(entry):
+        signals = entry.get('signals')
+        if not signals:
+            return ''
+        return ', '.join(f"{name}={value:g}" for name, value in signals.items())
+
+    def reset(self):
+        """Drop all rows; used when the underlying can_data is replaced wholesale."""
+        self.beginResetModel()
+        self.rows = []
+        self.row_index = {}
+        self.endResetModel()
+
+    def refresh(self, touched_ids):
+        """
+        Publish changes for the given CAN IDs.
+        :param touched_ids: iterable of CAN ID keys updated since the last refresh
+        :return: bool - True if new rows were inserted
+        """
+        new_ids = [can_id for can_id in touched_ids if can_id not in self.row_index]
+        if new_ids:
+            first = len(self.rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_ids) - 1)
+            for can_id in new_ids:
+                self.row_index[can_id] = len(self.rows)
+                self.rows.append(can_id)
+            self.endInsertRows()
+
+        last_column = len(self.COLUMNS) - 1
+        for row in sorted(self.row_index[can_id] for can_id in touched_ids):
+            self.dataChanged.emit(self.index(row, 0), self.index(row, last_column), [Qt.DisplayRole])
+
+        return bool(new_ids)
+
+
+class CANMessageFilterModel(QSortFilterProxyModel):
+    """Sorts on SORT_ROLE and filters rows by a substring of the ID or data columns."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setSortRole(SORT_ROLE)
+        self.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.setDynamicSortFilter(True)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        pattern = self.filterRegExp().pattern()
+        if not pattern:
+            return True
+
+        model = self.sourceModel()
+        for column in (0, 1):
+            text = model.data(model.index(source_row, column, source_parent))
+            if pattern.lower() in text.lower():
+                return True
+        return False
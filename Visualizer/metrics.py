@@ -0,0 +1,123 @@
+"""
+Throughput and drop counters for the whole receive pipeline.
+
+The reader thread adds bytes, frames and parse errors; the GUI (or the
+headless loop) adds the time spent in each refresh stage. snapshot()
+turns the cumulative counters into rates over the interval since the
+previous snapshot and collects the queue and latency figures kept
+elsewhere, so one call shows which stage is falling behind.
+"""
+import threading
+import time
+from latency import LatencyTracker
+
+# Bits on the wire per frame by DLC, including worst-case bit stuffing, SOF..EOF and the 3-bit intermission
+STANDARD_FRAME_BITS = [47 + 8 * dlc + (34 + 8 * dlc - 1) // 4 for dlc in range(9)]
+EXTENDED_FRAME_BITS = [67 + 8 * dlc + (54 + 8 * dlc - 1) // 4 for dlc in range(9)]
+
+
+def frame_bits(length, extended=False):
+    table = EXTENDED_FRAME_BITS if extended else STANDARD_FRAME_BITS
+    return table[min(max(length, 0), 8)]
+
+
+class PipelineMetrics:
+    """
+    :param frame_queue: FrameQueue between the reader and the GUI, or None
+    :param latency: PipelineLatency providing the queue (host -> GUI) latency
+    :param can_bitrate: int - bus bitrate used for the bus load estimate
+    """
+
+    def __init__(self, frame_queue=None, latency=None, can_bitrate=250000):
+        self.frame_queue = frame_queue
+        self.latency = latency
+        self.can_bitrate = can_bitrate
+        self.lock = threading.Lock()
+
+        self.bytes_read = 0
+        self.frames = 0
+        self.bus_bits = 0
+        self.parse_errors = 0
+        # Frames lost before frame_queue, in the worker process's own FrameQueue (ProcessReceiver)
+        self.upstream_dropped = 0
+        self.stages = {}
+
+        self.last_snapshot = (time.perf_counter(), (0, 0, 0))
+
+    def record_read(self, byte_count):
+        self.bytes_read += byte_count
+
+    def record_frames(self, messages):
+        """Count a parsed batch and the bus time it occupied."""
+        bits = 0
+        for message in messages:
+            bits += frame_bits(message['Length'], message.get('Extended', False))
+        self.frames += len(messages)
+        self.bus_bits += bits
+
+    def record_stage(self, stage, seconds):
+        """Time spent in one refresh of a stage such as 'table' or 'plot'."""
+        with self.lock:
+            tracker = self.stages.get(stage)
+            if tracker is None:
+                tracker = self.stages[stage] = LatencyTracker(1000)
+            tracker.add(seconds)
+
+    def snapshot(self):
+        """
+        Rates since the previous call plus current queue, latency and stage timings.
+        Meant to be polled by a single consumer (status bar or headless stats).
+        :return: dict
+        """
+        now = time.perf_counter()
+        counters = (self.bytes_read, self.frames, self.bus_bits)
+        previous = self.last_snapshot
+        self.last_snapshot = (now, counters)
+
+        elapsed = max(now - previous[0], 1e-9)
+        rates = tuple((current - last) / elapsed for current, last in zip(counters, previous[1]))
+
+        result = {
+            'frames_per_second': rates[1],
+            'bytes_per_second': rates[0],
+            'bus_load': rates[2] / self.can_bitrate if self.can_bitrate else 0.0,
+            'frames': self.frames,
+            'bytes': self.bytes_read,
+            'parse_errors': self.parse_errors,
+        }
+
+        if self.frame_queue is not None:
+            result['queue_depth'] = self.frame_queue.depth
+            result['queue_max_depth'] = self.frame_queue.max_depth
+            result['queue_dropped'] = self.frame_queue.dropped + self.upstream_dropped
+            # Frames held back by the producer while the queue is full (SharedFrameRing only)
+            backlog = getattr(self.frame_queue, 'backlog', None)
+            if backlog is not None:
+                result['queue_backlog'] = backlog
+        if self.latency is not None:
+            result['queue_latency'] = self.latency.snapshot().get('host_to_gui', {})
+
+        with self.lock:
+            result['stages'] = {stage: tracker.percentiles() for stage, tracker in self.stages.items()}
+        return result
+
+
+def format_metrics(snapshot):
+    """One-line summary used by the status bar and the headless stats."""
+    parts = [f"{snapshot['frames_per_second']:.0f} fr/s",
+             f"{snapshot['bytes_per_second'] / 1000:.1f} kB/s",
+             f"bus {snapshot['bus_load'] * 100:.1f}%",
+             f"errors {snapshot['parse_errors']}"]
+    if 'queue_depth' in snapshot:
+        queue = (f"queue {snapshot['queue_depth']} (max {snapshot['queue_max_depth']}, "
+                 f"dropped {snapshot['queue_dropped']})")
+        if snapshot.get('queue_backlog'):
+            queue += f" backlog {snapshot['queue_backlog']}"
+        latency = snapshot.get('queue_latency')
+        if latency:
+            queue += f" p99 {latency[99]:.1f} ms"
+        parts.append(queue)
+    for stage, timing in sorted(snapshot['stages'].items()):
+        if timing:
+            parts.append(f"{stage} {timing[50]:.1f}/{timing['max']:.1f} ms")
+    return ' | '.join(parts)
@@ -0,0 +1,218 @@
+"""
+Capture from several CAN interfaces at once.
+
+Every interface gets its own CANMessageReceiver: its own port, reader
+thread, parser and frame queue, tagged with a channel index. The readers
+never wait on each other. A merge thread drains the per-channel queues
+every MERGE_INTERVAL. FrameMerger combines them into one stream ordered by
+timestamp, which is then delivered, recorded and counted like the frames of
+a single receiver.
+"""
+import bisect
+import heapq
+import sys
+import threading
+import time
+from operator import itemgetter
+from can_receiver import CANMessageReceiver
+from acceptance_filter import compute_filters
+from serial_protocol import format_filter_command, CMD_FILTER_OFF
+from channels import MAX_CHANNELS, channel_name
+
+MERGE_INTERVAL = 0.005
+# Longest a frame is held back waiting for older frames from a quiet channel
+MERGE_DELAY = 0.05
+
+frame_time = itemgetter('Timestamp')
+
+
+class FrameMerger:
+    """
+    K-way merge of per-channel batches into one stream ordered by 'Timestamp'.
+
+    Each channel delivers its frames (almost) in time order, but another
+    channel may still deliver older ones. Frames are held until no channel
+    can produce an earlier frame: every channel has delivered a newer one,
+    or ``delay`` seconds have passed. Frames that arrive after their slot
+    was emitted go out straight away and are counted in ``late``.
+    """
+
+    def __init__(self, channels, delay=MERGE_DELAY):
+        self.delay = delay
+        self.pending = [[] for _ in range(channels)]
+        self.latest = [float('-inf')] * channels
+        self.watermark = float('-inf')
+        self.late = 0
+
+    def push(self, channel, messages):
+        if not messages:
+            return
+        self.pending[channel].extend(messages)
+        newest = max(map(frame_time, messages))
+        if newest > self.latest[channel]:
+            self.latest[channel] = newest
+        self.late += sum(1 for message in messages if message['Timestamp'] < self.watermark)
+
+    def pop(self, now):
+        """
+        :param now: float - current host time
+        :return: list of the frames that can no longer be preceded, oldest first
+        """
+        self.watermark = max(self.watermark, min(self.latest), now - self.delay)
+
+        ready = []
+        for channel, pending in enumerate(self.pending):
+            if not pending:
+                continue
+            pending.sort(key=frame_time)
+            split = bisect.bisect_right([message['Timestamp'] for message in pending], self.watermark)
+            if split:
+                ready.append(pending[:split])
+                self.pending[channel] = pending[split:]
+
+        if len(ready) == 1:
+            return ready[0]
+        return list(heapq.merge(*ready, key=frame_time))
+
+
+def combine_status(statuses):
+    """Loss counters summed over all channels, error counters as the worst channel."""
+    combined = {'RxOverflow': 0, 'ErrorFrames': 0, 'Dropped': 0, 'TEC': 0, 'REC': 0, 'EFLG': 0, 'Channels': {}}
+    for channel, status in enumerate(statuses):
+        if not status:
+            continue
+        for field in ('RxOverflow', 'ErrorFrames', 'Dropped'):
+            combined[field] += status.get(field, 0)
+        for field in ('TEC', 'REC'):
+            combined[field] = max(combined[field], status.get(field, 0))
+        combined['EFLG'] |= status.get('EFLG', 0)
+        combined['Channels'][channel_name(channel)] = status
+    return combined
+
+
+class MultiReceiver(CANMessageReceiver):
+    """
+    Receiver for several interfaces with the CANMessageReceiver interface.
+    Frames carry a 'Channel' index (position in ``ports``). Commands go to
+    ``tx_channel``, except acceptance filters and DBC files, which apply to
+    every channel.
+    :param ports: list of ports, one per channel
+    :param batched: bool - deliver the merged stream to frame_queue (False: message_received and subscribers only)
+    """
+
+    def __init__(self, ports, baudrate=250000, binary=True, negotiate_timeout=3.0, can_bitrate=250000, batched=True):
+        if len(ports) > MAX_CHANNELS:
+            raise ValueError(f"At most {MAX_CHANNELS} interfaces can be captured at once")
+        super().__init__(None, baudrate, binary, negotiate_timeout, batched=batched, can_bitrate=can_bitrate)
+        self.ports = list(ports)
+        self.channels = []
+        for channel, port in enumerate(self.ports):
+            receiver = CANMessageReceiver(port, baudrate, binary, negotiate_timeout, batched=True,
+                                          can_bitrate=can_bitrate, channel=channel)
+            # One timing table (keyed by channel and ID) and one latency tracker for all channels
+            receiver.timing = self.timing
+            receiver.latency = self.latency
+            receiver.metrics.latency = self.latency
+            self.channels.append(receiver)
+        # The combined bus load is the mean over all buses
+        self.metrics.can_bitrate = can_bitrate * len(self.channels)
+        self.merger = FrameMerger(len(self.channels))
+        self.tx_channel = 0
+        self._statuses = [None] * len(self.channels)
+
+    def connect(self):
+        # Negotiation can take seconds per board; open all channels side by side
+        results = [False] * len(self.channels)
+
+        def connect_channel(channel):
+            results[channel] = self.channels[channel].connect()
+
+        threads = [threading.Thread(target=connect_channel, args=(channel,)) for channel in range(len(self.channels))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if not all(results):
+            self.stop()
+            return False
+
+        self.binary_mode = all(receiver.binary_mode for receiver in self.channels)
+        self.running = True
+        threading.Thread(target=self.merge_messages, daemon=True).start()
+        return True
+
+    def merge_messages(self):
+        while self.running:
+            time.sleep(MERGE_INTERVAL)
+            for receiver in self.channels:
+                self.merger.push(receiver.channel, receiver.frame_queue.drain())
+            now = time.time()
+            messages = self.merger.pop(now)
+            self.update_counters()
+            # Read once: the GUI thread may disarm the trigger at any time
+            trigger = self.trigger
+
+            if messages:
+                recorder = self.recorder
+                if recorder is not None:
+                    recorder.submit(messages)
+                if trigger is not None:
+                    trigger.process(messages, now)
+                self.deliver(messages)
+                continue
+
+            if trigger is not None:
+                trigger.tick(now)
+            if self.running and not any(receiver.running for receiver in self.channels):
+                print("Error receiving message: all channels stopped", file=sys.stderr)
+                self.running = False
+
+    def update_counters(self):
+        """Sum the per-channel pipeline counters and combine their device status."""
+        metrics = self.metrics
+        channel_metrics = [receiver.metrics for receiver in self.channels]
+        metrics.bytes_read = sum(channel.bytes_read for channel in channel_metrics)
+        metrics.frames = sum(channel.frames for channel in channel_metrics)
+        metrics.bus_bits = sum(channel.bus_bits for channel in channel_metrics)
+        metrics.parse_errors = sum(channel.parse_errors for channel in channel_metrics)
+
+        statuses = [receiver.device_status for receiver in self.channels]
+        if any(status is not shown for status, shown in zip(statuses, self._statuses)):
+            self._statuses = statuses
+            if any(statuses):
+                self.device_status = combine_status(statuses)
+
+    def load_dbc(self, path):
+        database = super().load_dbc(path)
+        for receiver in self.channels:
+            receiver.dbc = database
+            receiver.decoders = database.messages
+        return database
+
+    def write_raw(self, payload):
+        if not self.running:
+            return False
+        return self.channels[self.tx_channel].write_raw(payload)
+
+    def set_acceptance_filter(self, ranges, extended=False):
+        """Program the same acceptance filters on every channel."""
+        config = compute_filters(ranges, extended)
+        command = format_filter_command(config)
+        if not all([receiver.write_raw(command) for receiver in self.channels]):
+            return None
+        self.acceptance_filter = config
+        return config
+
+    def clear_acceptance_filter(self):
+        if all([receiver.write_raw(CMD_FILTER_OFF) for receiver in self.channels]):
+            self.acceptance_filter = None
+            return True
+        return False
+
+    def stop(self):
+        self.running = False
+        if self.recorder is not None:
+            self.recorder.stop()
+        self.clear_trigger()
+        for receiver in self.channels:
+            receiver.stop()
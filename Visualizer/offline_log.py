@@ -0,0 +1,183 @@
+"""
+Memory-mapped access to ``.canlog`` captures written by FrameRecorder.
+
+The log is mapped as a LOG_DTYPE structured array, so nothing is read until
+it is sliced. On first open a sidecar index (``<log>.idx.npz``) is built:
+
+* ``order``  - frame numbers grouped by CAN ID (each group in time order)
+* ``ids``, ``starts``, ``counts`` - where each ID's group lives in ``order``
+* ``bucket_times`` - timestamp of every BUCKET_SIZE-th frame
+
+In multi-channel captures an "ID" here is channels.key_value(channel, ID),
+so the same ID on two buses forms two groups; for channel 0 it is the ID.
+
+Selecting an ID is then a slice of ``order``; a time range is resolved to a
+frame range with a binary search over ``bucket_times`` refined inside one
+bucket, followed by a binary search in the ID's (sorted) frame numbers.
+The index is reused as long as the log's size and mtime are unchanged.
+"""
+import os
+import numpy as np
+from frame_store import FrameWindow
+from recorder import LOG_DTYPE, HEADER_SIZE, FLAG_CHANNEL_SHIFT, check_header
+from channels import CHANNEL_SHIFT
+
+BUCKET_SIZE = 65536
+INDEX_SUFFIX = '.idx.npz'
+
+
+class OfflineLog:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as log_file:
+            check_header(log_file.read(HEADER_SIZE))
+
+        size = os.path.getsize(path)
+        # A capture still being written may end in a partial record
+        count = max(0, (size - HEADER_SIZE) // LOG_DTYPE.itemsize)
+        if count:
+            self.records = np.memmap(path, dtype=LOG_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=LOG_DTYPE)
+
+        self.index_path = path + INDEX_SUFFIX
+        self._load_or_build_index()
+        self.id_slots = {int(can_id): slot for slot, can_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.records)
+
+    def _source_signature(self):
+        stat = os.stat(self.path)
+        return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    def _load_or_build_index(self):
+        signature = self._source_signature()
+        if os.path.exists(self.index_path):
+            try:
+                with np.load(self.index_path) as index:
+                    if np.array_equal(index['signature'], signature):
+                        self._set_index(index['ids'], index['starts'], index['counts'],
+                                        index['order'], index['bucket_times'])
+                        return
+            except (OSError, KeyError, ValueError):
+                pass
+
+        self._build_index()
+        try:
+            with open(self.index_path, 'wb') as index_file:
+                np.savez(index_file, signature=signature, ids=self.ids, starts=self.starts,
+                         counts=self.counts, order=self.order, bucket_times=self.bucket_times)
+        except OSError as e:
+            print(f"Could not write log index: {e}")
+
+    def _build_index(self):
+        channels = (self.records['flags'] >> FLAG_CHANNEL_SHIFT).astype(np.uint64)
+        ids = self.records['id'].astype(np.uint64) | (channels << np.uint64(CHANNEL_SHIFT))
+        order = np.argsort(ids, kind='stable')
+        order = order.astype(np.uint32 if len(ids) < 2 ** 32 else np.uint64)
+        unique_ids, starts, counts = np.unique(ids[order], return_index=True, return_counts=True)
+        bucket_times = np.array(self.records['timestamp'][::BUCKET_SIZE])
+        self._set_index(unique_ids, starts, counts, order, bucket_times)
+
+    def _set_index(self, ids, starts, counts, order, bucket_times):
+        self.ids = ids
+        self.starts = starts
+        self.counts = counts
+        self.order = order
+        self.bucket_times = bucket_times
+
+    @property
+    def channels(self):
+        """Channel indexes present in the log."""
+        return sorted({int(key) >> CHANNEL_SHIFT for key in self.ids})
+
+    @property
+    def start_time(self):
+        return float(self.records['timestamp'][0]) if len(self.records) else 0.0
+
+    @property
+    def end_time(self):
+        return float(self.records['timestamp'][-1]) if len(self.records) else 0.0
+
+    def frame_numbers(self, can_id):
+        """Frame numbers of one ID, in time order (a view into the index)."""
+        slot = self.id_slots.get(can_id)
+        if slot is None:
+            return self.order[:0]
+        start = self.starts[slot]
+        return self.order[start:start + self.counts[slot]]
+
+    def frame_at_time(self, timestamp):
+        """First frame number with a timestamp >= ``timestamp``."""
+        bucket = max(0, int(np.searchsorted(self.bucket_times, timestamp, side='left')) - 1)
+        first = bucket * BUCKET_SIZE
+        last = min(first + 2 * BUCKET_SIZE, len(self.records))
+        return first + int(np.searchsorted(self.records['timestamp'][first:last], timestamp, side='left'))
+
+    def select(self, can_id, start_time=None, end_time=None):
+        """
+        Records of one ID inside a time range.
+        :return: LOG_DTYPE array (copied from the mapping, only the selected frames)
+        """
+        frames = self.frame_numbers(can_id)
+        low = 0 if start_time is None else np.searchsorted(frames, self.frame_at_time(start_time), side='left')
+        high = len(frames) if end_time is None else np.searchsorted(frames, self.frame_at_time(end_time), side='left')
+        return self.records[frames[low:high]]
+
+    def summary(self, can_id):
+        """Per-ID values for the message table, computed from the first/last frames only."""
+        frames = self.frame_numbers(can_id)
+        first = self.records[frames[0]]
+        last = self.records[frames[-1]]
+        count = len(frames)
+        period = (last['timestamp'] - first['timestamp']) / (count - 1) * 1000 if count > 1 else 0.0
+        dlc = int(last['dlc'])
+        return {
+            'last_data': last['data'][:dlc].tolist(),
+            'length': dlc,
+            'period': float(period),
+            'count': count,
+        }
+
+
+class OfflineHistory:
+    """FrameRingBuffer-compatible view of one ID in an OfflineLog, limited to the log's selected time range."""
+
+    def __init__(self, log, can_id):
+        self.log = log
+        self.can_id = can_id
+        self.start_time = None
+        self.end_time = None
+
+    def set_time_range(self, start_time, end_time):
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def last(self, k=None):
+        frames = self.log.frame_numbers(self.can_id)
+        low = 0
+        high = len(frames)
+        if self.start_time is not None:
+            low = np.searchsorted(frames, self.log.frame_at_time(self.start_time), side='left')
+        if self.end_time is not None:
+            high = np.searchsorted(frames, self.log.frame_at_time(self.end_time), side='left')
+        if k is not None:
+            low = max(low, high - int(k))
+
+        records = self.log.records[frames[low:high]]
+        return FrameWindow(records['timestamp'], records['dlc'], records['data'])
+
+    def since(self, total, limit=None):
+        """Like FrameRingBuffer.since(), over the whole log regardless of the time range."""
+        frames = self.log.frame_numbers(self.can_id)
+        frames = frames[total:] if limit is None else frames[total:total + limit]
+        records = self.log.records[frames]
+        return FrameWindow(records['timestamp'], records['dlc'], records['data'])
+
+    @property
+    def total(self):
+        return len(self)
+
+    def __len__(self):
+        return len(self.log.frame_numbers(self.can_id))
@@ -0,0 +1,310 @@
+"""
+Receiver that reads, parses and decodes in a separate worker process.
+
+In the default mode the reader thread shares the GIL with the Qt event loop,
+so heavy parsing slows down rendering and vice versa. ProcessReceiver runs a
+regular CANMessageReceiver in a child process instead. Parsed frames come
+back through a SharedFrameRing (shared_ring.py) as fixed-size records the
+GUI reads in place; everything else travels over two multiprocessing queues:
+
+    commands  GUI -> worker   ('write', bytes), ('dbc', path),
+                              ('trigger', set_trigger() arguments or None)
+    updates   worker -> GUI   ('connected', (True, binary_mode)) or ('connected', (False, None)),
+                              ('update', dict), ('stopped', None)
+
+Updates are published every UPDATE_INTERVAL and carry the cumulative
+pipeline counters, the device status, the timing statistics of IDs that
+received frames, the latest decoded signals per ID and the trigger captures.
+
+ProcessReceiver keeps the CANMessageReceiver interface for sending, the
+cyclic table and the acceptance filters; frames are consumed with drain()
+instead of frame_queue.
+"""
+import multiprocessing
+import queue
+import time
+import numpy as np
+from can_receiver import CANMessageReceiver
+from recorder import LOG_DTYPE
+from serial_protocol import FLAG_EXTENDED, FLAG_RTR
+from shared_ring import SharedFrameRing, RING_DTYPE, DEFAULT_CAPACITY
+
+UPDATE_INTERVAL = 0.2
+POLL_INTERVAL = 0.002
+# Extra time allowed for the worker to start (a fresh interpreter importing NumPy) on top of negotiation
+STARTUP_TIMEOUT = 10.0
+
+
+def messages_to_ring_records(messages):
+    """Pack receiver message dicts into a RING_DTYPE array, column by column."""
+    records = np.zeros(len(messages), dtype=RING_DTYPE)
+    records['timestamp'] = [message['Timestamp'] for message in messages]
+    records['host_time'] = [message['HostTime'] for message in messages]
+    records['device_time'] = [message.get('DeviceTime', np.nan) for message in messages]
+    records['period'] = [message.get('Period', 0.0) for message in messages]
+    records['id'] = [message['ID'] for message in messages]
+    records['flags'] = [(FLAG_EXTENDED if message.get('Extended') else 0) | (FLAG_RTR if message.get('RTR') else 0)
+                        for message in messages]
+    records['dlc'] = [message['Length'] for message in messages]
+    payload = b''.join(bytes(message['Data']).ljust(8, b'\x00') for message in messages)
+    records['data'] = np.frombuffer(payload, dtype=np.uint8).reshape(-1, 8)
+    return records
+
+
+def ring_to_log_records(records):
+    """Copy RING_DTYPE records into the recorder's LOG_DTYPE layout."""
+    log_records = np.empty(len(records), dtype=LOG_DTYPE)
+    for name in ('timestamp', 'id', 'flags', 'dlc', 'data'):
+        log_records[name] = records[name]
+    return log_records
+
+
+def run_commands(receiver, commands):
+    while True:
+        try:
+            command, argument = commands.get_nowait()
+        except queue.Empty:
+            return
+        if command == 'write':
+            receiver.write_raw(argument)
+        elif command == 'dbc':
+            try:
+                receiver.load_dbc(argument)
+            except (OSError, ValueError) as e:
+                print(f"Error loading DBC in receiver process: {e}")
+        elif command == 'trigger':
+            if argument is None:
+                receiver.clear_trigger()
+            else:
+                receiver.set_trigger(*argument)
+
+
+def collect_update(receiver, reported_counts, signals):
+    """Counters and the timing of every ID whose frame count changed since the last update."""
+    timing = {}
+    for can_id, stats in list(receiver.timing.stats.items()):
+        if reported_counts.get(can_id) != stats.count:
+            reported_counts[can_id] = stats.count
+            timing[can_id] = stats
+
+    metrics = receiver.metrics
+    return {
+        'bytes_read': metrics.bytes_read,
+        'frames': metrics.frames,
+        'bus_bits': metrics.bus_bits,
+        'parse_errors': metrics.parse_errors,
+        'queue_dropped': receiver.frame_queue.dropped,
+        'device_status': receiver.device_status,
+        'timing': timing,
+        'signals': signals,
+        'trigger_events': receiver.trigger_events(),
+    }
+
+
+def run_worker(port, baudrate, binary, negotiate_timeout, can_bitrate, ring_name, capacity, commands, updates,
+               stop_event):
+    """Entry point of the receiver process."""
+    ring = SharedFrameRing(capacity, name=ring_name)
+    receiver = CANMessageReceiver(port, baudrate, binary=binary, negotiate_timeout=negotiate_timeout, batched=True,
+                                  can_bitrate=can_bitrate)
+    if not receiver.connect():
+        updates.put(('connected', (False, None)))
+        ring.close()
+        return
+    updates.put(('connected', (True, receiver.binary_mode)))
+
+    # Frames that did not fit into the ring yet; bounded by the ring capacity
+    backlog = np.empty(0, dtype=RING_DTYPE)
+    reported_counts = {}
+    signals = {}
+    next_update = 0.0
+    try:
+        while receiver.running and not stop_event.is_set():
+            run_commands(receiver, commands)
+
+            messages = receiver.frame_queue.drain()
+            if messages:
+                for message in messages:
+                    if 'Signals' in message:
+                        signals[message['ID']] = message['Signals']
+                batch = messages_to_ring_records(messages)
+                backlog = np.concatenate((backlog, batch)) if len(backlog) else batch
+
+            if len(backlog):
+                backlog = backlog[ring.write(backlog):]
+                overflow = len(backlog) - capacity
+                if overflow > 0:
+                    # The GUI has fallen a full ring behind; give up on the oldest waiting frames
+                    ring.add_overruns(overflow)
+                    backlog = backlog[overflow:]
+                ring.set_backlog(len(backlog))
+
+            now = time.perf_counter()
+            if now >= next_update:
+                updates.put(('update', collect_update(receiver, reported_counts, signals)))
+                signals = {}
+                next_update = now + UPDATE_INTERVAL
+
+            if not messages:
+                time.sleep(POLL_INTERVAL)
+    finally:
+        receiver.stop()
+        ring.close()
+        updates.put(('stopped', None))
+
+
+class ProcessReceiver(CANMessageReceiver):
+    """
+    :param capacity: int - frame slots in the shared ring
+    Other parameters as for CANMessageReceiver.
+    """
+
+    def __init__(self, port, baudrate=250000, binary=True, negotiate_timeout=3.0, can_bitrate=250000,
+                 capacity=DEFAULT_CAPACITY):
+        super().__init__(port, baudrate, binary, negotiate_timeout, batched=False, can_bitrate=can_bitrate)
+        self.capacity = capacity
+        # Spawned rather than forked: forking a process that runs Qt threads is unsafe
+        self.context = multiprocessing.get_context('spawn')
+        self.process = None
+        self.frame_ring = None
+        self.commands = None
+        self.updates = None
+        self.stop_event = None
+        # CAN ID -> latest decoded signals, updated from the worker
+        self.signals = {}
+        # Trigger captures of the worker, as published with the last update
+        self.worker_trigger_events = []
+
+    def connect(self):
+        self.frame_ring = SharedFrameRing(self.capacity)
+        self.commands = self.context.Queue()
+        self.updates = self.context.Queue()
+        self.stop_event = self.context.Event()
+        self.process = self.context.Process(
+            target=run_worker, name='can-receiver', daemon=True,
+            args=(self.port, self.baudrate, self.binary, self.negotiate_timeout, self.metrics.can_bitrate,
+                  self.frame_ring.name, self.capacity, self.commands, self.updates, self.stop_event))
+        self.process.start()
+
+        try:
+            kind, (connected, binary_mode) = self.updates.get(timeout=self.negotiate_timeout + STARTUP_TIMEOUT)
+        except queue.Empty:
+            print("Error connecting to serial port: receiver process did not start")
+            connected = False
+        if not connected:
+            self.stop()
+            return False
+
+        self.binary_mode = binary_mode
+        self.metrics.frame_queue = self.frame_ring
+        self.running = True
+        return True
+
+    def load_dbc(self, path):
+        # Parsed here as well so errors reach the caller and the GUI can list the messages
+        database = super().load_dbc(path)
+        if self.commands is not None:
+            self.commands.put(('dbc', path))
+        return database
+
+    def write_raw(self, payload):
+        if not self.running:
+            return False
+        self.commands.put(('write', payload))
+        return True
+
+    def set_trigger(self, conditions, directory, pre_seconds=5.0, post_seconds=5.0):
+        """
+        Arm trigger capture in the worker process, where the receive path runs.
+        :return: bool - False if there is no worker to arm
+        """
+        # Parsed here too so malformed conditions raise in the caller
+        from trigger import parse_trigger
+        for condition in conditions:
+            parse_trigger(condition)
+        if self.commands is None:
+            print("Error: Receiver process is not running.")
+            return False
+        self.commands.put(('trigger', (list(conditions), directory, pre_seconds, post_seconds)))
+        self.worker_trigger_events = []
+        return True
+
+    def clear_trigger(self):
+        if self.commands is not None:
+            self.commands.put(('trigger', None))
+
+    def trigger_events(self):
+        return list(self.worker_trigger_events)
+
+    def poll(self):
+        """Apply the updates the worker has published since the last call."""
+        if self.updates is None:
+            return
+        while True:
+            try:
+                kind, update = self.updates.get_nowait()
+            except queue.Empty:
+                return
+            if kind == 'stopped':
+                self.running = False
+            elif kind == 'update':
+                self.apply_update(update)
+
+    def apply_update(self, update):
+        metrics = self.metrics
+        metrics.bytes_read = update['bytes_read']
+        metrics.frames = update['frames']
+        metrics.bus_bits = update['bus_bits']
+        metrics.parse_errors = update['parse_errors']
+        metrics.upstream_dropped = update['queue_dropped']
+        if update['device_status'] != self.device_status:
+            self.device_status = update['device_status']
+        self.timing.stats.update(update['timing'])
+        self.signals.update(update['signals'])
+        self.worker_trigger_events = update['trigger_events']
+
+    def drain(self, handler):
+        """
+        Pass every frame published since the last call to handler as RING_DTYPE
+        views into shared memory (at most two calls when the ring has wrapped).
+        The views are only valid during the call.
+        :return: int - number of frames handled
+        """
+        self.poll()
+        ring = self.frame_ring
+        if ring is None:
+            return 0
+
+        handled = 0
+        for _ in range(2):
+            records = ring.read()
+            if not len(records):
+                break
+            gui_time = time.time()
+            host_time = records['host_time']
+            timestamp = records['timestamp']
+            device = ~np.isnan(records['device_time'])
+            self.latency.record_stages((host_time[device] - timestamp[device]).tolist(),
+                                       (gui_time - host_time).tolist(),
+                                       (gui_time - timestamp[device]).tolist())
+            if self.recorder is not None:
+                self.recorder.submit(ring_to_log_records(records))
+            handler(records)
+            ring.release(len(records))
+            handled += len(records)
+        return handled
+
+    def stop(self):
+        self.running = False
+        if self.recorder is not None:
+            self.recorder.stop()
+        if self.process is not None:
+            self.stop_event.set()
+            self.process.join(timeout=2)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+        if self.frame_ring is not None:
+            self.metrics.frame_queue = None
+            self.frame_ring.close()
+            self.frame_ring = None
@@ -0,0 +1,235 @@
+"""
+Background capture to disk.
+
+Log files (``*.canlog``) are a 16-byte header followed by fixed 22-byte
+records, so they can be read back (or memory-mapped) as a NumPy structured
+array with LOG_DTYPE:
+
+    header  8s magic, uint16 version, uint16 record size, 4 reserved bytes
+    record  float64 timestamp, uint32 ID, uint8 flags, uint8 DLC, 8 data bytes
+
+The low flag bits are FLAG_EXTENDED and FLAG_RTR; the upper four hold the
+channel index of multi-interface captures (0 for single-interface ones).
+"""
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import numpy as np
+from serial_protocol import FLAG_EXTENDED, FLAG_RTR
+from channels import channel_name
+
+LOG_MAGIC = b'CANLOG\x00\x01'
+LOG_VERSION = 1
+LOG_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('id', '<u4'),
+    ('flags', 'u1'),
+    ('dlc', 'u1'),
+    ('data', 'u1', (8,)),
+])
+HEADER_STRUCT = struct.Struct('<8sHH4x')
+HEADER_SIZE = HEADER_STRUCT.size
+LOG_EXTENSION = '.canlog'
+FLAG_CHANNEL_SHIFT = 4
+
+
+def log_header():
+    return HEADER_STRUCT.pack(LOG_MAGIC, LOG_VERSION, LOG_DTYPE.itemsize)
+
+
+def check_header(header):
+    magic, version, record_size = HEADER_STRUCT.unpack(header[:HEADER_SIZE])
+    if magic != LOG_MAGIC or record_size != LOG_DTYPE.itemsize:
+        raise ValueError("Not a CAN log file or unsupported record layout")
+    return version
+
+
+def messages_to_records(messages):
+    """Pack receiver message dicts into a LOG_DTYPE array."""
+    records = np.zeros(len(messages), dtype=LOG_DTYPE)
+    timestamps = records['timestamp']
+    ids = records['id']
+    flags = records['flags']
+    dlcs = records['dlc']
+    data = records['data']
+    for i, message in enumerate(messages):
+        payload = message['Data']
+        timestamps[i] = message.get('Timestamp', 0.0)
+        ids[i] = message['ID']
+        flags[i] = ((FLAG_EXTENDED if message.get('Extended') else 0) | (FLAG_RTR if message.get('RTR') else 0)
+                    | message.get('Channel', 0) << FLAG_CHANNEL_SHIFT)
+        dlcs[i] = message['Length']
+        data[i, :len(payload)] = payload
+    return records
+
+
+def records_to_candump(records, channel='can0'):
+    """
+    Format records as candump -L lines: ``(timestamp) can0 123#DEADBEEF``.
+    :param channel: str - interface name of channel 0; other channels are named can1, can2, ...
+    """
+    lines = []
+    for record in records:
+        flags = int(record['flags'])
+        index = flags >> FLAG_CHANNEL_SHIFT
+        interface = channel_name(index) if index else channel
+        dlc = int(record['dlc'])
+        can_id = f"{int(record['id']):08X}" if flags & FLAG_EXTENDED else f"{int(record['id']):03X}"
+        payload = 'R' if flags & FLAG_RTR else record['data'][:dlc].tobytes().hex().upper()
+        lines.append(f"({record['timestamp']:.6f}) {interface} {can_id}#{payload}\n")
+    return ''.join(lines)
+
+
+def read_log(path):
+    """Read a whole log file into memory as a LOG_DTYPE array."""
+    with open(path, 'rb') as log_file:
+        check_header(log_file.read(HEADER_SIZE))
+        return np.fromfile(log_file, dtype=LOG_DTYPE)
+
+
+class FrameRecorder:
+    """
+    Writes batches of received frames on a dedicated thread.
+
+    ``submit()`` only appends the batch to a queue, so the reader thread never
+    waits on the disk. If the writer falls more than ``max_pending`` frames
+    behind, new batches are dropped and counted instead of growing memory;
+    the default of 200000 frames covers a few seconds at full bus load in
+    about 100 MB of message dicts. Batches that cannot be converted are
+    counted in ``dropped`` as well, and the writer carries on.
+    Files rotate when they exceed ``max_bytes`` or ``max_seconds``.
+    """
+
+    def __init__(self, directory, prefix='capture', max_bytes=256 * 1024 * 1024, max_seconds=None,
+                 text_export=False, channel='can0', max_pending=200000, buffer_size=1024 * 1024):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.text_export = text_export
+        self.channel = channel
+        self.max_pending = max_pending
+        self.buffer_size = buffer_size
+
+        self._queue = queue.SimpleQueue()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._thread = None
+        self.running = False
+
+        self.files = []
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.dropped = 0
+
+        self._log_file = None
+        self._text_file = None
+        self._file_bytes = 0
+        self._file_started = 0
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.running = True
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Flush everything already submitted, then close the current files."""
+        if not self.running:
+            return
+        self.running = False
+        self._queue.put(None)
+        self._thread.join()
+
+    def submit(self, messages):
+        if not self.running or not len(messages):
+            return
+        with self._pending_lock:
+            if self._pending + len(messages) > self.max_pending:
+                self.dropped += len(messages)
+                return
+            self._pending += len(messages)
+        self._queue.put(messages)
+
+    def _write_loop(self):
+        try:
+            while True:
+                batch = self._queue.get()
+                if batch is None:
+                    break
+
+                # Merge whatever else is already waiting into one bulk write
+                batches = [batch]
+                stop = False
+                while True:
+                    try:
+                        more = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if more is None:
+                        stop = True
+                        break
+                    batches.append(more)
+
+                with self._pending_lock:
+                    self._pending -= sum(len(batch) for batch in batches)
+                # Batches are message dicts from the reader thread or LOG_DTYPE arrays (ProcessReceiver)
+                converted = []
+                for batch in batches:
+                    try:
+                        converted.append(batch if isinstance(batch, np.ndarray) else messages_to_records(batch))
+                    except (KeyError, TypeError, ValueError, OverflowError) as e:
+                        print(f"Error converting {len(batch)} frames for capture: {e}", file=sys.stderr)
+                        self.dropped += len(batch)
+                if converted:
+                    self._write(np.concatenate(converted))
+                if stop:
+                    break
+        except Exception as e:
+            print(f"Error writing capture: {e}", file=sys.stderr)
+            # submit() stops queuing once the writer is gone
+            self.running = False
+        finally:
+            self._close_files()
+
+    def _write(self, records):
+        if self._log_file is None or self._should_rotate():
+            self._rotate()
+
+        data = records.tobytes()
+        self._log_file.write(data)
+        if self._text_file is not None:
+            self._text_file.write(records_to_candump(records, self.channel))
+
+        self._file_bytes += len(data)
+        self.bytes_written += len(data)
+        self.frames_written += len(records)
+
+    def _should_rotate(self):
+        if self.max_bytes and self._file_bytes >= self.max_bytes:
+            return True
+        return bool(self.max_seconds) and time.time() - self._file_started >= self.max_seconds
+
+    def _rotate(self):
+        self._close_files()
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        base = os.path.join(self.directory, f"{self.prefix}-{stamp}-{len(self.files):04d}")
+
+        self._log_file = open(base + LOG_EXTENSION, 'wb', buffering=self.buffer_size)
+        self._log_file.write(log_header())
+        if self.text_export:
+            self._text_file = open(base + '.log', 'w', buffering=self.buffer_size)
+
+        self.files.append(base + LOG_EXTENSION)
+        self._file_bytes = HEADER_SIZE
+        self._file_started = time.time()
+
+    def _close_files(self):
+        for handle in (self._log_file, self._text_file):
+            if handle is not None:
+                handle.close()
+        self._log_file = None
+        self._text_file = None
@@ -0,0 +1,304 @@
+"""
+Wire protocol shared with Arduino-CAN-Console.ino.
+
+The sketch starts in JSON mode (one ``{"ID":..,"Length":..,"Data":[..],"T":..}``
+object per line, ``T`` being the device's ``micros()`` at reception). The
+host can switch it to binary mode with the ``!BIN`` command; the sketch
+answers ``OK BIN`` and from then on every frame is a fixed-size record,
+COBS-encoded and terminated by a 0x00 byte:
+
+    offset  size  field
+    0       1     record type (RECORD_FRAME_TS)
+    1       4     CAN ID, little endian
+    5       1     flags (FLAG_EXTENDED | FLAG_RTR)
+    6       1     DLC
+    7       8     data bytes, zero padded
+    15      4     device micros() at reception, little endian
+    19      1     checksum (sum of all previous bytes, mod 256)
+
+Firmware predating device timestamps sends RECORD_FRAME records, which are
+the same without the micros field; both are accepted. Decoded messages carry
+the raw 32-bit counter as ``Micros``.
+
+Once a second the sketch also reports its loss counters, cumulative since
+boot: a RECORD_STATUS record (type, RX overflows, error frames, dropped
+frames as little-endian uint32, then TEC, REC, EFLG and the checksum) or,
+in JSON mode, a ``{"Status":{...}}`` line with the same fields.
+
+A ``!BIN`` sent while the sketch is already in binary mode (the host
+reconnected without resetting the board) is acknowledged with a RECORD_ACK
+record (type and checksum only) instead of the ``OK BIN`` line.
+"""
+import json
+import struct
+
+CMD_BINARY = b"!BIN\n"
+CMD_TEXT = b"!TXT\n"
+ACK_BINARY = "OK BIN"
+
+# On-device cyclic transmit table, see format_cyclic_set()
+CMD_CYCLIC_START = b"!CYCSTART\n"
+CMD_CYCLIC_STOP = b"!CYCSTOP\n"
+CMD_CYCLIC_CLEAR = b"!CYCCLR\n"
+MAX_CYCLIC_SLOTS = 16
+
+# MCP2515 acceptance filters, see format_filter_command()
+CMD_FILTER_OFF = b"!FILTER OFF\n"
+
+RECORD_FRAME = 0x01
+RECORD_FRAME_TS = 0x02
+RECORD_STATUS = 0x03
+RECORD_ACK = 0x04
+
+FLAG_EXTENDED = 0x01
+FLAG_RTR = 0x02
+
+FRAME_STRUCT = struct.Struct("<BIBB8s")
+FRAME_TS_STRUCT = struct.Struct("<BIBB8sI")
+STATUS_STRUCT = struct.Struct("<BIIIBBB")
+STATUS_FIELDS = ('RxOverflow', 'ErrorFrames', 'Dropped', 'TEC', 'REC', 'EFLG')
+RECORD_SIZE = FRAME_STRUCT.size + 1
+RECORD_TS_SIZE = FRAME_TS_STRUCT.size + 1
+DELIMITER = b"\x00"
+NEWLINE = b"\n"
+
+# Drop a partial record/line that grows beyond this without a delimiter
+MAX_PENDING = 4096
+
+
+def format_send_command(can_id, data):
+    """Text command understood by sendCANMessage(): hex ID, decimal length, hex data bytes."""
+    return f"{can_id:X},{len(data)},{','.join(f'{d:X}' for d in data)}\n".encode('ascii')
+
+
+def format_cyclic_set(slot, can_id, data, period_us, phase_us=0):
+    """
+    Upload one entry of the sketch's cyclic table. Period and phase are
+    decimal microseconds; ID and data are hex like format_send_command().
+    """
+    payload = ','.join(f'{d:X}' for d in data)
+    return f"!CYCSET {slot},{int(period_us)},{int(phase_us)},{can_id:X},{len(data)},{payload}\n".encode('ascii')
+
+
+def format_cyclic_data(slot, data):
+    """Replace the payload of a cyclic entry without resetting its schedule."""
+    return f"!CYCDATA {slot},{len(data)},{','.join(f'{d:X}' for d in data)}\n".encode('ascii')
+
+
+def format_cyclic_delete(slot):
+    return f"!CYCDEL {slot}\n".encode('ascii')
+
+
+def format_filter_command(config):
+    """
+    Program the MCP2515 masks and filters from an acceptance_filter.FilterConfig:
+    ``!FILTER <EXT>,<RXM0>,<RXM1>,<RXF0>,...,<RXF5>`` with all values in hex.
+    """
+    values = ','.join(f'{value:X}' for value in config.masks + config.filters)
+    return f"!FILTER {int(config.extended)},{values}\n".encode('ascii')
+
+
+def checksum(payload):
+    return sum(payload) & 0xFF
+
+
+def cobs_encode(data):
+    """COBS-encode ``data`` (without the trailing delimiter)."""
+    out = bytearray([0])
+    code_index = 0
+    code = 1
+    for byte in data:
+        if byte == 0:
+            out[code_index] = code
+            code_index = len(out)
+            out.append(0)
+            code = 1
+        else:
+            out.append(byte)
+            code += 1
+            if code == 0xFF:
+                out[code_index] = code
+                code_index = len(out)
+                out.append(0)
+                code = 1
+    out[code_index] = code
+    return bytes(out)
+
+
+def cobs_decode(data):
+    """Decode a COBS block (delimiter already stripped). Raises ValueError on malformed input."""
+    out = bytearray()
+    index = 0
+    length = len(data)
+    while index < length:
+        code = data[index]
+        if code == 0:
+            raise ValueError("Unexpected zero byte in COBS block")
+        end = index + code
+        if end > length:
+            raise ValueError("COBS block truncated")
+        out += data[index + 1:end]
+        index = end
+        if code != 0xFF and index < length:
+            out.append(0)
+    return bytes(out)
+
+
+def encode_frame(can_id, data, extended=False, rtr=False, dlc=None, micros=None):
+    """Build a complete delimited binary record, as the sketch would send it."""
+    flags = (FLAG_EXTENDED if extended else 0) | (FLAG_RTR if rtr else 0)
+    dlc = len(data) if dlc is None else dlc
+    padded = bytes(data).ljust(8, b"\x00")
+    if micros is None:
+        payload = FRAME_STRUCT.pack(RECORD_FRAME, can_id, flags, dlc, padded)
+    else:
+        payload = FRAME_TS_STRUCT.pack(RECORD_FRAME_TS, can_id, flags, dlc, padded, micros & 0xFFFFFFFF)
+    return cobs_encode(payload + bytes([checksum(payload)])) + DELIMITER
+
+
+def encode_status(rx_overflow, error_frames, dropped, tec=0, rec=0, eflg=0):
+    """Build a delimited status record, as the sketch would send it."""
+    payload = STATUS_STRUCT.pack(RECORD_STATUS, rx_overflow, error_frames, dropped, tec, rec, eflg)
+    return cobs_encode(payload + bytes([checksum(payload)])) + DELIMITER
+
+
+def encode_ack():
+    """Delimited RECORD_ACK record, the sketch's answer to ``!BIN`` in binary mode."""
+    return cobs_encode(bytes([RECORD_ACK, checksum(bytes([RECORD_ACK]))])) + DELIMITER
+
+
+def unpack_record(block):
+    """
+    :param block: bytes - COBS block without the 0x00 delimiter
+    :return: bytes - the checksummed record, or None if it is corrupt
+    """
+    try:
+        record = cobs_decode(block)
+    except ValueError:
+        return None
+
+    if not record or checksum(record[:-1]) != record[-1]:
+        return None
+    return record
+
+
+def decode_frame(block):
+    """
+    Decode one binary record into the same message dict the JSON mode produces.
+    :param block: bytes - COBS block without the 0x00 delimiter
+    :return: dict or None if the record is corrupt or not a frame
+    """
+    record = unpack_record(block)
+    return frame_from_record(record) if record is not None else None
+
+
+def status_from_record(record):
+    """Status dict (STATUS_FIELDS) from an unpacked RECORD_STATUS record, or None."""
+    if len(record) != STATUS_STRUCT.size + 1:
+        return None
+    return dict(zip(STATUS_FIELDS, STATUS_STRUCT.unpack_from(record)[1:]))
+
+
+def frame_from_record(record):
+    micros = None
+    if record[0] == RECORD_FRAME_TS and len(record) == RECORD_TS_SIZE:
+        _, can_id, flags, dlc, data, micros = FRAME_TS_STRUCT.unpack_from(record)
+    elif record[0] == RECORD_FRAME and len(record) == RECORD_SIZE:
+        _, can_id, flags, dlc, data = FRAME_STRUCT.unpack_from(record)
+    else:
+        return None
+
+    if dlc > 8:
+        return None
+
+    rtr = bool(flags & FLAG_RTR)
+    message = {
+        'ID': can_id,
+        'Length': dlc,
+        'Data': [] if rtr else list(data[:dlc]),
+        'Extended': bool(flags & FLAG_EXTENDED),
+        'RTR': rtr,
+    }
+    if micros is not None:
+        message['Micros'] = micros
+    return message
+
+
+class StreamParser:
+    """
+    Incremental splitter for the serial byte stream.
+    Bytes from each bulk read are appended to one reusable buffer and every
+    complete line (JSON mode) or record (binary mode) is parsed in one pass;
+    a trailing partial frame is kept for the next call.
+    """
+
+    def __init__(self, binary=False):
+        self.binary = binary
+        self.buffer = bytearray()
+        # Latest device status report, left for the caller to collect
+        self.status = None
+        # Corrupt records, malformed JSON lines and oversized partial frames discarded so far
+        self.errors = 0
+
+    def feed(self, data):
+        """
+        :param data: bytes - raw bytes as read from the serial port
+        :return: list[dict] - messages completed by this chunk
+        """
+        self.buffer += data
+        delimiter = DELIMITER if self.binary else NEWLINE
+        end = self.buffer.rfind(delimiter)
+        if end < 0:
+            if len(self.buffer) > MAX_PENDING:
+                self.buffer.clear()
+                self.errors += 1
+            return []
+
+        chunk = bytes(self.buffer[:end])
+        del self.buffer[:end + 1]
+
+        if self.binary:
+            return self._parse_records(chunk)
+        return self._parse_lines(chunk)
+
+    def _parse_records(self, chunk):
+        messages = []
+        for block in chunk.split(DELIMITER):
+            if not block:
+                continue
+            record = unpack_record(block)
+            if record is None:
+                self.errors += 1
+                continue
+            if record[0] == RECORD_STATUS:
+                self.status = status_from_record(record) or self.status
+                continue
+            if record[0] == RECORD_ACK:
+                continue
+            message = frame_from_record(record)
+            if message is None:
+                self.errors += 1
+            else:
+                messages.append(message)
+        return messages
+
+    def _parse_lines(self, chunk):
+        messages = []
+        for line in chunk.split(NEWLINE):
+            # Status text from the sketch is not JSON, skip it cheaply
+            if not line.startswith(b"{"):
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError:
+                self.errors += 1
+                continue
+            if not isinstance(message, dict):
+                continue
+            if 'ID' in message:
+                if 'T' in message:
+                    message['Micros'] = message.pop('T')
+                messages.append(message)
+            elif isinstance(message.get('Status'), dict):
+                self.status = message['Status']
+        return messages
@@ -0,0 +1,135 @@
+"""
+Single-producer/single-consumer frame ring in shared memory.
+
+The worker process (process_receiver.py) writes fixed-size RING_DTYPE
+records; the GUI process maps the same block and reads them as NumPy views,
+so frames cross the process boundary without pickling or copying. The
+header holds monotonically increasing write/read counters (slot = counter %
+capacity): only the producer advances ``write`` and only the consumer
+advances ``read``, and each side publishes its counter after the records it
+covers are in place, so no lock is needed.
+
+A full ring never overwrites unread frames. The producer keeps the rest of
+its batch as a backlog (back-pressure) and counts frames it has to give up
+on as overruns; both are in the header for the consumer to report.
+"""
+import numpy as np
+from multiprocessing import shared_memory
+
+RING_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('host_time', '<f8'),
+    # NaN when the frame carried no device timestamp
+    ('device_time', '<f8'),
+    ('period', '<f4'),
+    ('id', '<u4'),
+    ('flags', 'u1'),
+    ('dlc', 'u1'),
+    ('data', 'u1', (8,)),
+])
+
+# Header slots (int64 each)
+WRITE, READ, OVERRUNS, MAX_DEPTH, BACKLOG = range(5)
+HEADER_SLOTS = 8
+HEADER_SIZE = HEADER_SLOTS * 8
+
+DEFAULT_CAPACITY = 1 << 18
+
+
+class SharedFrameRing:
+    """
+    :param capacity: int - number of record slots
+    :param name: str - name of an existing block to attach to, or None to create one
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, name=None):
+        self.capacity = capacity
+        size = HEADER_SIZE + capacity * RING_DTYPE.itemsize
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+        self.header = np.ndarray(HEADER_SLOTS, dtype=np.int64, buffer=self.memory.buf)
+        self.records = np.ndarray(capacity, dtype=RING_DTYPE, buffer=self.memory.buf, offset=HEADER_SIZE)
+        if self.owner:
+            self.header[:] = 0
+        self.delivered = 0
+
+    # Producer side
+
+    def write(self, records):
+        """
+        Copy as many records as fit; never blocks.
+        :return: int - number written, the caller keeps the rest
+        """
+        header = self.header
+        write = int(header[WRITE])
+        depth = write - int(header[READ])
+        count = min(len(records), self.capacity - depth)
+        if count <= 0:
+            return 0
+
+        start = write % self.capacity
+        first = min(count, self.capacity - start)
+        self.records[start:start + first] = records[:first]
+        if count > first:
+            self.records[:count - first] = records[first:count]
+
+        header[WRITE] = write + count
+        if depth + count > header[MAX_DEPTH]:
+            header[MAX_DEPTH] = depth + count
+        return count
+
+    def set_backlog(self, backlog):
+        self.header[BACKLOG] = backlog
+
+    def add_overruns(self, count):
+        self.header[OVERRUNS] += count
+
+    # Consumer side
+
+    def read(self, limit=None):
+        """
+        The oldest unread records as a view into shared memory. Stops at the
+        end of the buffer, so a wrapped ring takes two calls. The view stays
+        valid until release().
+        """
+        read = int(self.header[READ])
+        available = int(self.header[WRITE]) - read
+        start = read % self.capacity
+        count = min(available, self.capacity - start)
+        if limit is not None:
+            count = min(count, limit)
+        return self.records[start:start + count]
+
+    def release(self, count):
+        """Hand count read records back to the producer."""
+        self.header[READ] += count
+        self.delivered += count
+
+    # FrameQueue-style counters, so PipelineMetrics can report the ring like the in-process queue
+
+    @property
+    def depth(self):
+        return int(self.header[WRITE] - self.header[READ])
+
+    @property
+    def max_depth(self):
+        return int(self.header[MAX_DEPTH])
+
+    @property
+    def dropped(self):
+        return int(self.header[OVERRUNS])
+
+    @property
+    def backlog(self):
+        return int(self.header[BACKLOG])
+
+    def close(self):
+        # Views must go before the mapping can be closed
+        self.header = self.records = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
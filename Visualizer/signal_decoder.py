@@ -0,0 +1,91 @@
+"""
+Vectorized extraction of bit-field signals from N x 8 payload arrays.
+
+Bit positions follow DBC numbering: bit ``b`` of byte ``B`` is ``B * 8 + b``
+with bit 0 the least significant bit of the byte.
+
+* Intel (little endian): ``start_bit`` is the signal's least significant bit
+  and the signal grows towards higher bytes.
+* Motorola (big endian): ``start_bit`` is the signal's most significant bit
+  and the signal continues into the following bytes.
+
+Each payload row is reinterpreted as one 64-bit integer (little or big endian
+to match the byte order), so a signal is a single shift and mask over the
+whole array regardless of how many bytes it spans.
+"""
+import numpy as np
+
+INTEL = 'intel'
+MOTOROLA = 'motorola'
+
+
+def signal_layout(start_bit, length, byte_order=INTEL):
+    """
+    Resolve a signal definition to its position in the 64-bit row value.
+    :return: tuple(shift, required_bytes) - right shift to apply and the DLC needed to contain the signal
+    """
+    if not 1 <= length <= 64:
+        raise ValueError("Signal length must be between 1 and 64 bits")
+    if not 0 <= start_bit < 64:
+        raise ValueError("Start bit must be between 0 and 63")
+
+    if byte_order == INTEL:
+        end = start_bit + length
+        if end > 64:
+            raise ValueError("Signal extends past the end of the payload")
+        return start_bit, (end + 7) // 8
+
+    if byte_order == MOTOROLA:
+        # Position of the MSB inside a big-endian 64-bit word
+        msb = (7 - start_bit // 8) * 8 + start_bit % 8
+        lsb = msb - length + 1
+        if lsb < 0:
+            raise ValueError("Signal extends past the end of the payload")
+        return lsb, 8 - lsb // 8
+
+    raise ValueError(f"Unknown byte order: {byte_order}")
+
+
+def payload_words(payload, byte_order=INTEL):
+    """View an N x 8 uint8 payload array as N 64-bit words in the given byte order."""
+    payload = np.ascontiguousarray(payload, dtype=np.uint8).reshape(-1, 8)
+    dtype = '<u8' if byte_order == INTEL else '>u8'
+    return payload.view(dtype).reshape(-1)
+
+
+def extract_signal(payload, start_bit, length, byte_order=INTEL, signed=False,
+                   scale=1.0, offset=0.0, dlc=None):
+    """
+    Extract one signal from every row of ``payload``.
+    :param payload: array-like N x 8 uint8 - frame data, zero padded
+    :param start_bit: int - DBC start bit (LSB for Intel, MSB for Motorola)
+    :param length: int - signal length in bits (1-64)
+    :param byte_order: str - INTEL or MOTOROLA
+    :param signed: bool - interpret the raw value as two's complement
+    :param scale: float - physical = raw * scale + offset
+    :param offset: float
+    :param dlc: optional array of N DLCs; rows too short to hold the signal are dropped
+    :return: numpy array of raw integers (scale=1, offset=0) or float64 physical values
+    """
+    shift, required_bytes = signal_layout(start_bit, length, byte_order)
+    words = payload_words(payload, byte_order)
+
+    raw = words >> np.uint64(shift)
+    if length < 64:
+        raw = raw & np.uint64((1 << length) - 1)
+
+    if signed:
+        if length < 64:
+            sign = np.int64(1 << (length - 1))
+            values = (raw.astype(np.int64) ^ sign) - sign
+        else:
+            values = raw.view(np.int64)
+    else:
+        values = raw
+
+    if dlc is not None:
+        values = values[np.asarray(dlc) >= required_bytes]
+
+    if scale == 1 and offset == 0:
+        return values
+    return values * float(scale) + float(offset)
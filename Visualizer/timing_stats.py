@@ -0,0 +1,188 @@
+"""
+Constant-time streaming timing statistics per CAN ID.
+
+Every update is O(1): the fixed-window mean keeps a running sum over a
+circular buffer, jitter uses Welford's online variance, and the EWMA and
+min/max are single comparisons. The first frame of an ID only sets the
+reference time, and frames that share a timestamp with the previous one
+(host-stamped frames from one serial read) only add to the count, so no
+artificial zero period enters the statistics.
+
+Gaps (periods over MISSED_CYCLE_FACTOR times the EWMA) are counted as
+missed cycles and kept out of the EWMA and jitter. When RESEED_GAPS gaps
+follow each other, the sender has changed its rate instead: the EWMA
+restarts from the new period, and without a configured period the cycles
+counted as missed in that run are taken back.
+"""
+import math
+
+# A gap longer than this multiple of the expected period counts as missed cycles
+MISSED_CYCLE_FACTOR = 1.5
+# Consecutive gaps after which the EWMA follows the new rate
+RESEED_GAPS = 3
+
+
+class IDTimingStats:
+    __slots__ = ('count', 'first_time', 'last_time', 'last_period', 'ewma_period', 'alpha',
+                 'window', 'window_index', 'window_sum', 'window_count',
+                 'jitter_count', 'mean', 'm2', 'min_period', 'max_period',
+                 'expected_period', 'missed_cycles', 'gap_run', 'gap_missed')
+
+    def __init__(self, window_size=10, alpha=0.1, expected_period=None):
+        self.count = 0
+        self.first_time = None
+        self.last_time = None
+        self.last_period = 0.0
+        self.ewma_period = 0.0
+        self.alpha = alpha
+
+        self.window = [0.0] * window_size
+        self.window_index = 0
+        self.window_sum = 0.0
+        self.window_count = 0
+
+        self.jitter_count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min_period = math.inf
+        self.max_period = 0.0
+
+        self.expected_period = expected_period
+        self.missed_cycles = 0
+        # Consecutive gaps so far, and the missed cycles counted for them
+        self.gap_run = 0
+        self.gap_missed = 0
+
+    def update(self, timestamp):
+        """
+        Add one frame arrival.
+        :param timestamp: float - arrival time in seconds
+        """
+        self.count += 1
+        last_time = self.last_time
+        if last_time == timestamp:
+            # Frames from one serial read share a host timestamp; the time between them is unknown, not zero
+            return
+        self.last_time = timestamp
+        if last_time is None:
+            if self.first_time is None:
+                self.first_time = timestamp
+            return
+
+        period = (timestamp - last_time) * 1000
+        self.last_period = period
+
+        # Missed cycles are judged against the configured period, or the EWMA of regular periods
+        expected = self.expected_period or self.ewma_period
+        missed = 0
+        if expected > 0 and period > expected * MISSED_CYCLE_FACTOR:
+            missed = max(1, round(period / expected) - 1)
+            self.missed_cycles += missed
+
+        gap = self.ewma_period > 0 and period > self.ewma_period * MISSED_CYCLE_FACTOR
+        if gap:
+            self.gap_run += 1
+            self.gap_missed += missed
+            if self.gap_run >= RESEED_GAPS:
+                # Not a dropout but a slower sender (or a burst at start-up): follow the new rate
+                if not self.expected_period:
+                    self.missed_cycles -= self.gap_missed
+                self.ewma_period = 0.0
+                gap = False
+        if not gap:
+            self.gap_run = 0
+            self.gap_missed = 0
+            if self.ewma_period == 0.0:
+                self.ewma_period = period
+            else:
+                self.ewma_period += self.alpha * (period - self.ewma_period)
+
+        window = self.window
+        index = self.window_index
+        if self.window_count == len(window):
+            self.window_sum -= window[index]
+        else:
+            self.window_count += 1
+        window[index] = period
+        self.window_sum += period
+        self.window_index = (index + 1) % len(window)
+
+        if not gap:
+            self.jitter_count += 1
+            delta = period - self.mean
+            self.mean += delta / self.jitter_count
+            self.m2 += delta * (period - self.mean)
+
+        if period < self.min_period:
+            self.min_period = period
+        if period > self.max_period:
+            self.max_period = period
+
+    def restart(self):
+        """Forget the previous arrival, so a deliberate pause is not counted as a gap."""
+        self.last_time = None
+        self.gap_run = 0
+        self.gap_missed = 0
+
+    @property
+    def window_period(self):
+        return self.window_sum / self.window_count if self.window_count else 0.0
+
+    @property
+    def jitter(self):
+        """Standard deviation of the periods seen so far, gaps left out (ms)."""
+        samples = self.jitter_count
+        return math.sqrt(self.m2 / (samples - 1)) if samples > 1 else 0.0
+
+    @property
+    def frame_rate(self):
+        """Frames per second derived from the EWMA period."""
+        return 1000.0 / self.ewma_period if self.ewma_period > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'period': self.window_period,
+            'ewma_period': self.ewma_period,
+            'last_period': self.last_period,
+            'jitter': self.jitter,
+            'min_period': self.min_period if self.max_period else 0.0,
+            'max_period': self.max_period,
+            'frame_rate': self.frame_rate,
+            'expected_period': self.expected_period,
+            'missed_cycles': self.missed_cycles,
+        }
+
+
+class TimingStatsEngine:
+    """Per-ID IDTimingStats, created on first sight of an ID."""
+
+    def __init__(self, window_size=10, alpha=0.1):
+        self.window_size = window_size
+        self.alpha = alpha
+        self.stats = {}
+        self.expected_periods = {}
+
+    def update(self, can_id, timestamp):
+        stats = self.stats.get(can_id)
+        if stats is None:
+            stats = IDTimingStats(self.window_size, self.alpha, self.expected_periods.get(can_id))
+            self.stats[can_id] = stats
+        stats.update(timestamp)
+        return stats
+
+    def set_expected_period(self, can_id, period_ms):
+        """Declare the nominal cycle time of an ID so missed cycles are counted against it."""
+        self.expected_periods[can_id] = period_ms
+        if can_id in self.stats:
+            self.stats[can_id].expected_period = period_ms
+
+    def get(self, can_id):
+        return self.stats.get(can_id)
+
+    def snapshot(self):
+        """CAN ID -> statistics dict for every ID seen."""
+        return {can_id: stats.as_dict() for can_id, stats in list(self.stats.items())}
+
+    def reset(self):
+        self.stats = {}
@@ -0,0 +1,154 @@
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QFormLayout, QLabel, QLineEdit, QPushButton,
+                             QTableWidget, QTableWidgetItem, QDoubleSpinBox, QSpinBox, QComboBox)
+from tx_scheduler import CyclicMessage, CHECKSUM_SUM8, CHECKSUM_XOR8, CHECKSUM_SUM8_ID
+from serial_protocol import MAX_CYCLIC_SLOTS
+
+class TransmitTab(QWidget):
+    """Cyclic transmit table with measured TX period and jitter per message."""
+
+    COLUMNS = ['CAN ID', 'Data', 'Period (ms)', 'Phase (ms)', 'Sent', 'Measured (ms)', 'Jitter (ms)', 'Missed']
+
+    def __init__(self, scheduler, parent=None):
+        super().__init__(parent)
+        self.scheduler = scheduler
+        self.rows = []
+
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+
+        form_layout = QFormLayout()
+        self.id_input = QLineEdit()
+        self.data_input = QLineEdit()
+        self.data_input.setPlaceholderText("hex bytes, comma-separated")
+        self.period_input = QDoubleSpinBox()
+        self.period_input.setRange(1, 60000)
+        self.period_input.setValue(100)
+        self.phase_input = QDoubleSpinBox()
+        self.phase_input.setRange(0, 60000)
+        # -1 disables the generator
+        self.counter_input = QSpinBox()
+        self.counter_input.setRange(-1, 7)
+        self.counter_input.setValue(-1)
+        self.counter_input.setSpecialValueText("none")
+        self.checksum_input = QSpinBox()
+        self.checksum_input.setRange(-1, 7)
+        self.checksum_input.setValue(-1)
+        self.checksum_input.setSpecialValueText("none")
+        self.checksum_type = QComboBox()
+        self.checksum_type.addItems([CHECKSUM_SUM8, CHECKSUM_XOR8, CHECKSUM_SUM8_ID])
+
+        form_layout.addRow("CAN ID (hex):", self.id_input)
+        form_layout.addRow("Data:", self.data_input)
+        form_layout.addRow("Period (ms):", self.period_input)
+        form_layout.addRow("Phase (ms):", self.phase_input)
+        form_layout.addRow("Counter byte:", self.counter_input)
+        form_layout.addRow("Checksum byte:", self.checksum_input)
+        form_layout.addRow("Checksum:", self.checksum_type)
+        layout.addLayout(form_layout)
+
+        button_layout = QHBoxLayout()
+        add_button = QPushButton("Add")
+        add_button.clicked.connect(self.handle_add)
+        button_layout.addWidget(add_button)
+        remove_button = QPushButton("Remove Selected")
+        remove_button.clicked.connect(self.handle_remove)
+        button_layout.addWidget(remove_button)
+        self.start_button = QPushButton("Start")
+        self.start_button.setCheckable(True)
+        self.start_button.toggled.connect(self.handle_start)
+        button_layout.addWidget(self.start_button)
+        # Hands the table to the sketch, whose own timer sends it without further serial traffic
+        self.device_button = QPushButton("Run on Device")
+        self.device_button.setCheckable(True)
+        self.device_button.toggled.connect(self.handle_device)
+        button_layout.addWidget(self.device_button)
+        layout.addLayout(button_layout)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table)
+
+        self.writes_label = QLabel()
+        layout.addWidget(self.writes_label)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+
+    def handle_add(self):
+        try:
+            can_id = int(self.id_input.text(), 16)
+            data = [int(byte.strip(), 16) for byte in self.data_input.text().split(',') if byte.strip()]
+            counter_byte = self.counter_input.value()
+            checksum_byte = self.checksum_input.value()
+            message = CyclicMessage(can_id, data, self.period_input.value(), self.phase_input.value(),
+                                    counter_byte=counter_byte if counter_byte >= 0 else None,
+                                    checksum_byte=checksum_byte if checksum_byte >= 0 else None,
+                                    checksum=self.checksum_type.currentText())
+        except ValueError as e:
+            print(f"Error: Invalid cyclic message: {e}")
+            return
+
+        key = self.scheduler.add(message)
+        self.rows.append(key)
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        for column, text in enumerate([f"0x{can_id:X}", ' '.join(f"{b:02X}" for b in data),
+                                       f"{message.period_ms:g}", f"{message.phase_ms:g}"]):
+            self.table.setItem(row, column, QTableWidgetItem(text))
+
+    def handle_remove(self):
+        for row in sorted({index.row() for index in self.table.selectedIndexes()}, reverse=True):
+            self.scheduler.remove(self.rows.pop(row))
+            self.table.removeRow(row)
+
+    def handle_start(self, enabled):
+        if enabled:
+            self.scheduler.start()
+            self.start_button.setText("Stop")
+        else:
+            self.scheduler.stop()
+            self.start_button.setText("Start")
+
+    def handle_device(self, enabled):
+        receiver = self.scheduler.receiver
+        if not enabled:
+            receiver.stop_cyclic()
+            self.start_button.setEnabled(True)
+            return
+
+        if self.start_button.isChecked():
+            self.start_button.setChecked(False)
+        self.start_button.setEnabled(False)
+
+        messages = [self.scheduler.messages[key] for key in self.rows]
+        if len(messages) > MAX_CYCLIC_SLOTS:
+            print(f"Warning: only the first {MAX_CYCLIC_SLOTS} cyclic messages fit in the device table")
+        receiver.clear_cyclic()
+        for slot, message in enumerate(messages[:MAX_CYCLIC_SLOTS]):
+            if message.counter_byte is not None or message.checksum_byte is not None:
+                print(f"Warning: 0x{message.can_id:X} is sent with a static payload; counters/checksums are host-only")
+            receiver.set_cyclic(slot, message.can_id, message.data, message.period_ms, message.phase_ms)
+        receiver.start_cyclic()
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+
+        stats = self.scheduler.stats()
+        for row, key in enumerate(self.rows):
+            entry = stats.get(key)
+            if entry is None:
+                continue
+            values = [str(entry['sent']), f"{entry['ewma_period']:.2f}", f"{entry['jitter']:.3f}",
+                      str(entry['missed_cycles'])]
+            for offset, text in enumerate(values):
+                column = 4 + offset
+                item = self.table.item(row, column)
+                if item is None:
+                    self.table.setItem(row, column, QTableWidgetItem(text))
+                else:
+                    item.setText(text)
+        self.writes_label.setText(f"Serial writes: {self.scheduler.writes}")
@@ -0,0 +1,441 @@
+"""
+Transports between CANMessageReceiver and the sketch.
+
+open_transport() picks a backend from the port string:
+
+    COM3, /dev/ttyUSB0, loop://, socket://...  pyserial (serial_for_url)
+    sim://?ids=100&rate=5000                   in-process simulated bus
+    pty://?ids=100&rate=5000                   pseudo-terminal with the sketch emulated on the far end
+
+Every backend offers the part of the pyserial API the receiver uses:
+read(size), readline(), write(data), in_waiting, timeout and close().
+
+Both simulated backends run SketchEmulator, which speaks the same wire
+protocol as Arduino-CAN-Console.ino (JSON lines, !BIN binary records,
+status reports, acceptance filters) over traffic from TrafficGenerator.
+Traffic parameters come from the query string, see parse_traffic_config().
+"""
+import heapq
+import math
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit, parse_qsl
+import serial
+from serial_protocol import encode_frame, encode_status, encode_ack, CMD_BINARY, CMD_TEXT, ACK_BINARY, NEWLINE
+
+SIM_SCHEME = 'sim'
+PTY_SCHEME = 'pty'
+
+STATUS_INTERVAL = 1.0
+BANNER = b"Adafruit MCP2515 CAN Console Example\r\nMCP2515 initialized successfully.\r\n"
+
+
+class TrafficConfig:
+    """
+    :param ids: int - number of distinct IDs, starting at base_id
+    :param rate: float - total frames/s spread evenly over the IDs; overrides period_ms
+    :param period_ms: (min, max) - per-ID periods drawn uniformly from this range
+    :param dlcs: list[int] - DLCs assigned to the IDs in turn
+    :param burst: int - extra back-to-back frames emitted every burst_ms (0 disables)
+    :param seed: int - makes the generated traffic reproducible
+    """
+
+    def __init__(self, ids=10, base_id=0x100, rate=None, period_ms=(10.0, 100.0), dlcs=(8,), extended=False,
+                 burst=0, burst_ms=100.0, seed=0):
+        self.ids = ids
+        self.base_id = base_id
+        self.rate = rate
+        self.period_ms = period_ms
+        self.dlcs = list(dlcs)
+        self.extended = extended
+        self.burst = burst
+        self.burst_ms = burst_ms
+        self.seed = seed
+
+
+def _parse_range(text, convert=float):
+    """"10-100" -> (10, 100), "50" -> (50, 50)"""
+    low, _, high = text.partition('-')
+    return convert(low), convert(high or low)
+
+
+def parse_traffic_config(query):
+    """
+    Build a TrafficConfig from a query string such as
+    ``ids=50&rate=5000&dlc=2,8&burst=20&burst_ms=250&seed=1``.
+    ``period`` takes a range in ms ("10-100"), ``dlc`` a list or range ("0-8").
+    """
+    options = dict(parse_qsl(query))
+    config = TrafficConfig()
+    try:
+        if 'ids' in options:
+            config.ids = int(options.pop('ids'))
+        if 'base_id' in options:
+            config.base_id = int(options.pop('base_id'), 0)
+        if 'rate' in options:
+            config.rate = float(options.pop('rate'))
+        if 'period' in options:
+            config.period_ms = _parse_range(options.pop('period'))
+        if 'dlc' in options:
+            text = options.pop('dlc')
+            if '-' in text:
+                low, high = _parse_range(text, int)
+                config.dlcs = list(range(low, high + 1))
+            else:
+                config.dlcs = [int(value) for value in text.split(',')]
+        if 'extended' in options:
+            config.extended = options.pop('extended') not in ('0', 'false', '')
+        if 'burst' in options:
+            config.burst = int(options.pop('burst'))
+        if 'burst_ms' in options:
+            config.burst_ms = float(options.pop('burst_ms'))
+        if 'seed' in options:
+            config.seed = int(options.pop('seed'))
+    except ValueError as e:
+        raise ValueError(f"Invalid simulated traffic option: {e}")
+    if options:
+        raise ValueError(f"Unknown simulated traffic options: {', '.join(options)}")
+    if config.ids < 1 or any(not 0 <= dlc <= 8 for dlc in config.dlcs):
+        raise ValueError("Simulated traffic needs at least one ID and DLCs between 0 and 8")
+    return config
+
+
+class TrafficGenerator:
+    """
+    Periodic frames per ID on a fixed schedule, plus optional bursts.
+    Byte 0-1 carry a per-ID sequence number, byte 2 a slow sine and the rest
+    stay constant, so plots and bit statistics have something to show.
+    """
+
+    def __init__(self, config, start_time=0.0):
+        self.config = config
+        rng = random.Random(config.seed)
+        self.ids = [config.base_id + index for index in range(config.ids)]
+        self.dlcs = {can_id: config.dlcs[index % len(config.dlcs)] for index, can_id in enumerate(self.ids)}
+        self.constant = {can_id: [rng.randrange(256) for _ in range(8)] for can_id in self.ids}
+        self.sequence = dict.fromkeys(self.ids, 0)
+
+        if config.rate:
+            self.periods = dict.fromkeys(self.ids, config.ids / config.rate)
+        else:
+            low, high = config.period_ms
+            self.periods = {can_id: rng.uniform(low, high) / 1000 for can_id in self.ids}
+
+        # Random phases so IDs with equal periods do not all fire at once
+        self.schedule = [(start_time + rng.uniform(0, self.periods[can_id]), can_id) for can_id in self.ids]
+        heapq.heapify(self.schedule)
+        self.burst_interval = config.burst_ms / 1000 if config.burst else None
+        self.next_burst = start_time + self.burst_interval if self.burst_interval else math.inf
+        self.burst_index = 0
+
+    def payload(self, can_id):
+        sequence = self.sequence[can_id]
+        self.sequence[can_id] = sequence + 1
+        data = list(self.constant[can_id])
+        data[0] = sequence & 0xFF
+        data[1] = (sequence >> 8) & 0xFF
+        data[2] = int(127.5 + 127.5 * math.sin(sequence / 50))
+        return data[:self.dlcs[can_id]]
+
+    def next_due(self):
+        return min(self.schedule[0][0], self.next_burst)
+
+    def due(self, now):
+        """:return: list of (time, can_id, data) due up to now, in time order"""
+        frames = []
+        schedule = self.schedule
+        while schedule and schedule[0][0] <= now:
+            due, can_id = schedule[0]
+            frames.append((due, can_id, self.payload(can_id)))
+            heapq.heapreplace(schedule, (due + self.periods[can_id], can_id))
+
+        while self.next_burst <= now:
+            for _ in range(self.config.burst):
+                can_id = self.ids[self.burst_index % len(self.ids)]
+                self.burst_index += 1
+                frames.append((self.next_burst, can_id, self.payload(can_id)))
+            self.next_burst += self.burst_interval
+        if self.burst_interval:
+            frames.sort(key=lambda frame: frame[0])
+        return frames
+
+
+class SketchEmulator:
+    """
+    The sketch's side of the wire protocol: command handling, acceptance
+    filtering and frame/status encoding. Frames sent by the host are
+    counted in ``transmitted`` (a node does not receive its own frames).
+    """
+
+    def __init__(self, generator, start_time=0.0):
+        self.generator = generator
+        self.start_time = start_time
+        self.binary_mode = False
+        self.filter = None
+        self.input = bytearray()
+        self.transmitted = 0
+        self.cyclic = {}
+        self.next_status = start_time + STATUS_INTERVAL
+
+    def banner(self):
+        return BANNER
+
+    def handle_input(self, data):
+        """Feed bytes written by the host; returns the sketch's replies."""
+        self.input += data
+        replies = []
+        while True:
+            end = self.input.find(NEWLINE)
+            if end < 0:
+                break
+            line = bytes(self.input[:end]).strip().decode('ascii', errors='replace')
+            del self.input[:end + 1]
+            reply = self.handle_line(line)
+            if reply:
+                replies.append(reply)
+        return b''.join(replies)
+
+    def handle_line(self, line):
+        if line == CMD_BINARY.strip().decode():
+            if self.binary_mode:
+                return encode_ack()
+            self.binary_mode = True
+            return (ACK_BINARY + "\r\n").encode()
+        if line == CMD_TEXT.strip().decode():
+            self.binary_mode = False
+            return b"OK TXT\r\n"
+        if line.startswith('!FILTER'):
+            self.set_filter(line[len('!FILTER'):].strip())
+            return self.status_text("OK FILTER")
+        if line.startswith('!CYC'):
+            verb, _, rest = line.partition(' ')
+            if verb == '!CYCSET':
+                slot = int(rest.split(',', 1)[0])
+                self.cyclic[slot] = rest
+            elif verb == '!CYCDEL':
+                self.cyclic.pop(int(rest), None)
+            elif verb == '!CYCCLR':
+                self.cyclic.clear()
+            return self.status_text("OK CYC")
+        if line.startswith('!'):
+            return self.status_text("Unknown command.")
+        if line.count(',') >= 1:
+            self.transmitted += 1
+        return b''
+
+    def status_text(self, message):
+        # The sketch only prints diagnostics in JSON mode
+        return b'' if self.binary_mode else (message + "\r\n").encode()
+
+    def set_filter(self, arguments):
+        if arguments == 'OFF':
+            self.filter = None
+            return
+        fields = [int(value, 16) for value in arguments.split(',')]
+        extended = bool(fields[0])
+        masks, filters = fields[1:3], fields[3:9]
+        self.filter = (extended, [(masks[0], value) for value in filters[:2]] +
+                       [(masks[1], value) for value in filters[2:]])
+
+    def accepts(self, can_id):
+        if self.filter is None:
+            return True
+        extended, pairs = self.filter
+        if extended != self.generator.config.extended:
+            return False
+        return any(can_id & mask == value & mask for mask, value in pairs)
+
+    def encode(self, frames):
+        out = []
+        extended = self.generator.config.extended
+        for due, can_id, data in frames:
+            if not self.accepts(can_id):
+                continue
+            micros = int((due - self.start_time) * 1e6) & 0xFFFFFFFF
+            if self.binary_mode:
+                out.append(encode_frame(can_id, data, extended, micros=micros))
+            else:
+                out.append(f'{{"ID":{can_id},"Length":{len(data)},"Data":[{",".join(map(str, data))}],'
+                           f'"T":{micros}}}\r\n'.encode())
+        return b''.join(out)
+
+    def poll(self, now):
+        """Wire bytes for every frame and status report due up to now."""
+        out = self.encode(self.generator.due(now))
+        if now >= self.next_status:
+            self.next_status += STATUS_INTERVAL
+            if self.binary_mode:
+                out += encode_status(0, 0, 0)
+            else:
+                out += b'{"Status":{"RxOverflow":0,"ErrorFrames":0,"Dropped":0,"TEC":0,"REC":0,"EFLG":0}}\r\n'
+        return out
+
+    def next_due(self):
+        return min(self.generator.next_due(), self.next_status)
+
+
+class SimulatedTransport:
+    """
+    In-process simulated bus: frames are generated on demand when the
+    receiver reads, with no OS serial buffer in between. Nothing limits the
+    rate, so the receive and GUI paths can be loaded far beyond what the
+    real serial link carries.
+    """
+
+    def __init__(self, config, timeout=1):
+        self.timeout = timeout
+        start = time.perf_counter()
+        self.emulator = SketchEmulator(TrafficGenerator(config, start), start)
+        self.buffer = bytearray(self.emulator.banner())
+        self.lock = threading.Lock()
+        self.is_open = True
+
+    def _produce(self):
+        data = self.emulator.poll(time.perf_counter())
+        if data:
+            with self.lock:
+                self.buffer += data
+
+    def _take(self, size):
+        with self.lock:
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+        return data
+
+    def _wait(self, deadline):
+        """Sleep until the next frame is due; False once the read timeout has passed."""
+        now = time.perf_counter()
+        if deadline is not None and now >= deadline:
+            return False
+        wake = self.emulator.next_due()
+        if deadline is not None:
+            wake = min(wake, deadline)
+        time.sleep(max(0.0, min(wake - now, 0.05)))
+        return True
+
+    @property
+    def in_waiting(self):
+        self._produce()
+        return len(self.buffer)
+
+    def read(self, size=1):
+        deadline = time.perf_counter() + self.timeout if self.timeout is not None else None
+        while self.is_open:
+            self._produce()
+            if self.buffer:
+                return self._take(size)
+            if not self._wait(deadline):
+                break
+        return b''
+
+    def readline(self):
+        deadline = time.perf_counter() + self.timeout if self.timeout is not None else None
+        while self.is_open:
+            self._produce()
+            end = self.buffer.find(NEWLINE)
+            if end >= 0:
+                return self._take(end + 1)
+            if not self._wait(deadline):
+                break
+        return self._take(len(self.buffer))
+
+    def write(self, data):
+        reply = self.emulator.handle_input(bytes(data))
+        if reply:
+            with self.lock:
+                self.buffer += reply
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+
+
+class PtyTransport:
+    """
+    Pseudo-terminal loopback: a thread plays the sketch on the master side
+    and the receiver talks to the slave through a real serial.Serial, so the
+    OS tty layer and pyserial are exercised too. ``device`` is the slave
+    path, which other programs can open while it runs. POSIX only.
+    """
+
+    def __init__(self, config, baudrate=250000, timeout=1):
+        import pty
+        import tty
+        import select
+        self._select = select.select
+
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)
+        self.device = os.ttyname(slave)
+        self._slave = slave
+        self.running = True
+        self.emulator = SketchEmulator(TrafficGenerator(config, time.perf_counter()), time.perf_counter())
+        self.connection = serial.Serial(self.device, baudrate, timeout=timeout)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        os.write(self.master, self.emulator.banner())
+        while self.running:
+            timeout = max(0.0, min(self.emulator.next_due() - time.perf_counter(), 0.05))
+            try:
+                readable, _, _ = self._select([self.master], [], [], timeout)
+                if readable:
+                    reply = self.emulator.handle_input(os.read(self.master, 4096))
+                    if reply:
+                        os.write(self.master, reply)
+                data = self.emulator.poll(time.perf_counter())
+                if data:
+                    os.write(self.master, data)
+            except OSError:
+                break
+
+    @property
+    def timeout(self):
+        return self.connection.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self.connection.timeout = value
+
+    @property
+    def in_waiting(self):
+        return self.connection.in_waiting
+
+    def read(self, size=1):
+        return self.connection.read(size)
+
+    def readline(self):
+        return self.connection.readline()
+
+    def write(self, data):
+        return self.connection.write(data)
+
+    def close(self):
+        self.running = False
+        self.connection.close()
+        self.thread.join(timeout=1)
+        for fd in (self.master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+def open_transport(port, baudrate=250000, timeout=1):
+    """
+    Open the backend named by ``port``.
+    :raises serial.SerialException: if the port cannot be opened
+    :raises ValueError: for malformed simulated traffic options
+    """
+    scheme = urlsplit(port).scheme if '://' in port else ''
+    if scheme == SIM_SCHEME:
+        return SimulatedTransport(parse_traffic_config(urlsplit(port).query), timeout)
+    if scheme == PTY_SCHEME:
+        try:
+            return PtyTransport(parse_traffic_config(urlsplit(port).query), baudrate, timeout)
+        except (ImportError, OSError) as e:
+            raise serial.SerialException(f"Cannot create pseudo-terminal: {e}")
+    return serial.serial_for_url(port, baudrate, timeout=timeout)
@@ -0,0 +1,263 @@
+"""
+Trigger-based capture: keep the last few seconds in memory and write them,
+plus what follows, to disk when a condition fires.
+
+Conditions are short strings (IDs hex, values decimal or 0x-prefixed):
+
+    7E8                     a frame with ID 0x7E8 is seen
+    123[2]=0xFF             byte 2 equals 0xFF
+    123[2]=10..20           byte 2 inside 10..20 (inclusive); != for outside
+    123[20|12@1+]>1500      DBC-style bit field: start bit 20, 12 bits, Intel (@1)
+                            or Motorola (@0), unsigned (+) or signed (-)
+    123.period>15           gap to the previous frame of the ID, ms (=, !=, <, >, <=, >=)
+    123.missing>100         no frame of the ID for more than 100 ms
+    can1 123[0]=1           only frames of one channel (multi-interface captures)
+
+TriggerEngine compiles the conditions into a dict from CAN ID to the
+conditions on that ID, so a frame costs one dict lookup plus the conditions
+on its own ID, however many triggers are armed. Missing-frame conditions are
+checked on tick(), which the receive path calls for every batch and on every
+read timeout.
+
+The pre-trigger window is a deque of the newest frames, trimmed by age. When
+a condition fires, its frames are copied and the following post-trigger
+frames are appended; the finished capture is written as a ``.canlog`` file
+on a short-lived thread so the receive path never waits on the disk. Conditions
+firing while a capture is being collected are counted in ``suppressed``.
+"""
+import collections
+import os
+import re
+import sys
+import threading
+import time
+from collections import namedtuple
+from channels import CHANNEL_PREFIX
+from dbc import SignalDefinition
+from signal_decoder import INTEL, MOTOROLA
+from recorder import LOG_EXTENSION, log_header, messages_to_records
+
+# time: trigger time; frames: frames written (0 until the file is complete)
+TriggerEvent = namedtuple('TriggerEvent', ['time', 'condition', 'frames', 'path'])
+
+CONDITION_PATTERN = re.compile(
+    r'^(?:(?P<channel>' + CHANNEL_PREFIX + r'\d+)\s+)?'
+    r'(?:0x)?(?P<id>[0-9A-Fa-f]+)'
+    r'(?:(?P<field>\[[^\]]+\]|\.period|\.missing)\s*(?P<op>!=|<=|>=|=|<|>)\s*(?P<value>\S+))?$'
+)
+BYTE_PATTERN = re.compile(r'^\[\s*(\d)\s*\]$')
+BIT_FIELD_PATTERN = re.compile(r'^\[\s*(\d+)\s*\|\s*(\d+)\s*@\s*([01])\s*([+-]?)\s*\]$')
+
+OPERATORS = {
+    '=': lambda value, low, high: low <= value <= high,
+    '!=': lambda value, low, high: not low <= value <= high,
+    '<': lambda value, low, high: value < low,
+    '>': lambda value, low, high: value > low,
+    '<=': lambda value, low, high: value <= low,
+    '>=': lambda value, low, high: value >= low,
+}
+
+
+class TriggerCondition:
+    """One parsed condition; see the module docstring for the syntax."""
+
+    def __init__(self, text, can_id, channel=None, kind='seen', op=None, low=None, high=None, signal=None):
+        self.text = text
+        self.can_id = can_id
+        self.channel = channel
+        self.kind = kind
+        self.compare = OPERATORS.get(op)
+        self.low = low
+        self.high = high
+        self.signal = signal
+        self.last_time = None
+
+    def matches(self, message):
+        if self.channel is not None and message.get('Channel') != self.channel:
+            return False
+
+        if self.kind == 'seen':
+            return True
+
+        if self.kind == 'field':
+            data = message['Data']
+            if len(data) < self.signal.required_bytes:
+                return False
+            order = 'little' if self.signal.byte_order == INTEL else 'big'
+            value = self.signal.decode_raw(int.from_bytes(bytes(data).ljust(8, b'\x00'), order))
+            return self.compare(value, self.low, self.high)
+
+        last_time = self.last_time
+        self.last_time = message['Timestamp']
+        if self.kind == 'period' and last_time is not None:
+            return self.compare((self.last_time - last_time) * 1000, self.low, self.high)
+        # 'missing' only records the arrival here; overdue() does the check
+        return False
+
+    def overdue(self, now):
+        """For 'missing' conditions: True once per gap longer than the limit."""
+        if self.last_time is not None and (now - self.last_time) * 1000 > self.low:
+            # Re-arm only when the ID shows up again
+            self.last_time = None
+            return True
+        return False
+
+    def __repr__(self):
+        return f"TriggerCondition({self.text!r})"
+
+
+def parse_value(text, kind):
+    number = float if kind in ('period', 'missing') else lambda value: int(value, 0)
+    if '..' in text:
+        low, high = (number(part) for part in text.split('..', 1))
+        return min(low, high), max(low, high)
+    value = number(text)
+    return value, value
+
+
+def parse_trigger(text):
+    """
+    :return: TriggerCondition
+    :raises ValueError: on malformed conditions
+    """
+    text = text.strip()
+    match = CONDITION_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Cannot parse trigger condition {text!r}")
+
+    channel = match.group('channel')
+    channel = int(channel[len(CHANNEL_PREFIX):]) if channel else None
+    can_id = int(match.group('id'), 16)
+    field = match.group('field')
+    if field is None:
+        return TriggerCondition(text, can_id, channel)
+
+    op = match.group('op')
+    signal = None
+    if field == '.period':
+        kind = 'period'
+    elif field == '.missing':
+        kind = 'missing'
+        if op != '>':
+            raise ValueError(f"Missing-frame conditions take '>' and a time in ms: {text!r}")
+    else:
+        kind = 'field'
+        byte = BYTE_PATTERN.match(field)
+        bit_field = BIT_FIELD_PATTERN.match(field)
+        if byte:
+            signal = SignalDefinition('trigger', int(byte.group(1)) * 8, 8, INTEL, False, 1, 0)
+        elif bit_field:
+            start_bit, length, order, sign = bit_field.groups()
+            signal = SignalDefinition('trigger', int(start_bit), int(length), INTEL if order == '1' else MOTOROLA,
+                                      sign == '-', 1, 0)
+        else:
+            raise ValueError(f"Cannot parse field {field!r} in {text!r}")
+
+    low, high = parse_value(match.group('value'), kind)
+    if low != high and op not in ('=', '!='):
+        raise ValueError(f"Ranges need '=' or '!=': {text!r}")
+    return TriggerCondition(text, can_id, channel, kind, op, low, high, signal)
+
+
+def write_capture(path, messages):
+    try:
+        with open(path, 'wb') as log_file:
+            log_file.write(log_header())
+            log_file.write(messages_to_records(messages).tobytes())
+    except OSError as e:
+        print(f"Error writing trigger capture: {e}", file=sys.stderr)
+
+
+class TriggerEngine:
+    """
+    :param conditions: list of TriggerCondition (or condition strings)
+    :param directory: str - where captures are written
+    :param pre_seconds: float - frames kept from before the trigger
+    :param post_seconds: float - frames captured after the trigger
+    :param max_pre_frames: int - memory bound of the pre-trigger window
+    :param max_captures: int - stop triggering after this many captures (None for no limit)
+    """
+
+    def __init__(self, conditions, directory, pre_seconds=5.0, post_seconds=5.0, prefix='trigger',
+                 max_pre_frames=1000000, max_captures=None):
+        self.conditions = [parse_trigger(condition) if isinstance(condition, str) else condition
+                           for condition in conditions]
+        self.directory = directory
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.prefix = prefix
+        self.max_captures = max_captures
+
+        # CAN ID -> conditions on that ID, built once
+        self.dispatch = {}
+        for condition in self.conditions:
+            self.dispatch.setdefault(condition.can_id, []).append(condition)
+        self.missing = [condition for condition in self.conditions if condition.kind == 'missing']
+        armed = time.time()
+        for condition in self.missing:
+            # An ID that never shows up counts as missing from the moment the trigger is armed
+            condition.last_time = armed
+
+        self.window = collections.deque(maxlen=max_pre_frames)
+        self.capture = None
+        self.capture_event = None
+        self.capture_end = None
+        self.events = []
+        self.suppressed = 0
+        # finish() may be called from the GUI thread while the receive path appends to the capture
+        self.lock = threading.RLock()
+
+    def process(self, messages, now=None):
+        """Feed one batch of processed frames (the receive path calls this)."""
+        with self.lock:
+            window = self.window
+            capture = self.capture
+            dispatch = self.dispatch
+            for message in messages:
+                window.append(message)
+                if capture is not None:
+                    capture.append(message)
+                conditions = dispatch.get(message['ID'])
+                if conditions is not None:
+                    for condition in conditions:
+                        if condition.matches(message):
+                            self.fire(condition, message['Timestamp'])
+                            capture = self.capture
+
+            if window:
+                oldest = window[-1]['Timestamp'] - self.pre_seconds
+                while window[0]['Timestamp'] < oldest:
+                    window.popleft()
+            self.tick(time.time() if now is None else now)
+
+    def tick(self, now):
+        """Check missing-frame conditions and finish a capture whose post-trigger time is over."""
+        with self.lock:
+            for condition in self.missing:
+                if condition.overdue(now):
+                    self.fire(condition, now)
+            if self.capture is not None and now >= self.capture_end:
+                self.finish()
+
+    def fire(self, condition, trigger_time):
+        if self.capture is not None or (self.max_captures is not None and len(self.events) >= self.max_captures):
+            self.suppressed += 1
+            return
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(trigger_time))
+        path = os.path.join(self.directory, f"{self.prefix}-{stamp}-{len(self.events):04d}{LOG_EXTENSION}")
+        self.capture = list(self.window)
+        self.capture_event = TriggerEvent(trigger_time, condition.text, 0, path)
+        self.capture_end = trigger_time + self.post_seconds
+        self.events.append(self.capture_event)
+
+    def finish(self):
+        """Write the capture being collected, e.g. when the receiver stops before the post-trigger time is over."""
+        with self.lock:
+            if self.capture is None:
+                return
+            # Swapped out under the lock, so no frame is appended once the writer has the list
+            messages, event = self.capture, self.capture_event
+            self.capture = self.capture_event = self.capture_end = None
+            self.events[self.events.index(event)] = event._replace(frames=len(messages))
+        # Not a daemon: a capture finished at shutdown is still written out
+        threading.Thread(target=write_capture, args=(event.path, messages)).start()
@@ -0,0 +1,212 @@
+"""
+Host-side cyclic transmit scheduler.
+
+Each cyclic message has its own period and phase offset. A single thread
+sleeps until the earliest deadline (coarse sleep, then short sleeps down to
+the OS timer resolution for the last SPIN_THRESHOLD seconds, so the reader
+thread keeps the GIL), formats every message that is due and sends them
+all in one serial write. Actual send times feed an IDTimingStats per
+message, so jitter and missed cycles are measured, not assumed.
+"""
+import heapq
+import itertools
+import threading
+import time
+from serial_protocol import format_send_command
+from timing_stats import IDTimingStats
+
+SPIN_THRESHOLD = 0.0015
+# Typical oversleep of time.sleep(); the last stretch before a deadline is waited out with sleep(0)
+TIMER_RESOLUTION = 0.0002
+
+CHECKSUM_SUM8 = 'sum8'
+CHECKSUM_XOR8 = 'xor8'
+# sum8 seeded with the CAN ID, as used by some ECUs
+CHECKSUM_SUM8_ID = 'sum8+id'
+
+
+class CyclicMessage:
+    """
+    :param can_id: int
+    :param data: list[int] - payload template (0-8 bytes)
+    :param period_ms: float - cycle time
+    :param phase_ms: float - offset of the first send relative to the scheduler start
+    :param counter_byte: optional byte index incremented (under counter_mask) on every send
+    :param checksum_byte: optional byte index overwritten with a checksum of the other bytes
+    :param checksum: CHECKSUM_SUM8, CHECKSUM_XOR8 or CHECKSUM_SUM8_ID (sum of the other bytes plus the CAN ID)
+    """
+
+    def __init__(self, can_id, data, period_ms, phase_ms=0.0, counter_byte=None, counter_mask=0xFF,
+                 checksum_byte=None, checksum=CHECKSUM_SUM8):
+        if period_ms <= 0:
+            raise ValueError("Period must be positive")
+        if len(data) > 8:
+            raise ValueError("Data must be at most 8 bytes")
+        for index in (counter_byte, checksum_byte):
+            if index is not None and not 0 <= index < len(data):
+                raise ValueError("Counter/checksum byte outside the payload")
+
+        self.can_id = can_id
+        self.data = list(data)
+        self.period_ms = period_ms
+        self.phase_ms = phase_ms
+        self.counter_byte = counter_byte
+        self.counter_mask = counter_mask
+        self.checksum_byte = checksum_byte
+        self.checksum = checksum
+        self.enabled = True
+
+        self.counter = 0
+        self.sent = 0
+        self.stats = IDTimingStats(expected_period=period_ms)
+        self.next_due = 0.0
+
+    def next_payload(self):
+        data = self.data
+        if self.counter_byte is not None:
+            data = list(data)
+            mask = self.counter_mask
+            data[self.counter_byte] = (data[self.counter_byte] & ~mask & 0xFF) | (self.counter & mask)
+            self.counter += 1
+        if self.checksum_byte is not None:
+            if data is self.data:
+                data = list(data)
+            others = [b for i, b in enumerate(data) if i != self.checksum_byte]
+            if self.checksum == CHECKSUM_XOR8:
+                value = 0
+                for byte in others:
+                    value ^= byte
+            elif self.checksum == CHECKSUM_SUM8_ID:
+                value = (sum(others) + self.can_id) & 0xFF
+            else:
+                value = sum(others) & 0xFF
+            data[self.checksum_byte] = value
+        return data
+
+
+class TransmitScheduler:
+    def __init__(self, receiver):
+        self.receiver = receiver
+        self.messages = {}
+        self._keys = itertools.count(1)
+        self._heap = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._start_time = None
+        self.running = False
+        self.writes = 0
+
+    def add(self, message):
+        """Register a CyclicMessage; returns the key used to update or remove it."""
+        with self._lock:
+            key = next(self._keys)
+            self.messages[key] = message
+            if self.running:
+                self._schedule_first(key, message, time.perf_counter())
+        self._wakeup.set()
+        return key
+
+    def remove(self, key):
+        with self._lock:
+            self.messages.pop(key, None)
+
+    def update(self, key, **changes):
+        """Change fields of a running message (e.g. data, enabled); period changes apply from the next send."""
+        with self._lock:
+            message = self.messages[key]
+            if changes.get('enabled') and not message.enabled:
+                # The sends skipped while disabled are not missed cycles
+                message.stats.restart()
+            for name, value in changes.items():
+                setattr(message, name, value)
+            if 'period_ms' in changes:
+                message.stats.expected_period = message.period_ms
+
+    def start(self):
+        if self.running:
+            return
+        with self._lock:
+            self.running = True
+            self._start_time = time.perf_counter()
+            self._heap = []
+            for key, message in self.messages.items():
+                self._schedule_first(key, message, self._start_time)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _schedule_first(self, key, message, now):
+        message.next_due = now + message.phase_ms / 1000
+        heapq.heappush(self._heap, (message.next_due, key))
+
+    def _run(self):
+        while self.running:
+            with self._lock:
+                next_due = self._heap[0][0] if self._heap else None
+
+            if next_due is None:
+                self._wakeup.wait(0.1)
+                self._wakeup.clear()
+                continue
+
+            remaining = next_due - time.perf_counter()
+            if remaining > SPIN_THRESHOLD:
+                # Sleep coarsely, but wake early if a message is added
+                self._wakeup.wait(remaining - SPIN_THRESHOLD)
+                self._wakeup.clear()
+                continue
+            # Sleeps shorter than the timer resolution return early; sleep(0) still releases the GIL
+            remaining = next_due - time.perf_counter()
+            while remaining > 0:
+                time.sleep(remaining - TIMER_RESOLUTION if remaining > TIMER_RESOLUTION else 0)
+                remaining = next_due - time.perf_counter()
+
+            self._send_due()
+
+    def _send_due(self):
+        now = time.perf_counter()
+        commands = []
+        sent = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, key = heapq.heappop(self._heap)
+                message = self.messages.get(key)
+                if message is None:
+                    continue
+
+                if message.enabled:
+                    commands.append(format_send_command(message.can_id, message.next_payload()))
+                    sent.append(message)
+
+                period = message.period_ms / 1000
+                message.next_due = due + period
+                if message.next_due <= now:
+                    # Fell behind by more than a cycle: resume on the grid instead of bursting
+                    message.next_due = due + period * (int((now - due) / period) + 1)
+                heapq.heappush(self._heap, (message.next_due, key))
+
+        if not commands:
+            return
+
+        # All messages due in this tick share one serial write
+        if self.receiver.write_raw(b''.join(commands)):
+            self.writes += 1
+            send_time = time.perf_counter()
+            for message in sent:
+                message.sent += 1
+                message.stats.update(send_time)
+
+    def stats(self):
+        """Key -> dict with the message's configuration and measured TX timing."""
+        with self._lock:
+            items = list(self.messages.items())
+        return {key: dict(message.stats.as_dict(), can_id=message.can_id, sent=message.sent,
+                          enabled=message.enabled)
+                for key, message in items}